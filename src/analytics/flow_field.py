@@ -0,0 +1,146 @@
+import numpy as np
+from analytics.cpi import compute_cpi
+
+class FlowFieldBuilder:
+    """
+    Per-camera grid maps over a sliding time window, built from tracker output:
+    density (people/m^2 with a HomographyCalibrator, else people per cell),
+    mean speed (m/s, else px/s) and the dominant flow direction.
+
+    The window is a ring of bucket_s-long buckets of per-cell sums
+    (occupancy, frames, speed, velocity); every frame adds one bincount per
+    sum to the current bucket and to running totals, which are re-summed from
+    the ring whenever a bucket expires. Maps and CPI therefore cost O(cells)
+    regardless of track count or window length.
+    """
+
+    def __init__(self, frame_shape, cell_size=32, window_s=10.0, bucket_s=1.0, calibrator=None, max_speed=None):
+        self.frame_h, self.frame_w = frame_shape[:2]
+        self.cell_size = max(1, int(cell_size))
+        self.grid_h = -(-self.frame_h // self.cell_size)
+        self.grid_w = -(-self.frame_w // self.cell_size)
+        self.n_cells = self.grid_h * self.grid_w
+        self.calibrator = calibrator
+        # Speeds above this (m/s or px/s) are ID switches, not motion
+        self.max_speed = max_speed if max_speed is not None else (8.0 if calibrator is not None else None)
+
+        self.bucket_s = bucket_s
+        self.n_buckets = max(1, int(np.ceil(window_s / bucket_s)))
+        # rows: occupancy, speed sum, vx sum, vy sum, velocity samples
+        self.buckets = np.zeros((self.n_buckets, 5, self.n_cells))
+        self.bucket_frames = np.zeros(self.n_buckets)
+        self.totals = np.zeros((5, self.n_cells))
+        self.frames = 0.0
+        self.bucket = None
+
+        self.cell_area = self._cell_area() if calibrator is not None else None
+
+        # Previous frame's ground positions, sorted by id
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._pos = np.zeros((0, 2), dtype=np.float32)
+        self._t = None
+
+    def _cell_area(self):
+        # Ground area (m^2) of each grid cell, summed from the calibrator's per-pixel area LUT
+        cal = self.calibrator
+        if cal.area is None:
+            cal.build_lut((self.frame_h, self.frame_w), step=min(self.cell_size, 4))
+        step = cal.lut_step
+        lh, lw = cal.area.shape
+        cy = (np.arange(lh) * step + step / 2) // self.cell_size
+        cx = (np.arange(lw) * step + step / 2) // self.cell_size
+        flat = (np.minimum(cy, self.grid_h - 1)[:, None] * self.grid_w
+                + np.minimum(cx, self.grid_w - 1)[None, :]).astype(np.int64).ravel()
+        area = np.nan_to_num(cal.area.ravel().astype(np.float64)) * step * step
+        return np.bincount(flat, weights=area, minlength=self.n_cells)
+
+    def _advance(self, t):
+        # Expire buckets that fell out of the window, moving to the bucket for time t
+        b = int(t // self.bucket_s)
+        if self.bucket is None:
+            self.bucket = b
+            return
+        if b <= self.bucket:
+            return
+        for _ in range(min(b - self.bucket, self.n_buckets)):
+            self.bucket += 1
+            slot = self.bucket % self.n_buckets
+            self.buckets[slot] = 0
+            self.bucket_frames[slot] = 0
+        self.bucket = b
+        # Re-sum once per bucket instead of subtracting, so float error never accumulates
+        self.totals = self.buckets.sum(axis=0)
+        self.frames = float(self.bucket_frames.sum())
+
+    def update(self, tracks, t):
+        # tracks: {id: (x,y)} image coordinates; t: seconds (video time)
+        self._advance(t)
+        slot = self.bucket % self.n_buckets
+        n = len(tracks)
+        ids = np.fromiter(tracks.keys(), dtype=np.int64, count=n)
+        xy = np.array([(float(p[0]), float(p[1])) for p in tracks.values()], dtype=np.float32).reshape(-1, 2)
+        order = np.argsort(ids)
+        ids, xy = ids[order], xy[order]
+        gx = np.clip(xy[:, 0] // self.cell_size, 0, self.grid_w - 1).astype(np.int64)
+        gy = np.clip(xy[:, 1] // self.cell_size, 0, self.grid_h - 1).astype(np.int64)
+        cells = gy * self.grid_w + gx
+        pos = self.calibrator.lookup(xy) if self.calibrator is not None else xy
+
+        sums = np.zeros((5, self.n_cells))
+        sums[0] = np.bincount(cells, minlength=self.n_cells)
+
+        # Velocity of tracks also present in the previous frame
+        if self._t is not None and t > self._t and len(self._ids) and n:
+            idx = np.minimum(np.searchsorted(self._ids, ids), len(self._ids) - 1)
+            found = self._ids[idx] == ids
+            v = (pos[found] - self._pos[idx[found]]) / (t - self._t)
+            speed = np.hypot(v[:, 0], v[:, 1])
+            ok = np.isfinite(speed)
+            if self.max_speed is not None:
+                ok &= speed <= self.max_speed
+            c = cells[found][ok]
+            v, speed = v[ok], speed[ok]
+            sums[1] = np.bincount(c, weights=speed, minlength=self.n_cells)
+            sums[2] = np.bincount(c, weights=v[:, 0], minlength=self.n_cells)
+            sums[3] = np.bincount(c, weights=v[:, 1], minlength=self.n_cells)
+            sums[4] = np.bincount(c, minlength=self.n_cells)
+
+        self.buckets[slot] += sums
+        self.bucket_frames[slot] += 1
+        self.totals += sums
+        self.frames += 1
+        self._ids, self._pos, self._t = ids, pos, t
+
+    # --- maps ---
+
+    def _grid(self, flat):
+        return flat.reshape(self.grid_h, self.grid_w)
+
+    def density(self):
+        # Mean people per m^2 (per cell without calibration) over the window
+        occ = self.totals[0] / max(self.frames, 1.0)
+        if self.cell_area is not None:
+            occ = np.divide(occ, self.cell_area, out=np.zeros_like(occ), where=self.cell_area > 0)
+        return self._grid(occ)
+
+    def speed(self):
+        # Mean speed of moving tracks per cell
+        n = self.totals[4]
+        return self._grid(np.divide(self.totals[1], n, out=np.zeros_like(n), where=n > 0))
+
+    def flow(self):
+        # -> (direction radians, coherence 0..1): angle of the mean velocity and how aligned motion is
+        n = self.totals[4]
+        vx = np.divide(self.totals[2], n, out=np.zeros_like(n), where=n > 0)
+        vy = np.divide(self.totals[3], n, out=np.zeros_like(n), where=n > 0)
+        mean_speed = np.divide(self.totals[1], n, out=np.zeros_like(n), where=n > 0)
+        coherence = np.divide(np.hypot(vx, vy), mean_speed, out=np.zeros_like(n), where=mean_speed > 0)
+        return self._grid(np.arctan2(vy, vx)), self._grid(np.clip(coherence, 0.0, 1.0))
+
+    def cpi(self, emotion_map=None):
+        return compute_cpi(self.density(), self.speed(), emotion_map)
+
+# Example usage:
+# field = FlowFieldBuilder(frame.shape, cell_size=32, window_s=10, calibrator=load_calibration(...))
+# field.update(tracks, t=frame_idx / fps)
+# cpi = field.cpi(); direction, coherence = field.flow()
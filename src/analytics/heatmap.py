@@ -0,0 +1,110 @@
+import cv2
+import numpy as np
+
+class DecayingHeatmap:
+    """
+    Activity heatmap accumulated on a coarse grid (cell_size px per cell) with
+    exponential time decay, so it shows recent rather than all-time activity.
+    Tracks are splatted as Gaussian kernels in one bincount per update and the
+    colour overlay is rebuilt only every render_every frames.
+    """
+
+    def __init__(self, frame_shape, roi_mask=None, cell_size=8, sigma=1.5, half_life_s=30.0,
+                 render_every=5, alpha=0.3):
+        self.frame_h, self.frame_w = frame_shape[:2]
+        self.cell_size = max(1, int(cell_size))
+        self.grid_h = -(-self.frame_h // self.cell_size)
+        self.grid_w = -(-self.frame_w // self.cell_size)
+        self.grid = np.zeros((self.grid_h, self.grid_w), dtype=np.float32)
+        self.half_life_s = half_life_s
+        self.render_every = max(1, int(render_every))
+        self.alpha = alpha
+
+        # Decay is applied lazily: stored values are divided by _scale
+        self._scale = 1.0
+
+        # Gaussian kernel as flat (dy, dx, weight) offsets
+        r = max(1, int(np.ceil(3 * sigma)))
+        dy, dx = np.mgrid[-r:r + 1, -r:r + 1]
+        w = np.exp(-(dx ** 2 + dy ** 2) / (2.0 * sigma ** 2)).astype(np.float32)
+        self._dy, self._dx, self._w = dy.ravel(), dx.ravel(), (w / w.sum()).ravel()
+
+        # Only cells touching the ROI receive heat, and only the ROI's bounding box is blended
+        self.roi_grid = None
+        self.rect = (0, 0, self.frame_w, self.frame_h)
+        if roi_mask is not None:
+            roi = np.asarray(roi_mask) > 0
+            self.roi_grid = cv2.resize(roi.astype(np.uint8), (self.grid_w, self.grid_h),
+                                       interpolation=cv2.INTER_AREA) > 0
+            ys, xs = np.nonzero(roi)
+            if len(xs):
+                self.rect = (int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1)
+
+        self._frames = 0
+        self._color = None
+
+    def decay(self, dt):
+        if not self.half_life_s or dt <= 0:
+            return
+        self._scale *= 0.5 ** (dt / self.half_life_s)
+        if self._scale < 1e-6:
+            # Fold the pending decay into the grid before float precision suffers
+            self.grid *= self._scale
+            self._scale = 1.0
+
+    def add(self, points):
+        # points: [N,2] image coordinates
+        pts = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        if len(pts) == 0:
+            return
+        gx = (pts[:, 0] // self.cell_size).astype(np.int64)
+        gy = (pts[:, 1] // self.cell_size).astype(np.int64)
+        ok = (gx >= 0) & (gx < self.grid_w) & (gy >= 0) & (gy < self.grid_h)
+        gx, gy = gx[ok], gy[ok]
+        if self.roi_grid is not None:
+            inside = self.roi_grid[gy, gx]
+            gx, gy = gx[inside], gy[inside]
+        if len(gx) == 0:
+            return
+
+        ys = (gy[:, None] + self._dy[None, :]).ravel()
+        xs = (gx[:, None] + self._dx[None, :]).ravel()
+        w = np.broadcast_to(self._w, (len(gx), len(self._w))).ravel()
+        keep = (xs >= 0) & (xs < self.grid_w) & (ys >= 0) & (ys < self.grid_h)
+        flat = ys[keep] * self.grid_w + xs[keep]
+        splat = np.bincount(flat, weights=w[keep], minlength=self.grid.size)
+        self.grid += (splat / self._scale).astype(np.float32).reshape(self.grid.shape)
+
+    def update(self, tracks, dt):
+        # tracks: {id: (x,y)}; dt: seconds of video since the previous update
+        self.decay(dt)
+        if tracks:
+            self.add([(float(c[0]), float(c[1])) for c in tracks.values()])
+        self._frames += 1
+
+    def values(self):
+        # Current (decayed) grid values
+        return self.grid * self._scale
+
+    def colorize(self):
+        x1, y1, x2, y2 = self.rect
+        peak = float(self.grid.max())
+        hm = (self.grid * (255.0 / peak)).astype(np.uint8) if peak > 0 else np.zeros_like(self.grid, dtype=np.uint8)
+        hm_color = cv2.applyColorMap(hm, cv2.COLORMAP_JET)
+        hm_color = cv2.resize(hm_color, (self.grid_w * self.cell_size, self.grid_h * self.cell_size),
+                              interpolation=cv2.INTER_LINEAR)
+        self._color = hm_color[y1:y2, x1:x2]
+        return self._color
+
+    def render(self, frame):
+        # Blend the cached colour map into frame in place; recolour on the configured cadence
+        if self._color is None or self._frames % self.render_every == 0:
+            self.colorize()
+        x1, y1, x2, y2 = self.rect
+        frame[y1:y2, x1:x2] = cv2.addWeighted(frame[y1:y2, x1:x2], 1.0 - self.alpha, self._color, self.alpha, 0)
+        return frame
+
+# Example usage:
+# heatmap = DecayingHeatmap(frame.shape, roi_mask, cell_size=8, half_life_s=30)
+# heatmap.update(tracks, dt=1 / fps)
+# frame = heatmap.render(frame)
@@ -1,6 +1,10 @@
-import pandas as pd
-import yaml
+import json
+import queue
+import threading
 import time
+from collections import deque
+
+import pandas as pd
 
 # Placeholder for Telegram bot integration
 def send_telegram_alert(message, token, chat_id):
@@ -9,23 +13,326 @@ def send_telegram_alert(message, token, chat_id):
     # Example: requests.post(f"https://api.telegram.org/bot{token}/sendMessage", data={"chat_id": chat_id, "text": message})
 
 
+def _epoch(ts):
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    return pd.Timestamp(ts).timestamp()
+
+# --- rules ---
+
+class RuleState:
+    # Per (camera, rule) state; every rule keeps O(1) of it
+    __slots__ = ("level", "trend", "history", "last_t", "external", "active", "streak", "last_fired")
+
+    def __init__(self, history=0):
+        self.level = None
+        self.trend = 0.0
+        self.history = deque(maxlen=history) if history else None
+        self.last_t = None
+        self.external = None
+        self.active = False
+        self.streak = 0
+        self.last_fired = None
+
+
+class AlertRule:
+    """
+    measure() turns each metrics sample into one number from the rule's
+    incremental state. update() fires when it exceeds threshold for
+    for_samples consecutive samples, then latches until it falls below
+    clear (hysteresis), and never fires twice within cooldown_s.
+    """
+
+    history = 0
+
+    def __init__(self, name, threshold, clear=None, for_samples=1, cooldown_s=300.0):
+        self.name = name
+        self.threshold = threshold
+        self.clear = threshold if clear is None else clear
+        self.for_samples = max(1, int(for_samples))
+        self.cooldown_s = cooldown_s
+
+    def new_state(self):
+        return RuleState(self.history)
+
+    def measure(self, state, row, t):
+        raise NotImplementedError
+
+    def update(self, state, row, t):
+        # -> measured value when the rule fires on this sample, else None
+        value = self.measure(state, row, t)
+        if value is None:
+            return None
+        if state.active:
+            if value < self.clear:
+                state.active = False
+                state.streak = 0
+            return None
+        state.streak = state.streak + 1 if value > self.threshold else 0
+        if state.streak < self.for_samples:
+            return None
+        state.active = True
+        if state.last_fired is not None and t - state.last_fired < self.cooldown_s:
+            return None
+        state.last_fired = t
+        return value
+
+
+class CrowdThresholdRule(AlertRule):
+    # EWMA of active people, so one noisy sample neither fires nor clears
+    def __init__(self, threshold, alpha=0.5, name="HIGH_CROWD", **kw):
+        super().__init__(name, threshold, **kw)
+        self.alpha = alpha
+
+    def measure(self, state, row, t):
+        x = float(row["active"])
+        state.level = x if state.level is None else self.alpha * x + (1 - self.alpha) * state.level
+        return state.level
+
+
+class GrowthRule(AlertRule):
+    # Relative growth of active people over the last `window` samples
+    def __init__(self, threshold, window=6, name="SURGE", **kw):
+        super().__init__(name, threshold, **kw)
+        self.history = max(1, int(window)) + 1
+
+    def measure(self, state, row, t):
+        state.history.append(float(row["active"]))
+        if len(state.history) < 2:
+            return None
+        first = state.history[0]
+        return (state.history[-1] - first) / max(first, 1.0)
+
+
+class ForecastBreachRule(AlertRule):
+    """
+    Projected active people horizon_s ahead from Holt's linear smoothing
+    (level + trend per second, updated per sample with the actual sample
+    spacing). A model forecast pushed with AlertEngine.set_forecast() is
+    used too: whichever projection is higher counts.
+    """
+
+    def __init__(self, threshold, horizon_s=600.0, alpha=0.3, beta=0.1, name="FORECAST_BREACH", **kw):
+        super().__init__(name, threshold, **kw)
+        self.horizon_s = horizon_s
+        self.alpha = alpha
+        self.beta = beta
+
+    def measure(self, state, row, t):
+        x = float(row["active"])
+        if state.level is None or state.last_t is None or t <= state.last_t:
+            state.level = x if state.level is None else state.level
+        else:
+            dt = t - state.last_t
+            level = self.alpha * x + (1 - self.alpha) * (state.level + state.trend * dt)
+            state.trend = self.beta * (level - state.level) / dt + (1 - self.beta) * state.trend
+            state.level = level
+        state.last_t = t
+        projected = max(state.level + state.trend * self.horizon_s, 0.0)
+        return projected if state.external is None else max(projected, state.external)
+
+# --- dispatch ---
+
+class AlertDispatcher:
+    """
+    Background thread that hands alerts to notifiers, so a slow notifier
+    (HTTP, text-to-speech) never blocks the caller. The queue is bounded:
+    when it is full new alerts are dropped and counted.
+    """
+
+    def __init__(self, notifiers, maxsize=256):
+        self.notifiers = list(notifiers)
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name="alert-dispatch", daemon=True)
+        self.thread.start()
+
+    def submit(self, alert):
+        try:
+            self.queue.put_nowait(alert)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            alert = self.queue.get()
+            if alert is None:
+                return
+            for notify in self.notifiers:
+                try:
+                    notify(alert)
+                except Exception as e:
+                    print(f"[ALERTS] Notifier failed: {e}")
+
+    def close(self, timeout=5.0):
+        # Deliver what is queued, then stop
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+
+def log_notifier(alert):
+    print(f"[ALERT] {alert['message']}")
+
+
+def telegram_notifier(token, chat_id):
+    return lambda alert: send_telegram_alert(alert["message"], token, chat_id)
+
+
+def message_notifier(fn):
+    # Adapt a fn(message) notifier such as alerts.voice.speak_alert
+    return lambda alert: fn(alert["message"])
+
+# --- engine ---
+
+class AlertEngine:
+    """
+    Event-driven alert evaluation: process() takes each metrics row as it is
+    logged and updates per (camera, rule) state in O(1); no history is
+    reloaded. Fired alerts are returned and queued to the notifiers.
+    """
+
+    def __init__(self, rules, notifiers=(), queue_size=256):
+        self.rules = list(rules)
+        self.dispatcher = AlertDispatcher(notifiers, queue_size) if notifiers else None
+        self._states = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, cfg, notifiers=()):
+        a = cfg.get("alerts", {}) or {}
+        common = {"for_samples": a.get("for_samples", 1), "cooldown_s": a.get("cooldown_s", 300)}
+        rules = []
+        if a.get("crowd_threshold") is not None:
+            rules.append(CrowdThresholdRule(a["crowd_threshold"], clear=a.get("crowd_clear"),
+                                            alpha=a.get("ewma_alpha", 0.5), **common))
+        if a.get("growth_rate_threshold") is not None:
+            rules.append(GrowthRule(a["growth_rate_threshold"], window=a.get("growth_window", 6),
+                                    clear=a.get("growth_clear"), **common))
+        if a.get("forecast_threshold") is not None:
+            rules.append(ForecastBreachRule(a["forecast_threshold"], horizon_s=a.get("forecast_horizon_s", 600),
+                                            **common))
+        return cls(rules, notifiers, a.get("queue_size", 256))
+
+    def _state(self, camera, rule):
+        key = (camera, rule.name)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = rule.new_state()
+        return state
+
+    def process(self, row):
+        # row: {"timestamp", "camera", "active", ...} as logged by main.py -> list of fired alert dicts
+        camera = row.get("camera")
+        t = _epoch(row["timestamp"]) if "timestamp" in row else time.time()
+        alerts = []
+        with self._lock:
+            for rule in self.rules:
+                value = rule.update(self._state(camera, rule), row, t)
+                if value is None:
+                    continue
+                alerts.append({
+                    "alert": rule.name, "camera": camera, "timestamp": str(row.get("timestamp", "")),
+                    "value": value, "threshold": rule.threshold,
+                    "message": f"{rule.name} on camera {camera}: {value:.2f} > {rule.threshold} "
+                               f"at {row.get('timestamp', '')}",
+                })
+        if self.dispatcher is not None:
+            for alert in alerts:
+                self.dispatcher.submit(alert)
+        return alerts
+
+    def set_forecast(self, camera, peak):
+        # Peak of a model forecast (e.g. ForecastService) for the FORECAST_BREACH rules
+        with self._lock:
+            for rule in self.rules:
+                if isinstance(rule, ForecastBreachRule):
+                    self._state(camera, rule).external = float(peak)
+
+    def active(self, camera=None):
+        # Rules currently latched for camera
+        return [rule.name for rule in self.rules if self._states.get((camera, rule.name), RuleState()).active]
+
+    def wrap(self, sink):
+        return AlertingSink(sink, self)
+
+    def close(self):
+        if self.dispatcher is not None:
+            self.dispatcher.close()
+
+
+class AlertingSink:
+    # Metrics sink wrapper: rows are stored by `sink`, then evaluated by `engine`
+    def __init__(self, sink, engine):
+        self.sink = sink
+        self.engine = engine
+
+    def append(self, row):
+        self.sink.append(row)
+        self.engine.process(row)
+
+    def close(self):
+        self.sink.close()
+        self.engine.close()
+
+
+_REPLAY = {}  # (alerts config, telegram chat) -> [engine, epoch of the newest row processed]
+_REPLAY_LOCK = threading.Lock()
+
+
+def _epochs(ts):
+    # Column of timestamps -> float seconds, numeric columns taken as seconds already (like _epoch)
+    if pd.api.types.is_numeric_dtype(ts):
+        return ts.to_numpy(dtype=float)
+    return pd.to_datetime(ts, utc=True, format="mixed").astype("int64").to_numpy() / 1e9
+
+
 def check_alerts(df, cfg, telegram_cfg=None):
-    last = df.iloc[-1]
-    prev = df.iloc[-2] if len(df) > 1 else last
-    alerts = []
-    if last["active"] > cfg["alerts"]["crowd_threshold"]:
-        alerts.append("HIGH_CROWD")
-    growth = (last["active"] - prev["active"]) / max(prev["active"], 1)
-    if growth > cfg["alerts"]["growth_rate_threshold"]:
-        alerts.append("SURGE")
-    # Add forecast breach, etc.
-    if alerts and telegram_cfg:
-        for alert in alerts:
-            send_telegram_alert(f"Alert: {alert} at {last['timestamp']}", telegram_cfg["token"], telegram_cfg["chat_id"])
-    return alerts
+    """
+    Compatibility wrapper for callers polling a metrics DataFrame. One engine
+    is kept per (alerts config, Telegram chat) and only rows newer than the
+    last call are read and fed to it (rows must be in time order), so
+    repeated calls cost O(new rows). On the
+    first call the earlier rows only build rule state. Alerts fired by the
+    new rows are sent to Telegram once; the return value is the rules active
+    (latched) for the last row's camera, so a crowd that stays above the
+    threshold keeps reporting HIGH_CROWD as it did before.
+    """
+    if df.empty:
+        return []
+    chat = (telegram_cfg["token"], telegram_cfg["chat_id"]) if telegram_cfg else None
+    key = (json.dumps(cfg.get("alerts", {}) or {}, sort_keys=True, default=str), chat)
+    with _REPLAY_LOCK:
+        entry = _REPLAY.get(key)
+        first = entry is None
+        if first:
+            entry = _REPLAY[key] = [AlertEngine.from_config(cfg), float("-inf")]
+        engine, last = entry
+        # Metrics are logged in time order: look back from the end only as far as the new rows go
+        n = 1024
+        while True:
+            tail = df.iloc[-n:]
+            t = _epochs(tail["timestamp"])
+            if n >= len(df) or t[0] <= last:
+                break
+            n *= 4
+        new = tail[t > last]
+        if len(new):
+            entry[1] = float(t.max())
+        rows = new.to_dict("records")
+        fired = []
+        for i, row in enumerate(rows):
+            alerts = engine.process(row)
+            if not first or i == len(rows) - 1:
+                fired.extend(alerts)
+    if chat is not None:
+        notify = telegram_notifier(*chat)
+        for alert in fired:
+            notify(alert)
+    return engine.active(df.iloc[-1].get("camera"))
 
 # Example usage:
-# df = pd.read_csv("data/outputs/metrics.csv")
 # cfg = yaml.safe_load(open("src/config.yaml"))
-# telegram_cfg = {"token": "<bot_token>", "chat_id": "<chat_id>"}
-# check_alerts(df, cfg, telegram_cfg) 
\ No newline at end of file
+# engine = AlertEngine.from_config(cfg, [log_notifier, message_notifier(speak_alert)])
+# sink = engine.wrap(MetricsStore())   # every appended row is evaluated as it is logged
+# engine.set_forecast(1, pred.max())   # optional model forecast for FORECAST_BREACH
+# check_alerts(pd.read_csv("data/outputs/metrics.csv"), cfg)
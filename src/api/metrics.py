@@ -1,17 +1,19 @@
 from fastapi import APIRouter, Response
-from prometheus_client import Counter, Gauge, generate_latest, CONTENT_TYPE_LATEST
+from src.utils import telemetry
 
 router = APIRouter()
 
-active_gauge = Gauge('crowdflow_active', 'Active people count')
-in_counter = Counter('crowdflow_in', 'Cumulative in count')
-out_counter = Counter('crowdflow_out', 'Cumulative out count')
+# Pipeline metrics (stage latency histograms, queue depths, dropped frames, FPS and the
+# people counts below) are written by the detector processes, see src/utils/telemetry.py.
+# This route aggregates every process that wrote to the shared multiprocess directory.
 
 @router.get('/metrics')
 def metrics():
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    body = telemetry.render_latest()
+    return Response(body, media_type=telemetry.CONTENT_TYPE_LATEST)
 
-# Example usage in your pipeline:
-# active_gauge.set(active_count)
-# in_counter.inc(in_count)
-# out_counter.inc(out_count) 
\ No newline at end of file
+# Example usage in your pipeline (per camera):
+# telemetry.init_telemetry()                       # once per process
+# cam = telemetry.CameraTelemetry(cam_id=1)
+# t = cam.lap("infer", t)                          # per stage
+# cam.frame_done(in_count, out_count, active)      # counts and FPS, published once per second
@@ -1,15 +1,53 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from pydantic import BaseModel
 import pandas as pd
-from src.forecasting.forecast import train_and_forecast
-from fastapi.responses import JSONResponse
+from src.api.metrics import router as metrics_router
+from src.api.track_stream import router as track_router, hub as track_hub
+from src.forecasting.forecast import ForecastService
+from src.forecasting.forecast_ml import MLForecaster
+from src.utils.frame_ring import open_reader
+from src.utils.telemetry import init_telemetry
+from src.storage import metrics_store
+from typing import Optional
+from fastapi.responses import JSONResponse, StreamingResponse
+import threading
+import time
+import cv2
 import os
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Shared Prometheus multiprocess directory for /metrics
+    init_telemetry()
+    # Listen for the detector's track stream before any WebSocket client connects
+    track_hub.start()
+    yield
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(metrics_router)
+app.include_router(track_router)
+
+METRICS_DB = "data/outputs/metrics_db"
+METRICS_CSV = "data/outputs/metrics.csv"
+_store = None
+
+def get_store():
+    # Read-only handle on the detector's metrics store, None until it has written something
+    global _store
+    if _store is None and metrics_store.exists(METRICS_DB):
+        _store = metrics_store.MetricsStore(METRICS_DB, readonly=True)
+    return _store
 
 @app.get("/metrics/latest")
 def latest_metrics():
-    metrics_path = "data/outputs/metrics.csv"
+    store = get_store()
+    if store is not None:
+        last = store.latest_overall()
+        if last is None:
+            return JSONResponse({"detail": "Metrics store is empty. Please process a video."}, status_code=200)
+        return last
+    metrics_path = METRICS_CSV
     if not os.path.exists(metrics_path):
         return JSONResponse({"detail": "No metrics available yet. Please upload and process a video."}, status_code=200)
     try:
@@ -21,13 +59,114 @@ def latest_metrics():
     except Exception as e:
         return JSONResponse({"detail": f"Error reading metrics: {str(e)}"}, status_code=500)
 
+@app.get("/metrics/latest/{camera_id}")
+def latest_camera_metrics(camera_id: int):
+    store = get_store()
+    last = store.latest(camera_id) if store is not None else None
+    if last is None:
+        return JSONResponse({"detail": f"No metrics for camera {camera_id}."}, status_code=404)
+    return last
+
+@app.get("/metrics/history")
+def metrics_history(start: Optional[str] = None, end: Optional[str] = None, camera: Optional[int] = None):
+    store = get_store()
+    if store is None:
+        return JSONResponse({"detail": "No metrics available yet. Please upload and process a video."}, status_code=200)
+    try:
+        df = store.query(start, end, [camera] if camera is not None else None)
+    except Exception as e:
+        return JSONResponse({"detail": f"Error reading metrics: {str(e)}"}, status_code=400)
+    df["timestamp"] = df["timestamp"].astype(str)
+    return df.to_dict(orient="records")
+
 class ForecastRequest(BaseModel):
     horizon: int = 6
+    camera: Optional[int] = None
+    model: str = "sarimax"  # or "ml": registry models, retrained in the background
+
+# Keeps fitted models between requests and extends them as new intervals arrive
+forecaster = ForecastService(METRICS_DB, METRICS_CSV)
+ml_forecaster = MLForecaster(METRICS_DB, METRICS_CSV)
 
 @app.post("/forecast")
 def forecast(req: ForecastRequest):
-    pred, conf = train_and_forecast(horizon=req.horizon)
+    try:
+        service = ml_forecaster if req.model == "ml" else forecaster
+        pred, conf = service.forecast(horizon=req.horizon, camera=req.camera)
+    except (ValueError, FileNotFoundError) as e:
+        return JSONResponse({"detail": f"Forecast unavailable: {str(e)}"}, status_code=200)
     return {
         "forecast": pred.to_json(),
         "conf": conf.to_json()
-    } 
\ No newline at end of file
+    } 
+
+# --- Live MJPEG stream from the detector's shared-memory frame ring ---
+MAX_STREAM_FPS = 30
+JPEG_QUALITY = 80
+
+class LiveFeed:
+    # One per camera: each new frame is JPEG-encoded once and shared by every client
+    def __init__(self, cam_id, reattach_after=5.0):
+        self.cam_id = cam_id
+        self.reader = None
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.jpeg = None
+        self.reattach_after = reattach_after
+        self.last_change = time.time()
+
+    def latest_jpeg(self):
+        with self.lock:
+            now = time.time()
+            if self.reader is not None and now - self.last_change > self.reattach_after:
+                # The detector may have restarted with a fresh segment
+                self.reader.close()
+                self.reader = None
+            if self.reader is None:
+                self.reader = open_reader(self.cam_id)
+                if self.reader is None:
+                    return 0, None
+                self.seq, self.jpeg, self.last_change = 0, None, now
+            self.reader.heartbeat()
+            if self.reader.latest_seq() != self.seq:
+                seq, frame = self.reader.read()
+                if frame is not None:
+                    ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+                    if ok:
+                        self.seq, self.jpeg, self.last_change = seq, buf.tobytes(), now
+            return self.seq, self.jpeg
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+def get_feed(cam_id):
+    with _feeds_lock:
+        if cam_id not in _feeds:
+            _feeds[cam_id] = LiveFeed(cam_id)
+        return _feeds[cam_id]
+
+def mjpeg_frames(feed, fps, idle_timeout=10.0):
+    interval = 1.0 / fps
+    last_seq = 0
+    last_new = time.time()
+    while True:
+        started = time.time()
+        seq, jpeg = feed.latest_jpeg()
+        if jpeg is not None and seq != last_seq:
+            last_seq, last_new = seq, started
+            yield (b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: " + str(len(jpeg)).encode()
+                   + b"\r\n\r\n" + jpeg + b"\r\n")
+        elif started - last_new > idle_timeout:
+            # Detector stopped publishing, end the stream
+            return
+        time.sleep(max(0.0, interval - (time.time() - started)))
+
+@app.get("/stream/{camera_id}")
+def stream(camera_id: int, fps: float = 10):
+    feed = get_feed(camera_id)
+    # Attach (and signal the detector) before answering so the first frame arrives quickly
+    feed.latest_jpeg()
+    if feed.reader is None:
+        return JSONResponse({"detail": f"No live feed for camera {camera_id}. Is the detector running?"}, status_code=404)
+    fps = min(max(fps, 0.1), MAX_STREAM_FPS)
+    return StreamingResponse(mjpeg_frames(feed, fps), media_type="multipart/x-mixed-replace; boundary=frame")
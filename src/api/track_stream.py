@@ -0,0 +1,317 @@
+import asyncio
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from src.cloud.streaming import SocketBroker, decode_batch
+
+router = APIRouter()
+
+# Live track positions for digital-twin / AR clients over WebSocket.
+# The detector publishes crowd states to tcp://<api host>:TRACK_PORT (a `streaming`
+# sink in config.yaml); this process keeps the latest state per camera and streams
+# it as keyframes plus deltas. Each (camera, rate) channel encodes one payload per
+# tick and every subscriber gets the same bytes, so cost does not grow with viewers.
+# The listener starts with the API (server.py lifespan) and binds every interface:
+# under docker-compose the detector reaches it as tcp://api:9500.
+TRACK_HOST = os.environ.get("CROWDFLOW_TRACK_HOST", "0.0.0.0")
+TRACK_PORT = int(os.environ.get("CROWDFLOW_TRACK_PORT", 9500))
+# Requested rates are rounded down to one of these, so clients share channels
+RATE_TIERS = (30, 15, 10, 5, 2, 1)
+QUANTUM = 0.1  # coordinate step (pixels, or metres for ground positions)
+KEYFRAME_EVERY_S = 10.0
+MAX_CLIENT_BACKLOG = 8  # payloads queued for one client before it is resynced with keyframes
+STATE_TTL_S = 30.0  # a camera silent for this long is forgotten: its tracks are removed from clients
+
+# Message: <BHIdfII kind, camera, seq, timestamp (s), quantum, n upserts, n removed>
+# then upsert ids uint32[n], positions uint16[n, 2] (units of quantum), removed ids uint32[m].
+# A keyframe lists every track; a delta lists new or moved tracks and removed ids.
+KEYFRAME, DELTA = 0, 1
+_MSG = struct.Struct("<BHIdfII")
+
+
+def quantize(xy, quantum=QUANTUM):
+    return np.clip(np.rint(np.asarray(xy, dtype=np.float32) / quantum), 0, 65535).astype(np.uint16)
+
+
+def encode_message(kind, camera, seq, ts, ids, qxy, removed=(), quantum=QUANTUM):
+    ids = np.asarray(ids, dtype=np.uint32)
+    removed = np.asarray(removed, dtype=np.uint32)
+    return (_MSG.pack(kind, camera, seq, ts, quantum, len(ids), len(removed))
+            + ids.tobytes() + np.asarray(qxy, dtype=np.uint16).tobytes() + removed.tobytes())
+
+
+def decode_message(buf):
+    # For clients and tests -> {"kind", "camera", "seq", "timestamp", "ids", "positions", "removed"}
+    kind, camera, seq, ts, quantum, n, m = _MSG.unpack_from(buf, 0)
+    off = _MSG.size
+    ids = np.frombuffer(buf, dtype=np.uint32, count=n, offset=off)
+    qxy = np.frombuffer(buf, dtype=np.uint16, count=2 * n, offset=off + 4 * n).reshape(n, 2)
+    removed = np.frombuffer(buf, dtype=np.uint32, count=m, offset=off + 8 * n)
+    return {"kind": kind, "camera": camera, "seq": seq, "timestamp": ts, "ids": ids,
+            "positions": qxy.astype(np.float32) * np.float32(quantum), "removed": removed}
+
+
+class Subscriber:
+    # One WebSocket client: its outgoing payloads and the channels it follows
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.channels = set()
+        self.follow_fps = None  # set while subscribed to "all": cameras are added as they appear
+
+    def offer(self, payload):
+        if self.queue.qsize() >= MAX_CLIENT_BACKLOG:
+            # Too slow for its rate: drop the backlog and restart from keyframes
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            for channel in self.channels:
+                keyframe = channel.keyframe()
+                if keyframe is not None:
+                    self.queue.put_nowait(keyframe)
+            return
+        self.queue.put_nowait(payload)
+
+
+class TrackChannel:
+    """
+    One camera at one rate. Every tick the camera's latest state is
+    quantized and diffed (vectorized, by sorted id) against the state this
+    channel last sent; the delta is encoded once and offered to every
+    subscriber. keyframe() encodes the current state at most once per seq.
+    """
+
+    def __init__(self, hub, camera, fps):
+        self.hub = hub
+        self.camera = camera
+        self.fps = fps
+        self.subscribers = set()
+        self.ids = np.zeros(0, dtype=np.uint32)
+        self.qxy = np.zeros((0, 2), dtype=np.uint16)
+        self.ts = 0.0
+        self.seq = 0
+        self._source = None
+        self._keyframe = None
+        self._last_keyframe = 0.0
+        self.task = None
+
+    def keyframe(self):
+        if self.seq == 0:
+            return None
+        if self._keyframe is None or self._keyframe[0] != self.seq:
+            self._keyframe = (self.seq, encode_message(KEYFRAME, self.camera, self.seq, self.ts, self.ids, self.qxy))
+        return self._keyframe[1]
+
+    def tick(self):
+        # -> payload for this tick, or None when nothing changed
+        state = self.hub.latest(self.camera)
+        if state is None and len(self.ids):
+            # Camera expired: remove its tracks once
+            removed, self.ids, self.qxy, self._source = self.ids, self.ids[:0], self.qxy[:0], None
+            self.seq += 1
+            return encode_message(DELTA, self.camera, self.seq, self.ts, self.ids, self.qxy, removed)
+        if state is None or state is self._source:
+            return None
+        self._source = state
+        order = np.argsort(state["ids"], kind="stable")
+        ids = np.asarray(state["ids"], dtype=np.uint32)[order]
+        qxy = quantize(state["positions"])[order]
+
+        # New or moved (by at least one quantum) ids, and ids that disappeared
+        idx = np.minimum(np.searchsorted(self.ids, ids), max(len(self.ids) - 1, 0))
+        known = (self.ids[idx] == ids) if len(self.ids) else np.zeros(len(ids), dtype=bool)
+        changed = ~known | np.any(self.qxy[idx] != qxy, axis=1) if len(self.ids) else ~known
+        ridx = np.minimum(np.searchsorted(ids, self.ids), max(len(ids) - 1, 0))
+        removed = self.ids[~(ids[ridx] == self.ids)] if len(ids) else self.ids
+
+        self.ids, self.qxy, self.ts = ids, qxy, float(state["timestamp"])
+        self.seq += 1
+        now = time.monotonic()
+        if now - self._last_keyframe >= KEYFRAME_EVERY_S:
+            self._last_keyframe = now
+            return self.keyframe()
+        if not changed.any() and not len(removed):
+            return None
+        return encode_message(DELTA, self.camera, self.seq, self.ts, ids[changed], qxy[changed], removed)
+
+    async def run(self):
+        interval = 1.0 / self.fps
+        try:
+            while self.subscribers:
+                started = time.monotonic()
+                payload = self.tick()
+                if payload is not None:
+                    for sub in list(self.subscribers):
+                        sub.offer(payload)
+                await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+        finally:
+            self.hub.drop_channel(self)
+
+
+class TrackHub:
+    # Latest state per camera (fed by the detector stream) and the live channels
+    def __init__(self, host=TRACK_HOST, port=TRACK_PORT):
+        self.host, self.port = host, port
+        self._latest = {}
+        self._seen = {}  # camera -> monotonic time of its last state
+        self.channels = {}
+        self.broker = None
+        self.followers = set()
+        self.loop = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        # Listen for the detector's tcp:// stream; idempotent
+        with self._lock:
+            if self.broker is None:
+                try:
+                    self.broker = SocketBroker(self.host, self.port, handler=self.on_batch)
+                except OSError as e:
+                    print(f"[TRACKS] Cannot listen on {self.host}:{self.port}: {e}")
+                    self.broker = False
+
+    def on_batch(self, topic, batch):
+        for state in decode_batch(batch):
+            self.push(state)
+
+    def push(self, state):
+        # state as decoded from the crowd stream: {"camera", "timestamp", "ids", "positions", ...}
+        camera = int(state["camera"])
+        new = camera not in self._latest
+        self._seen[camera] = time.monotonic()
+        self._latest[camera] = state
+        if new and self.followers and self.loop is not None:
+            # Called on the broker thread; channels live on the event loop
+            self.loop.call_soon_threadsafe(self._attach, camera)
+
+    def _attach(self, camera):
+        for sub in list(self.followers):
+            self.subscribe(sub, camera, sub.follow_fps)
+
+    def follow(self, sub, fps):
+        # Subscribe to every camera, now and as new ones start streaming
+        self.loop = asyncio.get_running_loop()
+        sub.follow_fps = fps
+        self.followers.add(sub)
+        for camera in self.cameras():
+            self.subscribe(sub, camera, fps)
+
+    def latest(self, camera):
+        # None once the camera has been silent for STATE_TTL_S (it is forgotten)
+        state = self._latest.get(camera)
+        if state is not None and time.monotonic() - self._seen.get(camera, 0.0) > STATE_TTL_S:
+            self._latest.pop(camera, None)
+            return None
+        return state
+
+    def cameras(self):
+        return sorted(c for c in list(self._latest) if self.latest(c) is not None)
+
+    def subscribe(self, sub, camera, fps):
+        tier = next((t for t in RATE_TIERS if t <= fps), RATE_TIERS[-1])
+        if any(c.camera == camera for c in sub.channels):
+            return
+        channel = self.channels.get((camera, tier))
+        if channel is None:
+            channel = self.channels[(camera, tier)] = TrackChannel(self, camera, tier)
+            channel.tick()
+        channel.subscribers.add(sub)
+        sub.channels.add(channel)
+        if channel.task is None:
+            channel.task = asyncio.ensure_future(channel.run())
+        keyframe = channel.keyframe()
+        if keyframe is not None:
+            sub.queue.put_nowait(keyframe)
+
+    def unsubscribe(self, sub):
+        self.followers.discard(sub)
+        sub.follow_fps = None
+        for channel in sub.channels:
+            channel.subscribers.discard(sub)
+        sub.channels = set()
+
+    def drop_channel(self, channel):
+        if self.channels.get((channel.camera, channel.fps)) is channel:
+            del self.channels[(channel.camera, channel.fps)]
+
+
+hub = TrackHub()
+
+
+def _parse_cameras(cameras):
+    # -> None for "all", else a list of ids; ValueError / TypeError on anything else
+    if cameras is None or cameras == "" or cameras == "all":
+        return None
+    if isinstance(cameras, str):
+        cameras = [c for c in cameras.split(",") if c.strip()]
+    elif isinstance(cameras, int):
+        cameras = [cameras]
+    elif not isinstance(cameras, list):
+        raise TypeError(f"cameras must be a list, a comma-separated string or 'all', got {cameras!r}")
+    return [int(c) for c in cameras]
+
+
+def _subscribe(sub, cameras, fps):
+    if cameras is None:
+        hub.follow(sub, fps)
+        return
+    for cam in cameras:
+        hub.subscribe(sub, cam, fps)
+
+
+@router.websocket("/ws/tracks")
+async def track_stream(ws: WebSocket, cameras: str = "all", fps: float = 10):
+    # Binary keyframe / delta messages; send {"cameras": [1, 2], "fps": 5} to change the subscription
+    await ws.accept()
+    hub.start()  # normally already listening since startup
+    sub = Subscriber()
+    try:
+        _subscribe(sub, _parse_cameras(cameras), fps)
+    except (TypeError, ValueError) as e:
+        await ws.close(code=1003, reason=str(e))
+        return
+
+    async def send():
+        while True:
+            await ws.send_bytes(await sub.queue.get())
+
+    async def receive():
+        nonlocal fps
+        while True:
+            msg = await ws.receive_json()
+            try:
+                if not isinstance(msg, dict):
+                    raise TypeError("expected a JSON object such as {\"cameras\": [1, 2], \"fps\": 5}")
+                new_fps = float(msg.get("fps", fps))
+                new_cameras = _parse_cameras(msg.get("cameras", "all"))
+            except (TypeError, ValueError) as e:
+                # Keep the current subscription, tell the client why
+                await ws.send_json({"error": str(e)})
+                continue
+            hub.unsubscribe(sub)
+            while not sub.queue.empty():
+                sub.queue.get_nowait()
+            fps = new_fps
+            _subscribe(sub, new_cameras, fps)
+
+    # Whichever side ends first (client gone, send failed) ends the connection
+    tasks = [asyncio.ensure_future(send()), asyncio.ensure_future(receive())]
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            e = task.exception()
+            if e is not None and not isinstance(e, (WebSocketDisconnect, RuntimeError)):
+                print(f"[TRACKS] Client stream ended: {e!r}")
+    finally:
+        for task in tasks:
+            task.cancel()
+        hub.unsubscribe(sub)
+
+# Example usage:
+# detector (config.yaml streaming.sinks): {endpoint: "tcp://api:9500", topic: "tracks", policy: "coalesce"}
+# client: ws = websocket.create_connection("ws://localhost:8000/ws/tracks?cameras=1,2&fps=10")
+#         msg = decode_message(ws.recv())   # keyframe first, then deltas: apply ids/positions, drop removed
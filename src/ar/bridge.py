@@ -1,9 +1,10 @@
-import json
+from cloud.streaming import get_publisher
 
 def stream_to_ar_app(crowd_data, endpoint):
-    # crowd_data: positions, density, etc.
-    # endpoint: URL or socket for AR app
-    print(f"[AR] Sending to {endpoint}: {json.dumps(crowd_data)}")
+    # crowd_data: {"camera", "timestamp", "positions", density, ...}
+    # endpoint: ws:// URL of the AR app, or tcp:// / file:// (see cloud/streaming.py)
+    # Queued on a shared batched publisher: returns immediately, only the latest state per camera is kept
+    get_publisher(endpoint, "ar", policy="coalesce").publish(crowd_data)
 
 # Example usage:
-# stream_to_ar_app({"positions": [...]}, "ws://localhost:9100") 
\ No newline at end of file
+# stream_to_ar_app({"camera": 1, "positions": {7: (3.2, 8.1)}}, "ws://localhost:9100")
@@ -0,0 +1,161 @@
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+# Make the src packages importable when run as `python src/benchmarks/replay.py`
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from analytics.heatmap import DecayingHeatmap
+from benchmarks.synthetic import centred_roi, dense_crowd
+from benchmarks.trace import TraceReader, TraceWriter, record_video
+from counting.counter import FlowCounter
+from tracking.centroid_tracker import CentroidTracker
+from tracking.ocsort_tracker import OCSort
+
+TRACKERS = {"ocsort": OCSort, "centroid": CentroidTracker}
+
+
+def roi_mask(frame_shape, polygon):
+    mask = np.zeros(frame_shape[:2], dtype=np.uint8)
+    cv2.fillPoly(mask, np.array([polygon], dtype=np.int32), 255)
+    return mask
+
+
+def summarize(samples):
+    # per-frame seconds -> {"fps", "p50_ms", "p99_ms"}
+    t = np.asarray(samples, dtype=np.float64)
+    if len(t) == 0:
+        return {"fps": 0.0, "p50_ms": 0.0, "p99_ms": 0.0}
+    total = t.sum()
+    return {"fps": len(t) / total if total > 0 else float("inf"),
+            "p50_ms": float(np.percentile(t, 50) * 1e3),
+            "p99_ms": float(np.percentile(t, 99) * 1e3)}
+
+
+def replay(frames, frame_shape, roi, tracker="ocsort", fps=25.0, render=False, warmup=10):
+    """
+    Feed recorded detections through tracker -> counters -> heatmap and time
+    each stage per frame; no model, no video decode. The polygon and raster
+    counters both consume the same tracks so their costs can be compared.
+    -> {stage: {"fps", "p50_ms", "p99_ms"}}
+    """
+    trk = TRACKERS[tracker]()
+    mask = roi_mask(frame_shape, roi)
+    counters = {"count_polygon": FlowCounter(roi), "count_raster": FlowCounter(roi, roi_mask=mask)}
+    heatmap = DecayingHeatmap(frame_shape, mask)
+    canvas = np.zeros(frame_shape, dtype=np.uint8) if render else None
+    stages = ["track"] + list(counters) + ["heatmap"] + (["render"] if render else [])
+    samples = {s: [] for s in stages}
+    n_tracks = []
+
+    for i, (boxes, _, _) in enumerate(frames):
+        timings = {}
+        t0 = time.perf_counter()
+        tracks = trk.update(boxes)
+        timings["track"] = time.perf_counter() - t0
+        for name, counter in counters.items():
+            t0 = time.perf_counter()
+            counter.update(tracks)
+            timings[name] = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        heatmap.update(tracks, 1.0 / fps)
+        timings["heatmap"] = time.perf_counter() - t0
+        if render:
+            t0 = time.perf_counter()
+            heatmap.render(canvas)
+            timings["render"] = time.perf_counter() - t0
+        if i < warmup:
+            continue
+        for s in stages:
+            samples[s].append(timings[s])
+        n_tracks.append(len(tracks))
+
+    report = {s: summarize(v) for s, v in samples.items()}
+    report["total"] = summarize(np.sum([samples[s] for s in stages], axis=0) if n_tracks else [])
+    report["tracks"] = float(np.mean(n_tracks)) if n_tracks else 0.0
+    return report
+
+
+def print_report(label, report):
+    print(f"\n{label}  (mean live tracks: {report['tracks']:.0f})")
+    print(f"  {'stage':<14} {'fps':>10} {'p50 ms':>9} {'p99 ms':>9}")
+    for stage, r in report.items():
+        if stage == "tracks":
+            continue
+        print(f"  {stage:<14} {r['fps']:>10.1f} {r['p50_ms']:>9.3f} {r['p99_ms']:>9.3f}")
+
+
+def run_sizes(sizes, n_frames, frame_shape, trackers, render=False, seed=0):
+    # Synthetic crowds of increasing size -> {(tracker, size): report}
+    roi = centred_roi(frame_shape)
+    results = {}
+    for size in sizes:
+        frames = list(dense_crowd(size, n_frames, frame_shape, seed=seed))
+        for tracker in trackers:
+            results[(tracker, size)] = report = replay(frames, frame_shape + (3,), roi, tracker, render=render)
+            print_report(f"{tracker} | {size} people", report)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stage-level benchmarks on recorded or synthetic detections")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    rec = sub.add_parser("record", help="record YOLODetector detections from a video into a trace")
+    rec.add_argument("video")
+    rec.add_argument("trace")
+    rec.add_argument("--weights", default="yolov8n.pt")
+    rec.add_argument("--frames", type=int, default=None)
+
+    syn = sub.add_parser("synthetic", help="write a synthetic dense-crowd trace")
+    syn.add_argument("trace")
+    syn.add_argument("--people", type=int, default=500)
+    syn.add_argument("--frames", type=int, default=300)
+    syn.add_argument("--seed", type=int, default=0)
+
+    rep = sub.add_parser("replay", help="replay a trace through the tracking / counting / heatmap stages")
+    rep.add_argument("trace")
+    rep.add_argument("--tracker", choices=sorted(TRACKERS), nargs="+", default=["ocsort", "centroid"])
+    rep.add_argument("--render", action="store_true")
+
+    sweep = sub.add_parser("sweep", help="synthetic crowds of increasing size")
+    sweep.add_argument("--sizes", type=int, nargs="+", default=[25, 100, 250, 500, 1000])
+    sweep.add_argument("--frames", type=int, default=200)
+    sweep.add_argument("--tracker", choices=sorted(TRACKERS), nargs="+", default=["ocsort", "centroid"])
+    sweep.add_argument("--render", action="store_true")
+
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    args = parser.parse_args()
+    frame_shape = (args.height, args.width)
+
+    if args.cmd == "record":
+        from detectors.yolo_detector import YOLODetector
+        n = record_video(YOLODetector(args.weights), args.video, args.trace, args.frames)
+        print(f"Recorded {n} frames -> {args.trace}")
+    elif args.cmd == "synthetic":
+        with TraceWriter(args.trace, args.width, args.height) as writer:
+            for boxes, scores, classes in dense_crowd(args.people, args.frames, frame_shape, seed=args.seed):
+                writer.write(boxes, scores, classes)
+        print(f"Wrote {args.frames} frames of {args.people} people -> {args.trace}")
+    elif args.cmd == "replay":
+        trace = TraceReader(args.trace)
+        frames = trace.load()
+        roi = centred_roi(trace.frame_shape)
+        for tracker in args.tracker:
+            print_report(f"{tracker} | {args.trace}",
+                         replay(frames, trace.frame_shape, roi, tracker, trace.fps, args.render))
+    else:
+        run_sizes(args.sizes, args.frames, frame_shape, args.tracker, args.render)
+
+
+if __name__ == "__main__":
+    main()
+
+# Example usage:
+# python src/benchmarks/replay.py record data/videos/sample.mp4 data/outputs/sample.trace
+# python src/benchmarks/replay.py replay data/outputs/sample.trace --tracker ocsort
+# python src/benchmarks/replay.py sweep --sizes 100 500 1000 --frames 200
@@ -0,0 +1,47 @@
+import numpy as np
+
+
+def dense_crowd(n_people, n_frames=300, frame_shape=(1080, 1920), seed=0, speed=2.0, box_size=(40, 90),
+                jitter=1.5, miss_rate=0.05, false_positive_rate=0.01, turnover=0.005):
+    """
+    Synthetic detections for a dense crowd: people random-walk with momentum,
+    bounce off the frame edges and are occasionally replaced (leave / enter).
+    Each frame drops miss_rate of the true boxes, adds jitter and sprinkles
+    false positives. Yields (boxes [N,4], scores [N], classes [N]) per frame.
+    """
+    rng = np.random.default_rng(seed)
+    h, w = frame_shape[:2]
+    bw, bh = box_size
+    pos = rng.uniform([bw, bh], [w - bw, h - bh], size=(n_people, 2))
+    vel = rng.normal(0, speed, size=(n_people, 2))
+    scale = rng.uniform(0.7, 1.3, size=n_people)
+
+    for _ in range(n_frames):
+        vel = 0.9 * vel + rng.normal(0, speed * 0.3, size=vel.shape)
+        pos += vel
+        out = (pos[:, 0] < 0) | (pos[:, 0] > w) | (pos[:, 1] < 0) | (pos[:, 1] > h)
+        vel[out] *= -1
+        pos = np.clip(pos, 0, [w, h])
+
+        swap = rng.random(n_people) < turnover
+        pos[swap] = rng.uniform([bw, bh], [w - bw, h - bh], size=(int(swap.sum()), 2))
+
+        seen = rng.random(n_people) >= miss_rate
+        c = pos[seen] + rng.normal(0, jitter, size=(int(seen.sum()), 2))
+        half = np.stack([bw * scale[seen], bh * scale[seen]], axis=1) / 2
+        boxes = np.concatenate([c - half, c + half], axis=1)
+
+        n_fp = rng.poisson(false_positive_rate * n_people)
+        if n_fp:
+            fc = rng.uniform([0, 0], [w, h], size=(n_fp, 2))
+            boxes = np.concatenate([boxes, np.concatenate([fc - [bw / 2, bh / 2], fc + [bw / 2, bh / 2]], axis=1)])
+
+        boxes = boxes.astype(np.float32)
+        yield boxes, rng.uniform(0.4, 0.95, size=len(boxes)).astype(np.float32), np.zeros(len(boxes), dtype=np.int64)
+
+
+def centred_roi(frame_shape, fraction=0.5):
+    # Rectangle ROI covering `fraction` of each frame dimension, as config.yaml polygons
+    h, w = frame_shape[:2]
+    mx, my = w * (1 - fraction) / 2, h * (1 - fraction) / 2
+    return [[int(mx), int(my)], [int(w - mx), int(my)], [int(w - mx), int(h - my)], [int(mx), int(h - my)]]
@@ -0,0 +1,81 @@
+import struct
+import numpy as np
+
+# Detection trace: header, then one record per frame
+#   header: b"CFTR" | uint16 version | uint16 width | uint16 height | float32 fps
+#   frame:  uint32 n | n x DET_DTYPE
+MAGIC = b"CFTR"
+VERSION = 1
+_HEADER = struct.Struct("<4sHHHf")
+_COUNT = struct.Struct("<I")
+DET_DTYPE = np.dtype([("box", "<f4", (4,)), ("score", "<f2"), ("cls", "u1")])
+
+
+class TraceWriter:
+    def __init__(self, path, width, height, fps=25.0):
+        self.f = open(path, "wb")
+        self.f.write(_HEADER.pack(MAGIC, VERSION, int(width), int(height), float(fps)))
+        self.frames = 0
+
+    def write(self, boxes, scores=None, classes=None):
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        rec = np.empty(len(boxes), dtype=DET_DTYPE)
+        rec["box"] = boxes
+        rec["score"] = 1.0 if scores is None else np.asarray(scores, dtype=np.float32)
+        rec["cls"] = 0 if classes is None else np.asarray(classes).astype(np.uint8)
+        self.f.write(_COUNT.pack(len(rec)))
+        self.f.write(rec.tobytes())
+        self.frames += 1
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TraceReader:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            magic, version, self.width, self.height, self.fps = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a v{VERSION} detection trace")
+
+    @property
+    def frame_shape(self):
+        return (self.height, self.width, 3)
+
+    def __iter__(self):
+        # -> (boxes [N,4] float32, scores [N] float32, classes [N] int64) per frame
+        with open(self.path, "rb") as f:
+            f.seek(_HEADER.size)
+            while True:
+                head = f.read(_COUNT.size)
+                if len(head) < _COUNT.size:
+                    return
+                (n,) = _COUNT.unpack(head)
+                rec = np.frombuffer(f.read(n * DET_DTYPE.itemsize), dtype=DET_DTYPE)
+                yield rec["box"].copy(), rec["score"].astype(np.float32), rec["cls"].astype(np.int64)
+
+    def load(self):
+        return list(self)
+
+
+def record_video(detector, video_path, trace_path, max_frames=None):
+    # Run detector over a video and store its per-frame detections
+    import cv2
+    cap = cv2.VideoCapture(video_path)
+    width, height = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    with TraceWriter(trace_path, width, height, cap.get(cv2.CAP_PROP_FPS) or 25) as writer:
+        while max_frames is None or writer.frames < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            writer.write(*detector.infer(frame))
+        frames = writer.frames
+    cap.release()
+    return frames
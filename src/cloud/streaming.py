@@ -1,8 +1,433 @@
-# Placeholder for Kafka/Spark/Flink integration
+import atexit
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+import numpy as np
+
+# Optional brokers: without them kafka:// and ws:// endpoints log a warning and drop their data
+try:
+    from kafka import KafkaProducer
+    KAFKA_AVAILABLE = True
+except ImportError:
+    KAFKA_AVAILABLE = False
+
+try:
+    import websocket
+    WEBSOCKET_AVAILABLE = True
+except ImportError:
+    WEBSOCKET_AVAILABLE = False
+
+# Outbound crowd-state stream. One state record:
+#   header  <HHdII  version, camera, timestamp (s), n positions, extra JSON length
+#   ids     uint32[n]
+#   xy      float32[n, 2]
+#   extra   UTF-8 JSON of the remaining scalar fields (counts, ...)
+# A batch is a sequence of records, each prefixed with its uint32 length.
+STATE_VERSION = 1
+_HEADER = struct.Struct("<HHdII")
+_LEN = struct.Struct("<I")
+POLICIES = ("drop", "coalesce", "block")
+
+
+def encode_state(state):
+    # state: {"camera", "timestamp", "ids", "positions" [N,2] or {id: (x, y)}, ...scalars} -> bytes
+    positions = state.get("positions", ())
+    if isinstance(positions, dict):
+        ids, positions = list(positions.keys()), list(positions.values())
+    else:
+        ids = state.get("ids")
+    xy = np.asarray(positions, dtype=np.float32).reshape(-1, 2)
+    ids = np.arange(len(xy), dtype=np.uint32) if ids is None else np.asarray(ids, dtype=np.uint32)
+    extra = {k: v for k, v in state.items() if k not in ("camera", "timestamp", "ids", "positions")}
+    extra = json.dumps(extra, separators=(",", ":"), default=float).encode() if extra else b""
+    header = _HEADER.pack(STATE_VERSION, int(state.get("camera", 0)), float(state.get("timestamp", 0.0)),
+                          len(ids), len(extra))
+    return header + ids.tobytes() + xy.tobytes() + extra
+
+
+def decode_state(buf):
+    version, camera, ts, n, n_extra = _HEADER.unpack_from(buf, 0)
+    if version != STATE_VERSION:
+        raise ValueError(f"Unsupported crowd state version {version}")
+    off = _HEADER.size
+    ids = np.frombuffer(buf, dtype=np.uint32, count=n, offset=off)
+    off += 4 * n
+    xy = np.frombuffer(buf, dtype=np.float32, count=2 * n, offset=off).reshape(n, 2)
+    off += 8 * n
+    state = json.loads(bytes(buf[off:off + n_extra])) if n_extra else {}
+    state.update(camera=camera, timestamp=ts, ids=ids, positions=xy)
+    return state
+
+
+def encode_batch(records):
+    # records: list of encoded states -> one length-prefixed batch
+    return b"".join(_LEN.pack(len(r)) + r for r in records)
+
+
+def decode_batch(buf):
+    off = 0
+    while off < len(buf):
+        (n,) = _LEN.unpack_from(buf, off)
+        off += _LEN.size
+        yield decode_state(memoryview(buf)[off:off + n])
+        off += n
+
+
+def state_from_tracks(camera, tracks, timestamp=None, **extra):
+    # {id: (x, y)} tracker output -> state dict. Only the dict is copied (so the tracker can reuse
+    # it); conversion to arrays happens on the publisher thread in encode_state()
+    state = {"camera": camera, "timestamp": time.time() if timestamp is None else timestamp,
+             "positions": dict(tracks)}
+    state.update(extra)
+    return state
+
+# --- transports ---
+
+class FileBroker:
+    """
+    Stand-in broker for tests and offline consumers: every batch is appended,
+    length-prefixed, to <root>/<topic>.log. read() replays a topic.
+    """
+
+    def __init__(self, root="data/outputs/stream"):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._files = {}
+
+    def send(self, topic, batch):
+        f = self._files.get(topic)
+        if f is None:
+            f = self._files[topic] = open(os.path.join(self.root, f"{topic}.log"), "ab")
+        f.write(_LEN.pack(len(batch)) + batch)
+        f.flush()
+
+    def read(self, topic):
+        # -> iterator of state dicts in publish order
+        with open(os.path.join(self.root, f"{topic}.log"), "rb") as f:
+            data = f.read()
+        off = 0
+        while off + _LEN.size <= len(data):
+            (n,) = _LEN.unpack_from(data, off)
+            off += _LEN.size
+            yield from decode_batch(data[off:off + n])
+            off += n
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+
+class SocketTransport:
+    # TCP client: each batch is framed as <topic length><topic><batch length><batch>; reconnects on error
+    def __init__(self, host, port, timeout=2.0):
+        self.addr = (host, int(port))
+        self.timeout = timeout
+        self.sock = None
+
+    def send(self, topic, batch):
+        if self.sock is None:
+            self.sock = socket.create_connection(self.addr, timeout=self.timeout)
+        t = topic.encode()
+        try:
+            self.sock.sendall(_LEN.pack(len(t)) + t + _LEN.pack(len(batch)) + batch)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class SocketBroker:
+    """
+    Local TCP stand-in broker: accepts SocketTransport connections and
+    appends every batch to a FileBroker, so socket publishing can be tested
+    without Kafka; with a handler, handler(topic, batch) receives the
+    batches instead (in-process consumers such as the API). Runs on daemon
+    threads until close().
+    """
+
+    def __init__(self, host="127.0.0.1", port=9092, root="data/outputs/stream", handler=None):
+        self.files = FileBroker(root) if handler is None else None
+        self.handler = handler if handler is not None else self.files.send
+        self._lock = threading.Lock()
+        self.server = socket.create_server((host, port))
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _recv(self, conn, n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = conn.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("closed")
+            buf += chunk
+        return bytes(buf)
+
+    def _serve(self, conn):
+        with conn:
+            try:
+                while True:
+                    topic = self._recv(conn, _LEN.unpack(self._recv(conn, _LEN.size))[0]).decode()
+                    batch = self._recv(conn, _LEN.unpack(self._recv(conn, _LEN.size))[0])
+                    with self._lock:
+                        self.handler(topic, batch)
+            except (ConnectionError, OSError):
+                return
+
+    def close(self):
+        self.server.close()
+        if self.files is not None:
+            self.files.close()
+
+
+class KafkaTransport:
+    def __init__(self, bootstrap_servers="localhost:9092"):
+        if not KAFKA_AVAILABLE:
+            raise ImportError("kafka-python is required for kafka:// endpoints")
+        self.producer = KafkaProducer(bootstrap_servers=bootstrap_servers, linger_ms=0)
+
+    def send(self, topic, batch):
+        self.producer.send(topic, batch)
+
+    def close(self):
+        self.producer.flush()
+        self.producer.close()
+
+
+class WebSocketTransport:
+    # Binary frames to a 3D engine / AR app; the topic is not sent
+    def __init__(self, url, timeout=2.0):
+        if not WEBSOCKET_AVAILABLE:
+            raise ImportError("websocket-client is required for ws:// endpoints")
+        self.url = url
+        self.timeout = timeout
+        self.ws = None
+
+    def send(self, topic, batch):
+        if self.ws is None:
+            self.ws = websocket.create_connection(self.url, timeout=self.timeout)
+        try:
+            self.ws.send_binary(batch)
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+            self.ws = None
+
+
+class NullTransport:
+    # Stands in for a broker whose client library is not installed: batches are counted and dropped
+    def __init__(self, endpoint, package):
+        self.dropped = 0
+        print(f"[STREAM] {package} is not installed: data for {endpoint} will be dropped "
+              f"(pip install {package})")
+
+    def send(self, topic, batch):
+        self.dropped += 1
+
+
+def open_transport(endpoint):
+    # file://<dir>, tcp://host:port, kafka://host:port, ws(s)://...
+    url = urlparse(endpoint)
+    if url.scheme == "file":
+        return FileBroker(url.netloc + url.path)
+    if url.scheme == "tcp":
+        return SocketTransport(url.hostname, url.port)
+    if url.scheme == "kafka":
+        return KafkaTransport(url.netloc) if KAFKA_AVAILABLE else NullTransport(endpoint, "kafka-python")
+    if url.scheme in ("ws", "wss"):
+        return WebSocketTransport(endpoint) if WEBSOCKET_AVAILABLE else NullTransport(endpoint, "websocket-client")
+    raise ValueError(f"Unsupported stream endpoint: {endpoint}")
+
+# --- publisher ---
+
+class Publisher:
+    """
+    Asynchronous, batched publisher for one (transport, topic). publish()
+    only enqueues; a background thread encodes and sends batches of up to
+    max_batch states, or whatever is pending after max_delay_ms.
+
+    When max_queue states are pending, policy decides:
+      drop      discard the new state
+      coalesce  keep only the latest state per key (camera), in place
+      block     wait for room (backpressure onto the caller)
+    """
+
+    def __init__(self, transport, topic="crowd_state", max_queue=256, max_batch=32, max_delay_ms=50,
+                 policy="coalesce"):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}")
+        self.transport = transport
+        self.topic = topic
+        self.max_queue = max(1, int(max_queue))
+        self.max_batch = max(1, int(max_batch))
+        self.max_delay = max_delay_ms / 1000.0
+        self.policy = policy
+        self._pending = deque()   # keys (coalesce) or states
+        self._latest = {}         # key -> latest state (coalesce)
+        self._first_at = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self.published = self.dropped = self.coalesced = self.batches = self.errors = self.encode_errors = 0
+        self.thread = threading.Thread(target=self._run, name=f"publish-{topic}", daemon=True)
+        self.thread.start()
+
+    def publish(self, state, key=None):
+        # Never encodes or sends on the caller's thread; returns False when the state was dropped
+        with self._cond:
+            if self._closed:
+                return False
+            if self.policy == "coalesce":
+                key = state.get("camera") if key is None else key
+                if key in self._latest:
+                    self._latest[key] = state
+                    self.coalesced += 1
+                    return True
+                if len(self._pending) >= self.max_queue:
+                    self.dropped += 1
+                    return False
+                self._latest[key] = state
+                self._pending.append(key)
+            else:
+                while self.policy == "block" and len(self._pending) >= self.max_queue and not self._closed:
+                    self._cond.wait()
+                if len(self._pending) >= self.max_queue:
+                    self.dropped += 1
+                    return False
+                self._pending.append(state)
+            if self._first_at is None:
+                # Wake the idle sender so it starts the max_delay clock
+                self._first_at = time.monotonic()
+                self._cond.notify_all()
+            elif len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+            return True
+
+    def _take(self):
+        # Wait for a full batch, the delay of the oldest pending state, or close
+        with self._cond:
+            while True:
+                if self._pending:
+                    waited = time.monotonic() - self._first_at
+                    if len(self._pending) >= self.max_batch or waited >= self.max_delay or self._closed:
+                        break
+                    self._cond.wait(self.max_delay - waited)
+                elif self._closed:
+                    return None
+                else:
+                    self._cond.wait()
+            n = min(self.max_batch, len(self._pending))
+            items = [self._pending.popleft() for _ in range(n)]
+            if self.policy == "coalesce":
+                items = [self._latest.pop(k) for k in items]
+            self._first_at = time.monotonic() if self._pending else None
+            self._cond.notify_all()
+            return items
+
+    def _run(self):
+        while True:
+            states = self._take()
+            if states is None:
+                return
+            records = []
+            for s in states:
+                # One bad state (e.g. an extra field that is not JSON-serializable) must not lose the batch
+                try:
+                    records.append(encode_state(s))
+                except Exception as e:
+                    self.encode_errors += 1
+                    if self.encode_errors == 1 or self.encode_errors % 100 == 0:
+                        print(f"[STREAM] {self.topic}: cannot encode state ({self.encode_errors} so far): {e}")
+            if not records:
+                continue
+            try:
+                self.transport.send(self.topic, encode_batch(records))
+                self.published += len(records)
+                self.batches += 1
+            except Exception as e:
+                self.errors += 1
+                if self.errors == 1 or self.errors % 100 == 0:
+                    print(f"[STREAM] {self.topic}: send failed ({self.errors} batches so far): {e}")
+
+    def stats(self):
+        return {"published": self.published, "dropped": self.dropped, "coalesced": self.coalesced,
+                "batches": self.batches, "errors": self.errors, "encode_errors": self.encode_errors, "pending": len(self._pending)}
+
+    def close(self, timeout=5.0):
+        # Send what is pending, then stop the thread and the transport
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.thread.join(timeout)
+        close = getattr(self.transport, "close", None)
+        if close is not None:
+            close()
+
+
+class PublisherGroup:
+    # Fan one state out to several publishers; each has its own queue, so a slow consumer only backs up itself
+    def __init__(self, publishers):
+        self.publishers = list(publishers)
+
+    def publish(self, state, key=None):
+        for p in self.publishers:
+            p.publish(state, key)
+
+    def stats(self):
+        return {f"{p.topic}": p.stats() for p in self.publishers}
+
+
+_PUBLISHERS = {}
+_PUBLISHERS_LOCK = threading.Lock()
+
+
+def get_publisher(endpoint, topic="crowd_state", **kw):
+    # Process-wide publisher per (endpoint, topic), flushed at exit
+    key = (endpoint, topic)
+    with _PUBLISHERS_LOCK:
+        pub = _PUBLISHERS.get(key)
+        if pub is None:
+            pub = _PUBLISHERS[key] = Publisher(open_transport(endpoint), topic, **kw)
+        return pub
+
+
+@atexit.register
+def close_all():
+    with _PUBLISHERS_LOCK:
+        pubs = list(_PUBLISHERS.values())
+        _PUBLISHERS.clear()
+    for pub in pubs:
+        pub.close()
+
 
 def send_to_kafka(topic, data, kafka_host="localhost:9092"):
-    # Use kafka-python or confluent-kafka
-    print(f"[KAFKA] Topic: {topic}, Data: {data}")
+    # Queued on the shared kafka publisher; returns immediately. Records are the binary batch
+    # format above (decode with decode_batch), not the JSON messages this used to send
+    get_publisher(f"kafka://{kafka_host}", topic).publish(data)
 
 # Example usage:
-# send_to_kafka("crowdflow", {"active": 123}) 
\ No newline at end of file
+# pub = get_publisher("file://data/outputs/stream", "crowd_state", policy="coalesce")
+# pub.publish(state_from_tracks(cam_id, tracks, active=len(tracks)))
+# for state in FileBroker("data/outputs/stream").read("crowd_state"): ...
+# send_to_kafka("crowdflow", {"camera": 1, "active": 123})
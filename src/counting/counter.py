@@ -2,18 +2,39 @@ import numpy as np
 from shapely.geometry import Point, Polygon
 
 class FlowCounter:
-    def __init__(self, roi_polygon):
+    def __init__(self, roi_polygon, roi_mask=None, max_missing=30):
         self.roi = Polygon(roi_polygon)  # [(x,y), ...]
         self.prev_positions = {}         # id -> (x,y)
         self.in_count = 0
         self.out_count = 0
+        # Tracks absent for more than max_missing updates are forgotten
+        self.max_missing = max_missing
+        self._last_seen = {}             # id -> frame index (polygon mode)
+        self._frame_idx = 0
+        # Raster mode: per-camera ROI mask, per-track state kept sorted by id
+        self.roi_mask = None
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._xy = np.zeros((0, 2), dtype=np.float32)
+        self._inside = np.zeros(0, dtype=bool)
+        self._missing = np.zeros(0, dtype=np.int64)
+        if roi_mask is not None:
+            self.set_mask(roi_mask)
+
+    def set_mask(self, roi_mask):
+        # roi_mask: HxW array, non-zero inside the ROI (see main.inside_polygon_mask)
+        self.roi_mask = np.asarray(roi_mask) > 0
 
     def update(self, tracked_points):
         # tracked_points = {id: (x,y)}
+        if self.roi_mask is not None:
+            return self._update_raster(tracked_points)
+
+        self._frame_idx += 1
         for oid, pt in tracked_points.items():
             p = Point(pt[0], pt[1])
             prev = self.prev_positions.get(oid)
             self.prev_positions[oid] = pt
+            self._last_seen[oid] = self._frame_idx
             if prev is None:
                 continue
             prev_inside = self.roi.contains(Point(prev[0], prev[1]))
@@ -23,4 +44,54 @@ class FlowCounter:
             elif not prev_inside and now_inside:
                 self.in_count += 1
 
-        return self.in_count, self.out_count 
\ No newline at end of file
+        if len(self._last_seen) > len(tracked_points):
+            stale = [oid for oid, seen in self._last_seen.items() if self._frame_idx - seen > self.max_missing]
+            for oid in stale:
+                del self._last_seen[oid]
+                self.prev_positions.pop(oid, None)
+
+        return self.in_count, self.out_count
+
+    def contains(self, xy):
+        # xy: [N,2] -> [N] bool, one raster lookup; points off the frame are outside
+        xy = np.asarray(xy, dtype=np.float32).reshape(-1, 2)
+        h, w = self.roi_mask.shape
+        xi = np.floor(xy[:, 0]).astype(np.int64)
+        yi = np.floor(xy[:, 1]).astype(np.int64)
+        valid = (xi >= 0) & (xi < w) & (yi >= 0) & (yi < h)
+        inside = np.zeros(len(xy), dtype=bool)
+        inside[valid] = self.roi_mask[yi[valid], xi[valid]]
+        return inside
+
+    def _update_raster(self, tracked_points):
+        n = len(tracked_points)
+        ids = np.fromiter(tracked_points.keys(), dtype=np.int64, count=n)
+        xy = np.array([(float(p[0]), float(p[1])) for p in tracked_points.values()], dtype=np.float32).reshape(-1, 2)
+        now_inside = self.contains(xy)
+
+        # Match against the previous frame's state
+        pos = np.searchsorted(self._ids, ids)
+        pos_c = np.minimum(pos, max(len(self._ids) - 1, 0))
+        found = (pos < len(self._ids)) & (self._ids[pos_c] == ids) if len(self._ids) else np.zeros(n, dtype=bool)
+        prev_idx = pos_c[found]
+        prev_inside = self._inside[prev_idx]
+        cur_inside = now_inside[found]
+        self.out_count += int(np.count_nonzero(prev_inside & ~cur_inside))
+        self.in_count += int(np.count_nonzero(~prev_inside & cur_inside))
+
+        # Refresh tracks seen this frame, age out the rest
+        self._missing += 1
+        self._missing[prev_idx] = 0
+        self._xy[prev_idx] = xy[found]
+        self._inside[prev_idx] = cur_inside
+        keep = self._missing <= self.max_missing
+
+        new = ~found
+        ids_all = np.concatenate([self._ids[keep], ids[new]])
+        order = np.argsort(ids_all, kind="stable")
+        self._ids = ids_all[order]
+        self._xy = np.concatenate([self._xy[keep], xy[new]])[order]
+        self._inside = np.concatenate([self._inside[keep], now_inside[new]])[order]
+        self._missing = np.concatenate([self._missing[keep], np.zeros(int(new.sum()), dtype=np.int64)])[order]
+
+        return self.in_count, self.out_count
@@ -8,6 +8,11 @@ import subprocess
 import numpy as np
 import sys
 
+# Make the src packages importable when run as `streamlit run src/dashboard/app.py`
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from storage import metrics_store
+from dashboard.data import MetricsCache
+
 # Try to import OpenCV, but provide fallback if not available
 try:
     import cv2
@@ -15,6 +20,13 @@ try:
 except ImportError:
     OPENCV_AVAILABLE = False
 
+TIME_RANGES = {"Last hour": "1h", "Last 6 hours": "6h", "Last 24 hours": "24h", "Last 7 days": "7D", "All": None}
+
+@st.cache_resource
+def get_metrics_cache(db_path, csv_path):
+    # One per server process: parsed rows survive reruns and only new rows are read
+    return MetricsCache(db_path, csv_path)
+
 def main():
     st.set_page_config(page_title="CrowdFlow AI Dashboard", layout="wide")
     st.title("CrowdFlow AI Dashboard")
@@ -25,7 +37,9 @@ def main():
         st.info("For full functionality, please run this locally or use a different deployment platform.")
 
     API_URL = "http://localhost:8000/metrics/latest"
+    STREAM_URL = "http://localhost:8000/stream/{camera_id}?fps={fps}"
     METRICS_PATH = "data/outputs/metrics.csv"
+    METRICS_DB = "data/outputs/metrics_db"
     CONFIG_PATH = "src/config.yaml"
     VIDEO_DIR = "data/videos/"
 
@@ -106,6 +120,18 @@ def main():
         else:
             st.info("Video overlay preview requires OpenCV (not available in this environment)")
 
+    # Live MJPEG stream served by the API from the detector's shared-memory feed
+    if st.sidebar.checkbox("Show live stream"):
+        live_fps = st.sidebar.slider("Live stream FPS", 1, 30, 10)
+        try:
+            with open(CONFIG_PATH, "r") as f:
+                live_cam = yaml.safe_load(f)["video_sources"][0]["id"]
+        except Exception:
+            live_cam = 1
+        st.subheader("Live Stream")
+        st.markdown(f'<img src="{STREAM_URL.format(camera_id=live_cam, fps=live_fps)}" style="width:100%">',
+                    unsafe_allow_html=True)
+
     # Show overlayed video if available
     overlayed_video_path = "data/outputs/overlayed_video.mp4"
     if os.path.exists(overlayed_video_path):
@@ -141,31 +167,34 @@ def main():
     elif selected_video and not OPENCV_AVAILABLE:
         st.info("Video processing requires OpenCV (not available in this environment)")
 
-    # Load metrics history
-    if os.path.exists(METRICS_PATH):
+    # Load metrics history (incrementally) for the selected time range
+    st.sidebar.header("Metrics")
+    range_label = st.sidebar.selectbox("Time range", list(TIME_RANGES), index=2)
+    max_points = st.sidebar.slider("Chart points per camera", 200, 5000, 1000, step=100)
+    method = st.sidebar.radio("Downsampling", ["lttb", "minmax"],
+                              format_func=lambda m: "LTTB (shape)" if m == "lttb" else "Min/max (keeps peaks)")
+    if metrics_store.exists(METRICS_DB) or os.path.exists(METRICS_PATH):
         try:
-            df = pd.read_csv(METRICS_PATH)
+            cache = get_metrics_cache(METRICS_DB, METRICS_PATH)
+            cache.refresh()
+            window = TIME_RANGES[range_label]
+            # Floored to the minute so reruns within a minute reuse the memoised charts
+            start = (pd.Timestamp.now(tz="UTC").floor("min") - pd.Timedelta(window)) if window else None
+            df = cache.range(start)
             if not df.empty:
                 # Show last N events
                 st.subheader("Recent Events")
                 st.dataframe(df.tail(10).reset_index(drop=True))
-                # Plot time series charts
+                # Plot time series charts, downsampled per camera
                 st.subheader("Metrics Over Time")
                 chart_cols = st.columns(4)
-                with chart_cols[0]:
-                    st.line_chart(df["active"])
-                    st.caption("Active Count")
-                with chart_cols[1]:
-                    st.line_chart(df["in"])
-                    st.caption("In Count")
-                with chart_cols[2]:
-                    st.line_chart(df["out"])
-                    st.caption("Out Count")
-                with chart_cols[3]:
-                    st.line_chart(df["net"])
-                    st.caption("Net Count")
+                for col, (column, caption) in zip(chart_cols, [("active", "Active Count"), ("in", "In Count"),
+                                                               ("out", "Out Count"), ("net", "Net Count")]):
+                    with col:
+                        st.line_chart(cache.chart(column, start, max_points=max_points, method=method))
+                        st.caption(caption)
             else:
-                st.warning("Metrics file is empty. Please process a video.")
+                st.warning(f"No metrics in the selected range ({range_label.lower()}).")
         except Exception as e:
             st.error(f"Error loading metrics: {e}")
     else:
@@ -0,0 +1,166 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from storage import metrics_store
+
+VALUE_COLUMNS = ("active", "in", "out", "net")
+
+
+def _utc(ts):
+    return pd.to_datetime(ts, utc=True, format="mixed")
+
+# --- downsampling ---
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets: indices of n_out points that keep the
+    visual shape of (x, y). The first and last points are always kept; each
+    bucket in between keeps the point forming the largest triangle with the
+    previously kept point and the next bucket's mean.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    edges = np.append(edges, n)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        nlo, nhi = hi, max(edges[i + 2], hi + 1)
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+
+def minmax(y, n_out):
+    # Indices of the min and max of n_out // 2 equal-count buckets, in order: keeps every spike
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    buckets = max(1, n_out // 2)
+    starts = np.linspace(0, n, buckets + 1).astype(np.int64)[:-1]
+    bucket = np.repeat(np.arange(buckets), np.diff(np.append(starts, n)))
+    # Sorted by (bucket, y), each bucket's first and last entries are its min and max
+    order = np.lexsort((np.asarray(y, dtype=np.float64), bucket))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([order[starts], order[ends], [0, n - 1]]))
+
+
+def downsample(df, column, max_points=1000, method="lttb"):
+    # -> DataFrame indexed by timestamp, one column per camera, at most max_points rows per camera
+    if df.empty:
+        return pd.DataFrame()
+    series = {}
+    for camera, group in df.groupby("camera", sort=True):
+        ts = group["timestamp"].to_numpy(dtype="datetime64[ns]")
+        y = group[column].to_numpy()
+        idx = lttb(ts.astype(np.int64), y, max_points) if method == "lttb" else minmax(y, max_points)
+        series[f"cam {camera}"] = pd.Series(y[idx], index=ts[idx])
+    return pd.concat(series, axis=1).sort_index()
+
+# --- incremental cache ---
+
+class MetricsCache:
+    """
+    Dashboard data layer, kept across Streamlit reruns (st.cache_resource).
+    With the metrics store, range() loads only the day partitions not loaded
+    yet (older ranges are prepended) and refresh() reads only rows at or
+    after the newest one loaded. Without it, metrics.csv is tailed with
+    CsvTail. Downsampled chart series are memoised until new rows arrive.
+    """
+
+    def __init__(self, root="data/outputs/metrics_db", csv_path="data/outputs/metrics.csv"):
+        self.root = root
+        self.csv = metrics_store.CsvTail(csv_path)
+        self.store = None
+        self.df = pd.DataFrame(columns=metrics_store.COLUMNS)
+        self.loaded_from = None  # oldest timestamp loaded; None with nothing (or everything) loaded
+        self.complete = False    # whole history loaded
+        self.version = 0
+        self._charts = {}
+        self._lock = threading.Lock()
+
+    def _get_store(self):
+        if self.store is None and metrics_store.exists(self.root):
+            self.store = metrics_store.MetricsStore(self.root, readonly=True)
+        return self.store
+
+    def _append(self, new):
+        if new.empty:
+            return
+        self.df = pd.concat([self.df, new], ignore_index=True) if not self.df.empty else new.reset_index(drop=True)
+        self.version += 1
+        self._charts = {}
+
+    def refresh(self):
+        # Pull rows logged since the last call -> number of new rows
+        with self._lock:
+            store = self._get_store()
+            if store is None:
+                n = self.csv.read_new()
+                if n:
+                    self.df = self.csv.df
+                    self.complete = True
+                    self.version += 1
+                    self._charts = {}
+                return n
+            if self.df.empty:
+                return 0  # nothing loaded yet; range() does the first load
+            last = self.df["timestamp"].iloc[-1]
+            new = store.query(start=last)
+            # Rows at exactly `last` may have been loaded already: replace them
+            keep = self.df["timestamp"] < last
+            n_old = int((~keep).sum())
+            if len(new) <= n_old:
+                return 0
+            self.df = self.df[keep].reset_index(drop=True)
+            self._append(new)
+            return len(new) - n_old
+
+    def range(self, start=None, end=None):
+        # Rows with start <= timestamp <= end (None = unbounded), loading older partitions on demand
+        start = _utc(start) if start is not None else None
+        end = _utc(end) if end is not None else None
+        with self._lock:
+            store = self._get_store()
+            if store is not None and not self.complete:
+                if self.df.empty:
+                    self._append(store.query(start=start))
+                    self.loaded_from, self.complete = start, start is None
+                elif start is None or start < self.loaded_from:
+                    older = store.query(start=start, end=self.loaded_from)
+                    older = older[older["timestamp"] < self.loaded_from]
+                    if not older.empty:
+                        self.df = pd.concat([older, self.df], ignore_index=True)
+                        self.version += 1
+                        self._charts = {}
+                    self.loaded_from, self.complete = start, start is None
+            df = self.df
+        if df.empty:
+            return df
+        ts = df["timestamp"].to_numpy(dtype="datetime64[ns]")
+        lo = 0 if start is None else np.searchsorted(ts, start.tz_convert(None).to_datetime64(), side="left")
+        hi = len(df) if end is None else np.searchsorted(ts, end.tz_convert(None).to_datetime64(), side="right")
+        return df.iloc[lo:hi]
+
+    def chart(self, column, start=None, end=None, max_points=1000, method="lttb"):
+        # Downsampled per-camera series for one column, memoised per data version
+        key = (column, start, end, max_points, method, self.version)
+        hit = self._charts.get(key)
+        if hit is None:
+            hit = self._charts[key] = downsample(self.range(start, end), column, max_points, method)
+        return hit
+
+# Example usage:
+# cache = MetricsCache()          # once per server process (st.cache_resource)
+# cache.refresh()                 # every rerun: only new rows are read
+# df = cache.range(start=pd.Timestamp.utcnow() - pd.Timedelta("6h"))
+# st.line_chart(cache.chart("active", start, max_points=1000))
@@ -0,0 +1,94 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class BatchScheduler:
+    """
+    Collects frames submitted by several camera threads and runs them through
+    detector.infer_batch in one call, flushing when max_batch frames are
+    waiting or max_delay_ms has passed since the first frame of the batch.
+    """
+
+    def __init__(self, detector, max_batch=8, max_delay_ms=20):
+        self.detector = detector
+        self.max_batch = max(1, int(max_batch))
+        self.max_delay = max(0.0, max_delay_ms / 1000.0)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._running = False
+
+    def start(self):
+        if self._thread is None:
+            self._running = True
+            self._thread = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        self._queue.put(None)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, frame):
+        fut = Future()
+        self._queue.put((frame, fut))
+        return fut
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._running = False
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while self._running:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = self._collect(first)
+            frames = [frame for frame, _ in batch]
+            try:
+                results = self.detector.infer_batch(frames)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), res in zip(batch, results):
+                fut.set_result(res)
+        # Fail anything still queued so camera threads don't hang
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                item[1].set_exception(RuntimeError("BatchScheduler stopped"))
+
+
+class BatchedDetector:
+    # Drop-in for YOLODetector.infer that routes frames through a shared BatchScheduler
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    def infer(self, frame):
+        return self.scheduler.submit(frame).result()
+
+# Example usage:
+# scheduler = BatchScheduler(YOLODetector("yolov8n.pt"), max_batch=8, max_delay_ms=20).start()
+# boxes, scores, classes = BatchedDetector(scheduler).infer(frame)  # called from each camera thread
+# scheduler.stop()
@@ -0,0 +1,175 @@
+import glob
+import cv2
+import numpy as np
+
+# onnxruntime is optional: only the "onnx" backend needs it
+try:
+    import onnxruntime as ort
+    ORT_AVAILABLE = True
+except ImportError:
+    ORT_AVAILABLE = False
+
+
+def letterbox(frame, imgsz=640, pad_value=114):
+    # Resize keeping aspect ratio and pad to imgsz x imgsz -> (image, ratio, (pad_x, pad_y))
+    h, w = frame.shape[:2]
+    r = min(imgsz / h, imgsz / w)
+    nh, nw = int(round(h * r)), int(round(w * r))
+    img = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR) if (nh, nw) != (h, w) else frame
+    pad_y, pad_x = (imgsz - nh) // 2, (imgsz - nw) // 2
+    out = np.full((imgsz, imgsz, 3), pad_value, dtype=np.uint8)
+    out[pad_y:pad_y + nh, pad_x:pad_x + nw] = img
+    return out, r, (pad_x, pad_y)
+
+
+def preprocess(frames, imgsz=640):
+    # BGR frames -> NCHW float32 RGB in [0,1], plus per-frame (ratio, pad) to undo the letterbox
+    batch = np.empty((len(frames), 3, imgsz, imgsz), dtype=np.float32)
+    meta = []
+    for i, frame in enumerate(frames):
+        img, r, pad = letterbox(frame, imgsz)
+        batch[i] = img[:, :, ::-1].transpose(2, 0, 1) * (1.0 / 255.0)
+        meta.append((r, pad))
+    return batch, meta
+
+
+def box_iou(boxes):
+    # [N,4] xyxy -> [N,N] pairwise IoU
+    x1 = np.maximum(boxes[:, None, 0], boxes[None, :, 0])
+    y1 = np.maximum(boxes[:, None, 1], boxes[None, :, 1])
+    x2 = np.minimum(boxes[:, None, 2], boxes[None, :, 2])
+    y2 = np.minimum(boxes[:, None, 3], boxes[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    union = area[:, None] + area[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+
+def nms(boxes, scores, classes, iou_thres=0.45, max_det=300, max_candidates=3000):
+    # Class-aware greedy NMS. IoUs are computed once as a matrix; the greedy pass only
+    # runs over kept boxes and each step is one vectorized row operation.
+    order = np.argsort(-scores, kind="stable")[:max_candidates]
+    if len(order) == 0:
+        return order
+    b = boxes[order]
+    # Offset boxes per class so different classes never overlap
+    b = b + (classes[order].astype(np.float32) * 4096.0)[:, None]
+    iou = box_iou(b)
+    suppressed = np.zeros(len(order), dtype=bool)
+    keep = []
+    for i in range(len(order)):
+        if suppressed[i]:
+            continue
+        keep.append(i)
+        if len(keep) >= max_det:
+            break
+        suppressed |= iou[i] > iou_thres
+    return order[np.array(keep, dtype=np.int64)]
+
+
+def postprocess(output, meta, frame_shapes, conf=0.3, iou=0.45, classes=None, max_det=300):
+    # YOLOv8 head output [B, 4+nc, A] (cx,cy,w,h + class scores) -> [(boxes, scores, classes), ...]
+    preds = np.asarray(output).transpose(0, 2, 1)
+    results = []
+    for p, (r, (pad_x, pad_y)), shape in zip(preds, meta, frame_shapes):
+        cls_scores = p[:, 4:]
+        cls = cls_scores.argmax(axis=1)
+        score = cls_scores[np.arange(len(cls)), cls]
+        mask = score > conf
+        if classes is not None:
+            mask &= np.isin(cls, classes)
+        p, cls, score = p[mask], cls[mask], score[mask]
+        xy, wh = p[:, :2], p[:, 2:4] / 2
+        boxes = np.concatenate([xy - wh, xy + wh], axis=1)
+        keep = nms(boxes, score, cls, iou, max_det)
+        boxes, score, cls = boxes[keep], score[keep], cls[keep]
+        # Undo the letterbox
+        boxes = (boxes - np.array([pad_x, pad_y, pad_x, pad_y], dtype=np.float32)) / r
+        h, w = shape[:2]
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+        results.append((boxes.astype(np.float32), score.astype(np.float32), cls.astype(np.int64)))
+    return results
+
+
+class ONNXDetector:
+    # Same interface as YOLODetector, backed by an exported (optionally INT8) YOLOv8 .onnx model
+    def __init__(self, onnx_path="yolov8n.onnx", conf=0.3, iou=0.45, imgsz=640, classes=(0,),
+                 providers=("CPUExecutionProvider",), threads=0):
+        if not ORT_AVAILABLE:
+            raise ImportError("onnxruntime is required for the onnx backend (pip install onnxruntime)")
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            opts.intra_op_num_threads = int(threads)
+        self.session = ort.InferenceSession(onnx_path, sess_options=opts, providers=list(providers))
+        self.input_name = self.session.get_inputs()[0].name
+        self.conf = conf
+        self.iou = iou
+        self.imgsz = imgsz
+        self.classes = list(classes) if classes is not None else None
+
+    def infer(self, frame):
+        return self.infer_batch([frame])[0]
+
+    def infer_batch(self, frames):
+        frames = list(frames)
+        batch, meta = preprocess(frames, self.imgsz)
+        output = self.session.run(None, {self.input_name: batch})[0]
+        return postprocess(output, meta, [f.shape for f in frames], self.conf, self.iou, self.classes)
+
+
+def sample_calibration_frames(video_paths, n_frames=200, imgsz=640):
+    # Evenly spaced frames from our own videos, preprocessed like inference input
+    frames = []
+    per_video = max(1, n_frames // max(1, len(video_paths)))
+    for path in video_paths:
+        cap = cv2.VideoCapture(path)
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) or per_video
+        for idx in np.linspace(0, max(total - 1, 0), per_video).astype(int):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(idx))
+            ret, frame = cap.read()
+            if ret:
+                frames.append(preprocess([frame], imgsz)[0])
+        cap.release()
+    return frames
+
+
+def quantize_int8(onnx_path, out_path, video_paths, n_frames=200, imgsz=640, per_channel=True):
+    # Static INT8 (QDQ) quantization calibrated on frames from video_paths
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    frames = sample_calibration_frames(video_paths, n_frames, imgsz)
+    if not frames:
+        raise ValueError(f"No calibration frames could be read from {video_paths}")
+    input_name = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self):
+            self._it = iter(frames)
+
+        def get_next(self):
+            batch = next(self._it, None)
+            return None if batch is None else {input_name: batch}
+
+    quantize_static(onnx_path, out_path, _Reader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=per_channel)
+    print(f"Quantized {onnx_path} -> {out_path} using {len(frames)} calibration frames")
+    return out_path
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Static INT8 quantization of an exported YOLO .onnx model")
+    parser.add_argument("onnx_path")
+    parser.add_argument("out_path")
+    parser.add_argument("--videos", nargs="+", default=["data/videos/*.mp4"])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--imgsz", type=int, default=640)
+    args = parser.parse_args()
+    videos = [p for pattern in args.videos for p in sorted(glob.glob(pattern))]
+    quantize_int8(args.onnx_path, args.out_path, videos, args.frames, args.imgsz)
+
+# Example usage:
+# python src/detectors/onnx_detector.py yolov8n.onnx yolov8n.int8.onnx --videos data/videos/*.mp4
+# detector = ONNXDetector("yolov8n.int8.onnx", conf=0.3)
+# boxes, scores, classes = detector.infer(frame)
@@ -0,0 +1,50 @@
+import numpy as np
+
+
+def roi_rect(roi, frame_shape, margin=32):
+    # Bounding rectangle (x1, y1, x2, y2) of the ROI polygon plus margin px, clipped to the frame
+    pts = np.asarray(roi, dtype=np.float32).reshape(-1, 2)
+    h, w = frame_shape[:2]
+    x1 = int(max(0, np.floor(pts[:, 0].min()) - margin))
+    y1 = int(max(0, np.floor(pts[:, 1].min()) - margin))
+    x2 = int(min(w, np.ceil(pts[:, 0].max()) + margin + 1))
+    y2 = int(min(h, np.ceil(pts[:, 1].max()) + margin + 1))
+    return x1, y1, x2, y2
+
+
+class RoiCropDetector:
+    """
+    Wraps a detector (YOLODetector, BatchedDetector, ...) so only the ROI's
+    bounding rectangle plus a margin is inferred. Boxes come back in
+    full-frame coordinates, so tracking and counting are unchanged.
+    """
+
+    def __init__(self, detector, roi, margin=32):
+        self.detector = detector
+        self.roi = roi
+        self.margin = margin
+        self._shape = None
+        self._rect = None
+
+    def rect(self, frame_shape):
+        if frame_shape[:2] != self._shape:
+            self._shape = frame_shape[:2]
+            self._rect = roi_rect(self.roi, frame_shape, self.margin)
+        return self._rect
+
+    def infer(self, frame):
+        x1, y1, x2, y2 = self.rect(frame.shape)
+        if x2 <= x1 or y2 <= y1:
+            # ROI lies outside the frame
+            return np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        # Contiguous copy: some backends reject strided views
+        crop = np.ascontiguousarray(frame[y1:y2, x1:x2])
+        boxes, scores, classes = self.detector.infer(crop)
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        if len(boxes):
+            boxes = boxes + np.array([x1, y1, x1, y1], dtype=np.float32)
+        return boxes, scores, classes
+
+# Example usage:
+# detector = RoiCropDetector(YOLODetector("yolov8n.pt"), cam["roi"], margin=32)
+# boxes, scores, classes = detector.infer(frame)  # boxes in full-frame coordinates
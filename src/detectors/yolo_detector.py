@@ -2,21 +2,25 @@ from ultralytics import YOLO
 import numpy as np
 
 class YOLODetector:
-    def __init__(self, weights: str = "yolov8n.pt", conf: float = 0.3, iou: float = 0.45):
+    def __init__(self, weights: str = "yolov8n.pt", conf: float = 0.3, iou: float = 0.45, classes=None):
         self.model = YOLO(weights)
         self.conf = conf
         self.iou = iou
+        self.classes = list(classes) if classes is not None else None  # None keeps every class
 
     def infer(self, frame):
-        results = self.model.predict(source=frame, stream=False, conf=self.conf, iou=self.iou, verbose=False)
-        boxes_xyxy = []
-        scores = []
-        classes = []
-        for r in results:
-            for b, c, s in zip(r.boxes.xyxy.cpu().numpy(),
-                               r.boxes.cls.cpu().numpy(),
-                               r.boxes.conf.cpu().numpy()):
-                boxes_xyxy.append(b.astype(np.float32))
-                scores.append(float(s))
-                classes.append(int(c))
-        return np.array(boxes_xyxy), np.array(scores), np.array(classes) 
\ No newline at end of file
+        return self.infer_batch([frame])[0]
+
+    def infer_batch(self, frames):
+        # One forward pass for frames from several cameras.
+        # Returns [(boxes_xyxy [N,4] float32, scores [N] float32, classes [N] int64), ...] per frame
+        results = self.model.predict(source=list(frames), stream=False, conf=self.conf, iou=self.iou,
+                                     classes=self.classes, verbose=False)
+        return [self._unpack(r) for r in results]
+
+    @staticmethod
+    def _unpack(r):
+        boxes = r.boxes
+        return (boxes.xyxy.cpu().numpy().astype(np.float32).reshape(-1, 4),
+                boxes.conf.cpu().numpy().astype(np.float32),
+                boxes.cls.cpu().numpy().astype(np.int64))
@@ -1,10 +1,10 @@
-import json
+from cloud.streaming import get_publisher
 
 def stream_to_digital_twin(crowd_data, endpoint):
-    # crowd_data: positions, density, etc.
-    # endpoint: URL or socket for 3D engine
-    # Placeholder: send JSON to endpoint
-    print(f"[DIGITAL TWIN] Sending to {endpoint}: {json.dumps(crowd_data)}")
+    # crowd_data: {"camera", "timestamp", "positions", density, ...}
+    # endpoint: ws:// URL of the 3D engine, or tcp:// / file:// (see cloud/streaming.py)
+    # Queued on a shared batched publisher: returns immediately, positions are sent as float32 arrays
+    get_publisher(endpoint, "digital_twin", policy="coalesce").publish(crowd_data)
 
 # Example usage:
-# stream_to_digital_twin({"positions": [...]}, "ws://localhost:9000") 
\ No newline at end of file
+# stream_to_digital_twin({"camera": 1, "positions": {7: (3.2, 8.1)}}, "ws://localhost:9000")
@@ -1,21 +1,232 @@
 import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+# Weidmann speed-density relation: free walking speed (m/s), jam density (people/m^2)
+FREE_SPEED = 1.34
+JAM_DENSITY = 5.4
+MIN_SPEED = 0.05
+# 8-connected moves (dy, dx) that cover every undirected neighbour pair once
+_MOVES = ((0, 1), (1, 0), (1, 1), (1, -1))
+
+
+def walking_speed(density):
+    # people/m^2 -> m/s, never below MIN_SPEED so a packed cell is slow rather than a wall
+    rho = np.maximum(np.asarray(density, dtype=np.float64), 1e-3)
+    v = FREE_SPEED * (1.0 - np.exp(-1.913 * (1.0 / rho - 1.0 / JAM_DENSITY)))
+    return np.clip(v, MIN_SPEED, FREE_SPEED)
+
+
+class EvacuationPlanner:
+    """
+    Travel-time fields from every exit over a density grid, so exit choice is
+    a table lookup. Each cell costs cell_size / walking_speed(density)
+    seconds to cross; walls are impassable and diagonal moves never cut a
+    wall corner. Fields come from one multi-source Dijkstra run over the
+    8-connected grid graph.
+
+    update_density() re-costs only the changed cells. When costs only rise,
+    each exit's field is repaired on the cells whose shortest path ran
+    through a changed cell; any cost drop recomputes the fields in one pass.
+
+    Points are (x, y) in density-map units scaled by cell_size
+    (e.g. metres, or pixels for an image-space grid).
+    """
+
+    def __init__(self, density_map, exits, walls=None, cell_size=1.0):
+        self.shape = np.asarray(density_map).shape
+        self.h, self.w = self.shape
+        self.cell_size = float(cell_size)
+        self.walls = np.zeros(self.shape, dtype=bool) if walls is None else np.asarray(walls, dtype=bool)
+        self.exits = [tuple(e) for e in exits]
+        self.exit_cells = np.array([self._cell_index(np.array([e], dtype=np.float64))[0] for e in self.exits])
+        if np.any(self.walls.ravel()[self.exit_cells]):
+            raise ValueError("An exit lies inside a wall cell")
+        self._build_edges()
+        self._density = np.array(density_map, dtype=np.float64)
+        self.cost = self._cell_cost(density_map)
+        self._solve()
+
+    # --- grid graph ---
+
+    def _cell_index(self, pts):
+        pts = np.asarray(pts, dtype=np.float64).reshape(-1, 2)
+        cx = np.clip((pts[:, 0] / self.cell_size).astype(np.int64), 0, self.w - 1)
+        cy = np.clip((pts[:, 1] / self.cell_size).astype(np.int64), 0, self.h - 1)
+        return cy * self.w + cx
+
+    def _build_edges(self):
+        # Undirected neighbour pairs (u, v) and their length in cells, corner cutting excluded
+        idx = np.arange(self.h * self.w).reshape(self.shape)
+        us, vs, lens = [], [], []
+        for dy, dx in _MOVES:
+            ys = slice(0, self.h - dy)
+            xs = slice(max(0, -dx), self.w - max(0, dx))
+            yd = slice(dy, self.h)
+            xd = slice(max(0, dx), self.w - max(0, -dx))
+            u, v = idx[ys, xs], idx[yd, xd]
+            ok = ~(self.walls[ys, xs] | self.walls[yd, xd])
+            if dy and dx:
+                # Both orthogonal cells must be free
+                ok &= ~self.walls[ys, xd] & ~self.walls[yd, xs]
+            us.append(u[ok])
+            vs.append(v[ok])
+            lens.append(np.full(int(ok.sum()), np.hypot(dy, dx)))
+        eu, ev = np.concatenate(us), np.concatenate(vs)
+        elen = np.concatenate(lens) * self.cell_size
+        # Both directions, so the graph and repairs never have to concatenate
+        self.eu = np.concatenate([eu, ev])
+        self.ev = np.concatenate([ev, eu])
+        self.elen = np.concatenate([elen, elen])
+
+    def _cell_cost(self, density_map):
+        # Seconds per metre of each cell
+        return 1.0 / walking_speed(density_map).ravel()
+
+    def _edge_weights(self):
+        return self.elen * 0.5 * (self.cost[self.eu] + self.cost[self.ev])
+
+    def _solve(self):
+        n = self.h * self.w
+        graph = csr_matrix((self._edge_weights(), (self.eu, self.ev)), shape=(n, n))
+        dist, pred = dijkstra(graph, indices=self.exit_cells, return_predecessors=True)
+        self.dist = dist
+        self.pred = pred
+        self._refresh_best()
+
+    def _refresh_best(self):
+        self.best = np.argmin(self.dist, axis=0).astype(np.int32)
+        self.best_cost = self.dist[self.best, np.arange(self.dist.shape[1])]
+
+    # --- incremental updates ---
+
+    def _descendants(self, pred, marked):
+        # Cells whose shortest-path tree chain passes through a marked cell (pointer jumping)
+        flag = marked.copy()
+        anc = np.where(pred >= 0, pred, np.arange(len(pred)))
+        for _ in range(int(np.ceil(np.log2(len(pred) + 1)))):
+            flag |= flag[anc]
+            anc = anc[anc]
+        return flag
+
+    def _repair(self, k, changed, wgt):
+        # Exact repair of exit k after cost increases on cells `changed`
+        dist, pred = self.dist[k], self.pred[k]
+        eu, ev = self.eu, self.ev
+        affected = self._descendants(pred, changed)
+        affected[self.exit_cells[k]] = False
+        if not affected.any():
+            return
+        a_idx = np.nonzero(affected)[0]
+        local = np.full(len(dist), -1, dtype=np.int64)
+        local[a_idx] = np.arange(len(a_idx))
+
+        # Seeds: best entry into the affected region from an unaffected, finite neighbour
+        entry = ~affected[eu] & affected[ev] & np.isfinite(dist[eu])
+        cand = dist[eu[entry]] + wgt[entry]
+        seed = np.full(len(a_idx), np.inf)
+        np.minimum.at(seed, local[ev[entry]], cand)
+        seed_pred = np.full(len(a_idx), -9999, dtype=np.int64)
+        hit = cand == seed[local[ev[entry]]]
+        seed_pred[local[ev[entry][hit]]] = eu[entry][hit]
+
+        # Dijkstra on the affected subgraph from a virtual source (index m)
+        inside = affected[eu] & affected[ev]
+        m = len(a_idx)
+        has_seed = np.isfinite(seed)
+        rows = np.concatenate([local[eu[inside]], np.full(int(has_seed.sum()), m)])
+        cols = np.concatenate([local[ev[inside]], np.nonzero(has_seed)[0]])
+        vals = np.concatenate([wgt[inside], np.maximum(seed[has_seed], 1e-9)])
+        sub = csr_matrix((vals, (rows, cols)), shape=(m + 1, m + 1))
+        d_sub, p_sub = dijkstra(sub, indices=m, return_predecessors=True)
+        dist[a_idx] = d_sub[:m]
+        from_seed = p_sub[:m] == m
+        new_pred = np.where(p_sub[:m] >= 0, a_idx[np.clip(p_sub[:m], 0, m - 1)], -9999)
+        new_pred[from_seed] = seed_pred[from_seed]
+        pred[a_idx] = new_pred
+
+    def update_density(self, density_map, walls=None, tol=1e-6):
+        """
+        New density (and optionally walls); only cells whose cost changed by
+        more than tol are touched. Returns the number of changed cells.
+        """
+        if walls is not None and not np.array_equal(np.asarray(walls, dtype=bool), self.walls):
+            self.walls = np.asarray(walls, dtype=bool)
+            self._build_edges()
+            self._density = np.array(density_map, dtype=np.float64)
+            self.cost = self._cell_cost(density_map)
+            self._solve()
+            return self.h * self.w
+        self._density = np.array(density_map, dtype=np.float64)
+        cost = self._cell_cost(density_map)
+        delta = cost - self.cost
+        changed = np.abs(delta) > tol * np.maximum(self.cost, 1e-12)
+        n_changed = int(changed.sum())
+        if n_changed == 0:
+            return 0
+        self.cost = cost
+        if np.any(delta[changed] < 0):
+            self._solve()
+            return n_changed
+        wgt = self._edge_weights()
+        for k in range(len(self.exits)):
+            self._repair(k, changed, wgt)
+        self._refresh_best()
+        return n_changed
+
+    def update_region(self, density_patch, y0, x0):
+        # Replace the density of one rectangular region (top-left cell y0, x0)
+        density = self.density_map()
+        ph, pw = np.asarray(density_patch).shape
+        density[y0:y0 + ph, x0:x0 + pw] = density_patch
+        return self.update_density(density)
+
+    def density_map(self):
+        return self._density.copy()
+
+    # --- queries ---
+
+    def best_exit(self, x, y):
+        # O(1): -> (exit index, travel time s) for one point
+        c = self._cell_index(np.array([(x, y)], dtype=np.float64))[0]
+        return int(self.best[c]), float(self.best_cost[c])
+
+    def best_exits(self, points):
+        # Nx2 points -> (exit index [N], travel time [N]) in one lookup
+        c = self._cell_index(points)
+        return self.best[c], self.best_cost[c]
+
+    def best_exits_for_tracks(self, tracks):
+        # {id: (x, y)} -> {id: exit index}
+        if not tracks:
+            return {}
+        exits, _ = self.best_exits(np.array([(float(p[0]), float(p[1])) for p in tracks.values()]))
+        return dict(zip(tracks.keys(), exits.tolist()))
+
+    def best_exit_for_group(self, points):
+        # Exit minimising the group's summed travel time -> (exit index, mean travel time s)
+        c = self._cell_index(points)
+        total = self.dist[:, c].sum(axis=1)
+        k = int(np.argmin(total))
+        return k, float(total[k] / max(len(c), 1))
+
+    def field(self, k):
+        # Travel time (s) to exit k for every cell, [H, W]
+        return self.dist[k].reshape(self.shape)
+
 
 def recommend_exits(density_map, predicted_paths, exits):
     # density_map: 2D array
     # predicted_paths: list of arrays (per-person or per-group)
     # exits: list of (x, y) exit locations
-    # Placeholder: recommend exit with lowest predicted density along path
-    scores = []
-    for exit in exits:
-        score = 0
-        for path in predicted_paths:
-            # Simple: sum density along path to exit
-            for pt in path:
-                x, y = int(pt[0]), int(pt[1])
-                score += density_map[y, x]
-        scores.append(score)
-    best_exit = exits[np.argmin(scores)]
-    return best_exit
+    # Exit with the lowest total travel time for everyone, starting from each path's first point
+    planner = EvacuationPlanner(density_map, exits)
+    starts = np.array([np.asarray(path, dtype=np.float64).reshape(-1, 2)[0] for path in predicted_paths])
+    k, _ = planner.best_exit_for_group(starts)
+    return exits[k]
 
 # Example usage:
-# best = recommend_exits(density, paths, exits) 
\ No newline at end of file
+# best = recommend_exits(density, paths, exits)
+# planner = EvacuationPlanner(density, exits, walls=wall_mask, cell_size=0.5)
+# planner.update_density(new_density)                  # every few seconds during an incident
+# exit_idx, seconds = planner.best_exits(positions)    # every tracked person at once
@@ -1,23 +1,440 @@
+import argparse
+import os
+from multiprocessing import Pool
+
 import pandas as pd
 import numpy as np
+from scipy.optimize import linear_sum_assignment
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 
+# HOTA is averaged over localisation thresholds 0.05, 0.10, ..., 0.95
+HOTA_ALPHAS = np.arange(0.05, 0.99, 0.05)
+MATCH_IOU = 0.5
+EPS = np.finfo(np.float64).eps
+# Pair counters fold their buffer into the sorted table once it holds this many entries
+COMPACT_EVERY = 1 << 20
+
+
 def evaluate_counts(gt_csv, pred_csv):
     gt = pd.read_csv(gt_csv, parse_dates=["timestamp"])
     pred = pd.read_csv(pred_csv, parse_dates=["timestamp"])
     merged = pd.merge(gt, pred, on="timestamp", suffixes=("_gt", "_pred"))
     mae = mean_absolute_error(merged["active_gt"], merged["active_pred"])
-    rmse = mean_squared_error(merged["active_gt"], merged["active_pred"] , squared=False)
+    # squared=False was removed from scikit-learn 1.6
+    rmse = float(np.sqrt(mean_squared_error(merged["active_gt"], merged["active_pred"])))
     return {"MAE": mae, "RMSE": rmse}
 
-# For MOTA, IDF1, ID switches, you need per-frame ID assignments (not just counts)
-# Placeholder for future implementation
+# --- streaming input ---
+
+def read_mot(path, is_gt=False, chunksize=200_000):
+    """
+    Stream a MOTChallenge file (frame, id, x, y, w, h, conf, ...) one frame at
+    a time as (frame, ids [N] int64, boxes [N,4] xywh). The file is read in
+    chunks, so memory is bounded by chunksize rather than the sequence length.
+    Rows must be sorted by frame. Ground-truth rows with conf 0 are ignored
+    regions and are dropped.
+    """
+    carry = np.zeros((0, 7))
+    try:
+        chunks = pd.read_csv(path, header=None, usecols=range(7), chunksize=chunksize, dtype=np.float64)
+        for chunk in chunks:
+            rows = chunk.to_numpy()
+            if is_gt:
+                rows = rows[rows[:, 6] != 0]
+            rows = np.concatenate([carry, rows])
+            if len(rows) == 0:
+                continue
+            frames = rows[:, 0].astype(np.int64)
+            if np.any(np.diff(frames) < 0):
+                raise ValueError(f"{path}: rows must be sorted by frame")
+            # The last frame may continue in the next chunk
+            done = frames < frames[-1]
+            carry = rows[~done]
+            yield from _split_frames(rows[done])
+    except pd.errors.EmptyDataError:
+        return
+    yield from _split_frames(carry)
+
+
+def _split_frames(rows):
+    if len(rows) == 0:
+        return
+    frames = rows[:, 0].astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, frames[1:] != frames[:-1]])
+    for s, e in zip(starts, np.r_[starts[1:], len(rows)]):
+        yield int(frames[s]), rows[s:e, 1].astype(np.int64), rows[s:e, 2:6]
+
+
+def paired_frames(gt_frames, pred_frames):
+    # Merge-join two frame streams -> (frame, gt_ids, gt_boxes, pred_ids, pred_boxes); a side may be empty
+    empty = (np.zeros(0, dtype=np.int64), np.zeros((0, 4)))
+    gt, pred = next(gt_frames, None), next(pred_frames, None)
+    while gt is not None or pred is not None:
+        if pred is None or (gt is not None and gt[0] < pred[0]):
+            yield (gt[0], gt[1], gt[2]) + empty
+            gt = next(gt_frames, None)
+        elif gt is None or pred[0] < gt[0]:
+            yield (pred[0],) + empty + (pred[1], pred[2])
+            pred = next(pred_frames, None)
+        else:
+            yield gt[0], gt[1], gt[2], pred[1], pred[2]
+            gt, pred = next(gt_frames, None), next(pred_frames, None)
+
+
+def box_iou(a, b):
+    # a: [N,4], b: [M,4] xywh -> [N,M] IoU
+    ax2, ay2 = a[:, 0] + a[:, 2], a[:, 1] + a[:, 3]
+    bx2, by2 = b[:, 0] + b[:, 2], b[:, 1] + b[:, 3]
+    iw = np.clip(np.minimum(ax2[:, None], bx2[None, :]) - np.maximum(a[:, 0][:, None], b[:, 0][None, :]), 0, None)
+    ih = np.clip(np.minimum(ay2[:, None], by2[None, :]) - np.maximum(a[:, 1][:, None], b[:, 1][None, :]), 0, None)
+    inter = iw * ih
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+
+# --- accumulators ---
+
+def pair_keys(gt_ids, pred_ids):
+    # (gt id, pred id) -> one int64 key; ids must fit in 31 bits
+    return (np.asarray(gt_ids, dtype=np.int64) << 32) | np.asarray(pred_ids, dtype=np.int64)
+
+
+class SparseCounter:
+    """
+    int64 key -> float sum. Updates are appended to a buffer and folded into a
+    sorted (keys, values) table with np.unique once the buffer grows, so size
+    tracks the number of distinct keys (id pairs), never the number of frames.
+    """
+
+    def __init__(self):
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.values = np.zeros(0)
+        self._buf_k, self._buf_v, self._buffered = [], [], 0
+
+    def add(self, keys, values=1.0):
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(keys) == 0:
+            return
+        self._buf_k.append(keys)
+        self._buf_v.append(np.broadcast_to(np.asarray(values, dtype=np.float64), keys.shape))
+        self._buffered += len(keys)
+        if self._buffered >= COMPACT_EVERY:
+            self.compact()
+
+    def compact(self):
+        if not self._buffered:
+            return self
+        keys = np.concatenate([self.keys] + self._buf_k)
+        values = np.concatenate([self.values] + self._buf_v)
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.values = np.bincount(inverse.ravel(), weights=values, minlength=len(self.keys))
+        self._buf_k, self._buf_v, self._buffered = [], [], 0
+        return self
+
+    def get(self, keys):
+        # Sums for keys (0 where absent); call compact() first
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(self.keys) == 0:
+            return np.zeros(keys.shape)
+        idx = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[idx] == keys, self.values[idx], 0.0)
+
+
+class IdTable:
+    # Dense per-id int64 state indexed by raw id, grown on demand
+    def __init__(self, fill=-1):
+        self.fill = fill
+        self.data = np.full(1024, fill, dtype=np.int64)
+
+    def _fit(self, ids):
+        if len(ids) and ids.max() >= len(self.data):
+            grown = np.full(max(int(ids.max()) + 1, 2 * len(self.data)), self.fill, dtype=np.int64)
+            grown[:len(self.data)] = self.data
+            self.data = grown
+
+    def __getitem__(self, ids):
+        self._fit(ids)
+        return self.data[ids]
+
+    def __setitem__(self, ids, values):
+        self._fit(ids)
+        self.data[ids] = values
+
+
+class SequenceEvaluator:
+    """
+    Incremental CLEAR (MOTA), Identity (IDF1) and HOTA for one sequence.
+
+    Pass one (update) matches every frame with an IoU Hungarian assignment and
+    accumulates CLEAR counts, per-id detection counts and the pair statistics
+    that IDF1 and HOTA's global alignment need. Pass two (update_hota) replays
+    the sequence to run HOTA's alignment-weighted matching at every alpha.
+    State is per id / id pair, so memory does not grow with sequence length.
+    Matching follows the MOTChallenge (TrackEval) definitions.
+    """
+
+    def __init__(self):
+        # CLEAR
+        self.tp = self.fp = self.fn = self.idsw = 0
+        self.motp_sum = 0.0
+        self.frames = 0
+        self.prev_match = IdTable()      # pred id matched to each gt id in the previous frame
+        self.prev_gt = np.zeros(0, dtype=np.int64)  # gt ids set in prev_match, cleared every frame
+        self.last_match = IdTable()      # pred id last matched to each gt id, across gaps
+        self.gt_matched = SparseCounter()
+        # Identity / HOTA pass one
+        self.gt_count = SparseCounter()
+        self.pred_count = SparseCounter()
+        self.id_pairs = SparseCounter()  # frames where a pair overlaps with IoU >= 0.5
+        self.sim_pairs = SparseCounter()  # HOTA potential-match similarity sums
+        # HOTA pass two
+        self.hota_tp = np.zeros(len(HOTA_ALPHAS))
+        self.hota_fn = np.zeros(len(HOTA_ALPHAS))
+        self.hota_fp = np.zeros(len(HOTA_ALPHAS))
+        self.loc_sum = np.zeros(len(HOTA_ALPHAS))
+        self.hota_pairs = [SparseCounter() for _ in HOTA_ALPHAS]
+        self.hota_frames = 0
+        self._hota_ready = False
+
+    def update(self, gt_ids, gt_boxes, pred_ids, pred_boxes):
+        self.frames += 1
+        n_gt, n_pred = len(gt_ids), len(pred_ids)
+        self.gt_count.add(gt_ids)
+        self.pred_count.add(pred_ids)
+        if n_gt == 0 or n_pred == 0:
+            self.fp += n_pred
+            self.fn += n_gt
+            self.prev_match[self.prev_gt] = -1
+            self.prev_gt = self.prev_gt[:0]
+            return
+        iou = box_iou(gt_boxes, pred_boxes)
+
+        # CLEAR: prefer continuing last frame's matches, then highest IoU
+        ok = iou >= MATCH_IOU - EPS
+        score = iou + 1000.0 * (self.prev_match[gt_ids][:, None] == pred_ids[None, :])
+        score[~ok] = 0
+        rows, cols = linear_sum_assignment(score, maximize=True)
+        keep = score[rows, cols] > 0
+        rows, cols = rows[keep], cols[keep]
+        m_gt, m_pred = gt_ids[rows], pred_ids[cols]
+        last = self.last_match[m_gt]
+        self.idsw += int(np.sum((last >= 0) & (last != m_pred)))
+        self.last_match[m_gt] = m_pred
+        # Only last frame's matches earn the continuation bonus, also for ids absent this frame
+        self.prev_match[self.prev_gt] = -1
+        self.prev_match[m_gt] = m_pred
+        self.prev_gt = np.asarray(m_gt, dtype=np.int64)
+        self.gt_matched.add(m_gt)
+        self.tp += len(rows)
+        self.fp += n_pred - len(rows)
+        self.fn += n_gt - len(rows)
+        self.motp_sum += float(iou[rows, cols].sum())
+
+        # Identity: every overlapping pair, assigned globally at the end
+        g, p = np.nonzero(ok)
+        self.id_pairs.add(pair_keys(gt_ids[g], pred_ids[p]))
+
+        # HOTA: IoU normalised by each detection's total overlap
+        sim = iou / (iou.sum(1, keepdims=True) + iou.sum(0, keepdims=True) - iou + EPS)
+        g, p = np.nonzero(sim > 0)
+        self.sim_pairs.add(pair_keys(gt_ids[g], pred_ids[p]), sim[g, p])
+
+    def _finish_pass_one(self):
+        for counter in (self.gt_count, self.pred_count, self.id_pairs, self.sim_pairs, self.gt_matched):
+            counter.compact()
+        self._hota_ready = True
+
+    def update_hota(self, gt_ids, gt_boxes, pred_ids, pred_boxes):
+        # Second pass over the same frames, after every update() call
+        if not self._hota_ready:
+            self._finish_pass_one()
+        self.hota_frames += 1
+        n_gt, n_pred = len(gt_ids), len(pred_ids)
+        if n_gt == 0 or n_pred == 0:
+            self.hota_fn += n_gt
+            self.hota_fp += n_pred
+            return
+        iou = box_iou(gt_boxes, pred_boxes)
+        keys = pair_keys(np.repeat(gt_ids, n_pred), np.tile(pred_ids, n_gt))
+        potential = self.sim_pairs.get(keys).reshape(n_gt, n_pred)
+        gc = self.gt_count.get(gt_ids)[:, None]
+        pc = self.pred_count.get(pred_ids)[None, :]
+        alignment = potential / (gc + pc - potential)
+        rows, cols = linear_sum_assignment(alignment * iou, maximize=True)
+        matched_iou = iou[rows, cols]
+        matched_keys = pair_keys(gt_ids[rows], pred_ids[cols])
+        for a, alpha in enumerate(HOTA_ALPHAS):
+            hit = matched_iou >= alpha - EPS
+            n = int(hit.sum())
+            self.hota_tp[a] += n
+            self.hota_fn[a] += n_gt - n
+            self.hota_fp[a] += n_pred - n
+            self.loc_sum[a] += float(matched_iou[hit].sum())
+            self.hota_pairs[a].add(matched_keys[hit])
+
+    def counts(self):
+        # Additive totals; combine sequences by summing these and calling metrics()
+        if not self._hota_ready:
+            self._finish_pass_one()
+        gt_total, pred_total = float(self.gt_count.values.sum()), float(self.pred_count.values.sum())
+        idtp = self._idtp()
+        ass = np.zeros(len(HOTA_ALPHAS))
+        ass_re = np.zeros(len(HOTA_ALPHAS))
+        ass_pr = np.zeros(len(HOTA_ALPHAS))
+        for a, pairs in enumerate(self.hota_pairs):
+            pairs.compact()
+            if len(pairs.keys) == 0:
+                continue
+            mc = pairs.values
+            gc = self.gt_count.get(pairs.keys >> 32)
+            pc = self.pred_count.get(pairs.keys & 0xFFFFFFFF)
+            # Per-pair association scores weighted by their true positives
+            ass[a] = np.sum(mc * mc / (gc + pc - mc))
+            ass_re[a] = np.sum(mc * mc / gc)
+            ass_pr[a] = np.sum(mc * mc / pc)
+        gt_ids = self.gt_count.keys
+        matched = self.gt_matched.get(gt_ids) / np.maximum(self.gt_count.values, 1)
+        return {
+            "frames": self.frames, "hota_frames": self.hota_frames, "gt_dets": gt_total, "pred_dets": pred_total,
+            "gt_ids": len(gt_ids), "pred_ids": len(self.pred_count.keys),
+            "CLR_TP": self.tp, "CLR_FP": self.fp, "CLR_FN": self.fn, "IDSW": self.idsw,
+            "MOTP_sum": self.motp_sum,
+            "MT": int(np.sum(matched > 0.8)), "ML": int(np.sum(matched < 0.2)),
+            "IDTP": idtp, "IDFN": gt_total - idtp, "IDFP": pred_total - idtp,
+            "HOTA_TP": self.hota_tp.copy(), "HOTA_FN": self.hota_fn.copy(), "HOTA_FP": self.hota_fp.copy(),
+            "LocA_sum": self.loc_sum.copy(), "AssA_sum": ass, "AssRe_sum": ass_re, "AssPr_sum": ass_pr,
+        }
+
+    def _idtp(self):
+        # Best one-to-one gt id <-> pred id assignment by overlapping frames
+        keys, counts = self.id_pairs.keys, self.id_pairs.values
+        if len(keys) == 0:
+            return 0.0
+        g_ids, g = np.unique(keys >> 32, return_inverse=True)
+        p_ids, p = np.unique(keys & 0xFFFFFFFF, return_inverse=True)
+        overlap = np.zeros((len(g_ids), len(p_ids)))
+        overlap[g.ravel(), p.ravel()] = counts
+        rows, cols = linear_sum_assignment(overlap, maximize=True)
+        return float(overlap[rows, cols].sum())
+
+
+def metrics(counts):
+    # Additive counts (one sequence or summed) -> headline metrics
+    c = counts
+    tp, fp, fn = c["CLR_TP"], c["CLR_FP"], c["CLR_FN"]
+    gt = max(tp + fn, 1)
+    hota_tp = c["HOTA_TP"]
+    det_a = hota_tp / np.maximum(hota_tp + c["HOTA_FN"] + c["HOTA_FP"], 1)
+    ass_a = c["AssA_sum"] / np.maximum(hota_tp, 1)
+    # HOTA's second pass skipped (hota=False): report NaN, not a score of zero
+    skip = np.nan if c.get("hota_frames", 0) == 0 else 1.0
+    return {
+        "MOTA": 1.0 - (fn + fp + c["IDSW"]) / gt,
+        "MOTP": c["MOTP_sum"] / max(tp, 1),
+        "IDF1": 2 * c["IDTP"] / max(2 * c["IDTP"] + c["IDFN"] + c["IDFP"], 1),
+        "IDSW": c["IDSW"], "FP": fp, "FN": fn, "MT": c["MT"], "ML": c["ML"],
+        "HOTA": skip * float(np.mean(np.sqrt(det_a * ass_a))),
+        "DetA": skip * float(np.mean(det_a)),
+        "AssA": skip * float(np.mean(ass_a)),
+        "AssRe": skip * float(np.mean(c["AssRe_sum"] / np.maximum(hota_tp, 1))),
+        "AssPr": skip * float(np.mean(c["AssPr_sum"] / np.maximum(hota_tp, 1))),
+        "LocA": skip * float(np.mean(c["LocA_sum"] / np.maximum(hota_tp, 1))),
+    }
+
+
+def combine_counts(all_counts):
+    # Sum per-sequence counts (arrays element-wise)
+    total = {}
+    for counts in all_counts:
+        for k, v in counts.items():
+            total[k] = total[k] + v if k in total else v
+    return total
+
+# --- entry points ---
+
+def tracking_counts(gt_path, pred_path, hota=True, chunksize=200_000):
+    # Stream one sequence (MOTChallenge files), twice if HOTA is wanted -> additive counts
+    ev = SequenceEvaluator()
+    for _, gi, gb, pi, pb in paired_frames(read_mot(gt_path, True, chunksize), read_mot(pred_path, False, chunksize)):
+        ev.update(gi, gb, pi, pb)
+    if hota:
+        for _, gi, gb, pi, pb in paired_frames(read_mot(gt_path, True, chunksize), read_mot(pred_path, False, chunksize)):
+            ev.update_hota(gi, gb, pi, pb)
+    return ev.counts()
+
+
+def evaluate_tracking(gt_path, pred_path, hota=True):
+    # gt_path, pred_path: MOTChallenge txt files -> MOTA, IDF1, ID switches, HOTA, ...
+    return metrics(tracking_counts(gt_path, pred_path, hota))
+
+
+def _sequence_job(job):
+    name, gt_path, pred_path, hota = job
+    return name, tracking_counts(gt_path, pred_path, hota)
+
+
+def evaluate_sequences(sequences, processes=None, hota=True):
+    """
+    sequences: {name: (gt_path, pred_path)}. Sequences are evaluated in
+    parallel worker processes; returns {name: metrics} plus "COMBINED",
+    computed from the summed counts (not an average of per-sequence scores).
+    """
+    jobs = [(name, gt, pred, hota) for name, (gt, pred) in sequences.items()]
+    if processes == 1 or len(jobs) <= 1:
+        results = [_sequence_job(job) for job in jobs]
+    else:
+        with Pool(processes=min(processes or os.cpu_count() or 1, len(jobs))) as pool:
+            results = pool.map(_sequence_job, jobs, chunksize=1)
+    out = {name: metrics(counts) for name, counts in results}
+    if results:
+        out["COMBINED"] = metrics(combine_counts([counts for _, counts in results]))
+    return out
+
+
+def mot_sequences(gt_dir, pred_dir):
+    # MOTChallenge layout: gt_dir/<seq>/gt/gt.txt and pred_dir/<seq>.txt
+    sequences = {}
+    for name in sorted(os.listdir(gt_dir)):
+        gt = os.path.join(gt_dir, name, "gt", "gt.txt")
+        pred = os.path.join(pred_dir, name + ".txt")
+        if os.path.exists(gt) and os.path.exists(pred):
+            sequences[name] = (gt, pred)
+    return sequences
+
+
+def print_table(results):
+    cols = ["HOTA", "DetA", "AssA", "MOTA", "IDF1", "IDSW", "FP", "FN"]
+    if all(np.isnan(m["HOTA"]) for m in results.values()):
+        cols = cols[3:]  # --no-hota
+    print(f"{'sequence':<20}" + "".join(f"{c:>9}" for c in cols))
+    for name, m in results.items():
+        print(f"{name:<20}" + "".join(f"{m[c]:>9.3f}" if isinstance(m[c], float) else f"{m[c]:>9}" for c in cols))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count and tracking evaluation")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    cnt = sub.add_parser("counts", help="MAE / RMSE of active counts")
+    cnt.add_argument("gt_csv")
+    cnt.add_argument("pred_csv")
+    trk = sub.add_parser("tracking", help="MOTA / IDF1 / HOTA for MOTChallenge files")
+    trk.add_argument("gt", help="gt.txt, or a directory of <seq>/gt/gt.txt")
+    trk.add_argument("pred", help="predictions .txt, or a directory of <seq>.txt")
+    trk.add_argument("--processes", type=int, default=None)
+    trk.add_argument("--no-hota", action="store_true", help="skip HOTA's second pass")
+    args = parser.parse_args()
+
+    if args.cmd == "counts":
+        print(evaluate_counts(args.gt_csv, args.pred_csv))
+    elif os.path.isdir(args.gt):
+        print_table(evaluate_sequences(mot_sequences(args.gt, args.pred), args.processes, not args.no_hota))
+    else:
+        print_table({os.path.basename(args.pred): evaluate_tracking(args.gt, args.pred, not args.no_hota)})
 
-def evaluate_tracking(gt_ids, pred_ids):
-    # gt_ids, pred_ids: list of sets of IDs per frame
-    # Compute MOTA, IDF1, ID switches (requires Hungarian matching)
-    pass
 
 if __name__ == "__main__":
-    # Example usage
-    print(evaluate_counts("ground_truth.csv", "predictions.csv")) 
\ No newline at end of file
+    main()
+
+# Example usage:
+# python src/eval/evaluate.py counts ground_truth.csv predictions.csv
+# python src/eval/evaluate.py tracking data/MOT17/train data/outputs/mot17_ocsort --processes 4
+# m = evaluate_tracking("gt.txt", "pred.txt"); print(m["MOTA"], m["IDF1"], m["HOTA"])
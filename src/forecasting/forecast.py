@@ -1,11 +1,17 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
 from statsmodels.tsa.statespace.sarimax import SARIMAX
+from src.storage.metrics_store import CsvTail, MetricsStore, exists, load_metrics
 
 def train_and_forecast(csv_path="data/outputs/metrics.csv", horizon=6):
     """
     horizon = number of future intervals (if you log every 5 mins, 6 -> next 30 mins)
     """
-    df = pd.read_csv(csv_path, parse_dates=["timestamp"])
+    df = load_metrics(csv_path=csv_path)
     df = df.sort_values("timestamp")
     # aggregate across cameras if multiple
     agg = df.groupby("timestamp")["active"].sum().asfreq("5T").interpolate()
@@ -15,4 +21,145 @@ def train_and_forecast(csv_path="data/outputs/metrics.csv", horizon=6):
     fc = res.get_forecast(steps=horizon)
     pred = fc.predicted_mean
     conf = fc.conf_int()
-    return pred, conf 
\ No newline at end of file
+    return pred, conf
+
+
+class ForecastService:
+    """
+    Long-lived SARIMAX forecaster for the API. Fitted results are kept per
+    camera (None = all cameras summed) and extended with each newly completed
+    interval instead of refitting. A full refit happens every
+    refit_interval_s, or when new observations fall outside drift_z standard
+    errors of the model's own forecast. Answers are cached per
+    (camera, last fitted interval, horizon) in a small LRU.
+    """
+
+    def __init__(self, store_root="data/outputs/metrics_db", csv_path="data/outputs/metrics.csv", freq="5min",
+                 order=(1, 1, 1), refit_interval_s=3600, drift_z=4.0, cache_size=64, min_points=8):
+        self.store_root = store_root
+        self.csv_path = csv_path
+        self.freq = pd.Timedelta(freq)
+        self.freq_alias = freq
+        self.order = order
+        self.refit_interval_s = refit_interval_s
+        self.drift_z = drift_z
+        self.cache_size = cache_size
+        self.min_points = min_points
+        self._store = None
+        self._csv = CsvTail(csv_path)  # fallback without a store: only appended rows are parsed
+        self._models = {}  # camera -> {"results", "last_bucket", "fitted_at"}
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    # --- data access ---
+
+    def _get_store(self):
+        if self._store is None and exists(self.store_root):
+            self._store = MetricsStore(self.store_root, readonly=True)
+        return self._store
+
+    def _csv_rows(self):
+        self._csv.read_new()
+        if self._csv.df.empty:
+            raise FileNotFoundError(f"No metrics in {self.csv_path}")
+        return self._csv.df
+
+    def _latest_ts(self, camera):
+        store = self._get_store()
+        if store is None:
+            df = self._csv_rows()
+            ts = df["timestamp"] if camera is None else df.loc[df["camera"] == camera, "timestamp"]
+            return ts.max() if len(ts) else None
+        row = store.latest(camera) if camera is not None else store.latest_overall()
+        return pd.Timestamp(row["timestamp"]) if row else None
+
+    def _history(self, camera, start=None):
+        store = self._get_store()
+        cameras = [camera] if camera is not None else None
+        if store is not None:
+            return store.query(start=start, cameras=cameras)
+        df = self._csv_rows()
+        if start is not None:
+            df = df[df["timestamp"] >= start]
+        if cameras is not None:
+            df = df[df["camera"].isin(cameras)]
+        return df
+
+    def _series(self, df, until=None):
+        # Mean active per camera per interval, summed over cameras; only complete intervals
+        if df.empty:
+            return pd.Series(dtype=float)
+        until = until if until is not None else df["timestamp"].max()
+        per_cam = df.groupby([pd.Grouper(key="timestamp", freq=self.freq_alias), "camera"])["active"].mean()
+        series = per_cam.groupby(level=0).sum()
+        series = series[series.index + self.freq <= until]
+        return series.asfreq(self.freq_alias).interpolate()
+
+    # --- model maintenance ---
+
+    def _fit(self, camera, latest):
+        series = self._series(self._history(camera), latest)
+        if len(series) < self.min_points:
+            raise ValueError(f"Not enough history to forecast ({len(series)} intervals, need {self.min_points})")
+        results = SARIMAX(series, order=self.order, seasonal_order=(0, 0, 0, 0)).fit(disp=False)
+        state = {"results": results, "last_bucket": series.index[-1], "fitted_at": time.time()}
+        self._models[camera] = state
+        return state
+
+    def _drifted(self, results, new):
+        fc = results.get_forecast(steps=len(new))
+        se = np.maximum(np.asarray(fc.se_mean), 1e-6)
+        z = np.abs(new.values - np.asarray(fc.predicted_mean)) / se
+        return bool(np.nanmax(z) > self.drift_z)
+
+    def _refresh(self, camera):
+        latest = self._latest_ts(camera)
+        state = self._models.get(camera)
+        if state is None or time.time() - state["fitted_at"] > self.refit_interval_s:
+            return self._fit(camera, latest)
+        next_bucket = state["last_bucket"] + self.freq
+        if latest is not None and latest < next_bucket + self.freq:
+            # No newly completed interval since the last fit
+            return state
+
+        new = self._series(self._history(camera, start=next_bucket), latest)
+        new = new[new.index > state["last_bucket"]]
+        if new.empty:
+            return state
+        if new.index[0] != next_bucket:
+            # Gap in logging: the state space model can't be extended across it
+            return self._fit(camera, latest)
+        if self._drifted(state["results"], new):
+            return self._fit(camera, latest)
+        state["results"] = state["results"].extend(new)
+        state["last_bucket"] = new.index[-1]
+        return state
+
+    # --- public API ---
+
+    def forecast(self, horizon=6, camera=None):
+        # -> (pred Series, conf DataFrame) like train_and_forecast
+        with self._lock:
+            state = self._refresh(camera)
+            key = (camera, state["last_bucket"], horizon)
+            hit = self._cache.get(key)
+            if hit is not None:
+                self._cache.move_to_end(key)
+                return hit
+            fc = state["results"].get_forecast(steps=horizon)
+            out = (fc.predicted_mean, fc.conf_int())
+            self._cache[key] = out
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            return out
+
+    def invalidate(self, camera=None):
+        with self._lock:
+            self._models.pop(camera, None)
+            for key in [k for k in self._cache if k[0] == camera]:
+                del self._cache[key]
+
+# Example usage:
+# service = ForecastService()
+# pred, conf = service.forecast(horizon=6)             # all cameras
+# pred, conf = service.forecast(horizon=12, camera=1)  # one camera
@@ -1,8 +1,18 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import joblib
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from sklearn.ensemble import GradientBoostingRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_squared_error
+from src.storage.metrics_store import CsvTail, MetricsStore, exists, load_metrics
 
 # Optionally, use xgboost or lightgbm if available
 try:
@@ -12,44 +22,333 @@ except ImportError:
     XGB_AVAILABLE = False
 
 
-def create_features(df, lags=6):
-    df = df.copy()
-    df['hour'] = df['timestamp'].dt.hour
-    df['weekday'] = df['timestamp'].dt.weekday
-    for i in range(1, lags+1):
-        df[f'lag_{i}'] = df['active'].shift(i)
-    df = df.dropna()
+# --- vectorized features ---
+
+def interval_series(df, freq="5min", until=None):
+    # Mean active per camera per interval, summed over cameras; only complete intervals
+    if df.empty:
+        return pd.Series(dtype=float)
+    until = until if until is not None else df["timestamp"].max()
+    per_cam = df.groupby([pd.Grouper(key="timestamp", freq=freq), "camera"])["active"].mean()
+    series = per_cam.groupby(level=0).sum()
+    series = series[series.index + pd.Timedelta(freq) <= until]
+    return series.asfreq(freq).interpolate()
+
+
+def feature_matrix(values, index, lags, horizon, freq):
+    """
+    Direct multi-horizon design matrix in one pass. Every origin t with lags
+    observations gives one row per step h = 1..horizon:
+        [lag_1 .. lag_lags, h, hour(t+h), weekday(t+h)] -> value at t+h
+    Returns (X, y); y is NaN for steps past the end of the series, which is
+    how the last origin's rows are built for prediction.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    windows = sliding_window_view(values, lags)[:, ::-1]  # lag_1 first
+    origins = np.arange(lags - 1, len(values))
+    n = len(origins)
+    steps = np.arange(1, horizon + 1)
+    target_idx = (origins[:, None] + steps[None, :]).ravel()
+    target_time = pd.DatetimeIndex(index[origins]).repeat(horizon) + pd.to_timedelta(np.tile(steps, n) * pd.Timedelta(freq))
+    X = np.column_stack([
+        np.repeat(windows, horizon, axis=0),
+        np.tile(steps, n),
+        target_time.hour,
+        target_time.weekday,
+    ])
+    padded = np.concatenate([values, np.full(horizon, np.nan)])
+    return X, padded[target_idx]
+
+
+def make_model(n_jobs=1):
+    if XGB_AVAILABLE:
+        return xgb.XGBRegressor(objective="reg:squarederror", n_jobs=n_jobs)
+    return GradientBoostingRegressor()
+
+
+def fit_direct(series, lags=6, horizon=12, freq="5min", test_size=0.2, quantile=0.9):
+    """
+    One model over all steps (the step is a feature), so a forecast is one
+    predict() on `horizon` rows. Residual quantiles per step on a
+    chronological hold-out give the interval half-widths; the model is then
+    refit on all rows.
+    """
+    X, y = feature_matrix(series.values, series.index, lags, horizon, freq)
+    ok = np.isfinite(y)
+    X, y = X[ok], y[ok]
+    if len(y) < 2 * horizon:
+        raise ValueError(f"Not enough history to train ({len(series)} intervals)")
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, shuffle=False)
+    model = make_model()
+    model.fit(X_train, y_train)
+    resid = np.abs(model.predict(X_test) - y_test)
+    step = X_test[:, lags].astype(np.int64)
+    spread = np.array([np.quantile(resid[step == h], quantile) if np.any(step == h) else np.nan
+                       for h in range(1, horizon + 1)])
+    spread = np.nan_to_num(spread, nan=np.nanmax(spread) if np.any(np.isfinite(spread)) else 0.0)
+    rmse = float(np.sqrt(mean_squared_error(y_test, model.predict(X_test))))
+    model = make_model()
+    model.fit(X, y)
+    return model, spread, rmse
+
+# --- model registry ---
+
+class ModelRegistry:
+    """
+    Trained forecasters on disk, one joblib bundle per camera
+    (<root>/cam_<id>.joblib, cam_all for the site total). A bundle holds the
+    model, its settings, interval half-widths and the interval series it was
+    trained on, so retraining only reads intervals logged since. Loaded
+    bundles are cached until the file changes.
+    """
+
+    def __init__(self, root="data/models/forecast"):
+        self.root = root
+        self._cache = {}  # camera -> (mtime, bundle)
+        self._lock = threading.Lock()
+
+    def path(self, camera):
+        return os.path.join(self.root, f"cam_{'all' if camera is None else camera}.joblib")
+
+    def save(self, camera, bundle):
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(camera)
+        # Write then rename so a serving process never loads a half-written bundle
+        tmp = path + ".tmp"
+        joblib.dump(bundle, tmp)
+        os.replace(tmp, path)
+
+    def load(self, camera):
+        path = self.path(camera)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        with self._lock:
+            hit = self._cache.get(camera)
+            if hit is not None and hit[0] == mtime:
+                return hit[1]
+        bundle = joblib.load(path)
+        with self._lock:
+            self._cache[camera] = (mtime, bundle)
+        return bundle
+
+    def cameras(self):
+        if not os.path.isdir(self.root):
+            return []
+        names = [f[4:-7] for f in os.listdir(self.root) if f.startswith("cam_") and f.endswith(".joblib")]
+        return [None if n == "all" else int(n) for n in names]
+
+# --- training ---
+
+def _history(store_root, csv_path, camera, start=None, store=None):
+    cameras = [camera] if camera is not None else None
+    if store is not None or exists(store_root):
+        store = store if store is not None else MetricsStore(store_root, readonly=True)
+        return store.query(start=start, cameras=cameras)
+    df = load_metrics(store_root, csv_path)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, format="mixed")
+    if start is not None:
+        df = df[df["timestamp"] >= start]
+    if cameras is not None:
+        df = df[df["camera"].isin(cameras)]
     return df
 
+
+def train_camera(camera, store_root="data/outputs/metrics_db", csv_path="data/outputs/metrics.csv",
+                 registry_root="data/models/forecast", lags=6, horizon=12, freq="5min", max_history=20000):
+    # Train (or retrain) one camera's model and publish it to the registry -> summary dict
+    registry = ModelRegistry(registry_root)
+    old = registry.load(camera)
+    reuse = old is not None and old["freq"] == freq
+    start = old["series"].index[-1] + pd.Timedelta(freq) if reuse else None
+    new = interval_series(_history(store_root, csv_path, camera, start), freq)
+    series = pd.concat([old["series"], new]).asfreq(freq).interpolate() if reuse and not new.empty else \
+        (old["series"] if reuse else new)
+    series = series.iloc[-max_history:]
+    started = time.perf_counter()
+    model, spread, rmse = fit_direct(series, lags, horizon, freq)
+    registry.save(camera, {"model": model, "lags": lags, "horizon": horizon, "freq": freq,
+                           "spread": spread, "rmse": rmse, "series": series, "trained_at": time.time()})
+    return {"camera": camera, "intervals": len(series), "rmse": rmse, "fit_s": time.perf_counter() - started}
+
+
+def _train_job(kwargs):
+    try:
+        return train_camera(**kwargs)
+    except ValueError as e:
+        return {"camera": kwargs["camera"], "error": str(e)}
+
+
+def known_cameras(store_root="data/outputs/metrics_db", csv_path="data/outputs/metrics.csv"):
+    # Camera ids with logged metrics: the store's latest-row catalog, else the CSV's camera column
+    if exists(store_root):
+        return sorted(MetricsStore(store_root, readonly=True).latest())
+    if not os.path.exists(csv_path):
+        return []
+    return sorted(int(c) for c in pd.read_csv(csv_path, usecols=["camera"])["camera"].dropna().unique())
+
+
+def train_all(cameras=None, processes=None, **kwargs):
+    """
+    Train every camera (default: each camera in the store, or in the CSV
+    without one, plus the site total) in a process pool; returns one summary
+    per camera.
+    """
+    if cameras is None:
+        cameras = [None] + known_cameras(kwargs.get("store_root", "data/outputs/metrics_db"),
+                                         kwargs.get("csv_path", "data/outputs/metrics.csv"))
+    jobs = [dict(kwargs, camera=c) for c in cameras]
+    if processes == 1 or len(jobs) <= 1:
+        return [_train_job(job) for job in jobs]
+    # spawn: the API calls this from a background thread, where forking is unsafe
+    with ProcessPoolExecutor(max_workers=min(processes or os.cpu_count() or 1, len(jobs)),
+                             mp_context=get_context("spawn")) as pool:
+        return list(pool.map(_train_job, jobs))
+
+# --- serving ---
+
+class MLForecaster:
+    """
+    Serves registry models: a forecast reads only the last `lags` intervals
+    from the store and makes one predict() call for all steps. Returns the
+    same (pred Series, conf DataFrame) pair as ForecastService.forecast(),
+    cached until the next interval completes or the model is replaced.
+
+    retrain() runs train_all() on a background thread (models are swapped in
+    via the registry when done); forecasts keep using the previous models
+    meanwhile. A missing or stale (> retrain_interval_s) model triggers it.
+    """
+
+    def __init__(self, store_root="data/outputs/metrics_db", csv_path="data/outputs/metrics.csv",
+                 registry_root="data/models/forecast", lags=6, horizon=12, freq="5min",
+                 retrain_interval_s=6 * 3600, processes=None, cache_size=64):
+        self.store_root = store_root
+        self.csv_path = csv_path
+        self.registry = ModelRegistry(registry_root)
+        self.train_kwargs = {"store_root": store_root, "csv_path": csv_path, "registry_root": registry_root,
+                             "lags": lags, "horizon": horizon, "freq": freq}
+        self.retrain_interval_s = retrain_interval_s
+        self.processes = processes
+        self.cache_size = cache_size
+        self.last_summary = []
+        self._store = None
+        self._csv = CsvTail(csv_path)  # fallback without a store: only appended rows are parsed
+        self._cache = OrderedDict()
+        self._thread = None
+        self._lock = threading.Lock()  # retrain thread handle, the CSV tail and the LRU
+
+    def retrain(self, cameras=None, wait=False):
+        # Start a background retrain unless one is running; returns its thread
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._retrain, args=(cameras,), daemon=True)
+                self._thread.start()
+            thread = self._thread
+        if wait:
+            thread.join()
+        return thread
+
+    def _retrain(self, cameras):
+        self.last_summary = train_all(cameras, self.processes, **self.train_kwargs)
+
+    def training(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _get_store(self):
+        if self._store is None and exists(self.store_root):
+            self._store = MetricsStore(self.store_root, readonly=True)
+        return self._store
+
+    def _csv_rows(self, camera, start=None):
+        with self._lock:
+            self._csv.read_new()
+            df = self._csv.df
+        if df.empty:
+            return df
+        if start is not None:
+            df = df[df["timestamp"] >= start]
+        return df if camera is None else df[df["camera"] == camera]
+
+    def _latest_bucket(self, camera, freq):
+        # Interval of the newest logged row (a primary-key lookup, or the tailed CSV)
+        store = self._get_store()
+        if store is None:
+            ts = self._csv_rows(camera)
+            return ts["timestamp"].max().floor(freq) if len(ts) else None
+        row = store.latest(camera) if camera is not None else store.latest_overall()
+        return pd.Timestamp(row["timestamp"]).floor(freq) if row else None
+
+    def _recent(self, bundle, camera):
+        # Last `lags` complete intervals: the registry series extended with anything newer
+        freq, lags = bundle["freq"], bundle["lags"]
+        series = bundle["series"]
+        start = series.index[-1] - pd.Timedelta(freq) * (lags - 1)
+        store = self._get_store()
+        df = _history(self.store_root, self.csv_path, camera, start, store) if store is not None \
+            else self._csv_rows(camera, start)
+        new = interval_series(df, freq)
+        if not new.empty:
+            series = pd.concat([series[series.index < new.index[0]], new]).asfreq(freq).interpolate()
+        return series.iloc[-lags:]
+
+    def forecast(self, horizon=6, camera=None):
+        bundle = self.registry.load(camera)
+        if bundle is None:
+            # First request for this camera: train just it, not the whole set
+            self.retrain([camera])
+        elif time.time() - bundle["trained_at"] > self.retrain_interval_s:
+            self.retrain()
+        if bundle is None:
+            raise ValueError("No trained model yet; training has started in the background")
+        if horizon > bundle["horizon"]:
+            raise ValueError(f"Model was trained for at most {bundle['horizon']} steps")
+        key = (camera, horizon, bundle["trained_at"], self._latest_bucket(camera, bundle["freq"]))
+        with self._lock:
+            hit = self._cache.get(key) if key[-1] is not None else None
+            if hit is not None:
+                self._cache.move_to_end(key)
+                return hit
+        recent = self._recent(bundle, camera)
+        X, _ = feature_matrix(recent.values, recent.index, bundle["lags"], horizon, bundle["freq"])
+        pred = bundle["model"].predict(X[-horizon:])
+        index = recent.index[-1] + pd.Timedelta(bundle["freq"]) * np.arange(1, horizon + 1)
+        spread = bundle["spread"][:horizon]
+        pred = pd.Series(pred, index=index, name="predicted_mean")
+        conf = pd.DataFrame({"lower active": pred.values - spread, "upper active": pred.values + spread}, index=index)
+        with self._lock:
+            self._cache[key] = (pred, conf)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return pred, conf
+
+
 def train_and_forecast_ml(csv_path="data/outputs/metrics.csv", horizon=6, lags=6):
+    # One-shot fit on a CSV; the service path is MLForecaster + the registry
     df = pd.read_csv(csv_path, parse_dates=["timestamp"])
-    df = df.sort_values("timestamp")
-    df = create_features(df, lags=lags)
-    X = df.drop(["timestamp", "active"], axis=1)
-    y = df["active"]
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, format="mixed")
+    series = interval_series(df)
+    model, spread, _ = fit_direct(series, lags, horizon)
+    X, _ = feature_matrix(series.values[-lags:], series.index[-lags:], lags, horizon, "5min")
+    preds = model.predict(X)
+    conf_int = np.vstack([preds - spread, preds + spread]).T
+    return list(preds), conf_int
 
-    if XGB_AVAILABLE:
-        model = xgb.XGBRegressor(objective="reg:squarederror")
-    else:
-        model = GradientBoostingRegressor()
-    model.fit(X_train, y_train)
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Train ML forecasters for every camera into the model registry")
+    parser.add_argument("--root", default="data/outputs/metrics_db")
+    parser.add_argument("--registry", default="data/models/forecast")
+    parser.add_argument("--horizon", type=int, default=12)
+    parser.add_argument("--lags", type=int, default=6)
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+    for summary in train_all(processes=args.processes, store_root=args.root, registry_root=args.registry,
+                             horizon=args.horizon, lags=args.lags):
+        print(summary)
 
-    # Forecast next horizon steps
-    last_row = X.iloc[[-1]].copy()
-    preds = []
-    for _ in range(horizon):
-        pred = model.predict(last_row)[0]
-        preds.append(pred)
-        # roll lags
-        for i in range(lags, 1, -1):
-            last_row[f'lag_{i}'] = last_row[f'lag_{i-1}']
-        last_row['lag_1'] = pred
-        # Optionally update hour/weekday
-        last_row['hour'] = (last_row['hour'] + 1) % 24
-        last_row['weekday'] = (last_row['weekday'] + (last_row['hour'] == 0)) % 7
-
-    # Probabilistic: use model's std dev or quantiles if available (placeholder)
-    pred_arr = np.array(preds)
-    conf_int = np.vstack([pred_arr - pred_arr.std(), pred_arr + pred_arr.std()]).T
-    return preds, conf_int 
\ No newline at end of file
+# Example usage:
+# python -m src.forecasting.forecast_ml --processes 4
+# forecaster = MLForecaster()
+# pred, conf = forecaster.forecast(horizon=6, camera=1)   # one predict() call
+# forecaster.retrain()                                     # background, models swap in when done
@@ -1,33 +1,342 @@
+import time
+
 import numpy as np
+from lap import lapjv
+
+# Cost given to gated-out pairs; anything above distance_thresh is never assigned
+GATED = 1e6
+
+
+def pairwise_distances(a, b):
+    # a: [N,D], b: [M,D] -> [N,M] Euclidean distances in one matrix product
+    d2 = (a * a).sum(1)[:, None] + (b * b).sum(1)[None, :] - 2.0 * (a @ b.T)
+    return np.sqrt(np.maximum(d2, 0.0))
+
+
+def assign(cost, thresh):
+    # Optimal one-to-one assignment keeping only pairs with cost < thresh -> (rows, cols)
+    if cost.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    _, x, _ = lapjv(cost.astype(np.float64), extend_cost=True, cost_limit=thresh)
+    rows = np.nonzero(x >= 0)[0]
+    cols = x[rows]
+    ok = cost[rows, cols] < thresh
+    return rows[ok], cols[ok].astype(np.int64)
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index: a k-means coarse
+    quantizer splits the vectors into n_lists cells and a query only scans
+    the nprobe cells whose centroids are closest. Vectors added after
+    build() are kept in a small side list that every query scans exactly.
+    """
+
+    def __init__(self, n_lists=None, nprobe=8, iters=8, sample=50000, seed=0):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.iters = iters
+        self.sample = sample
+        self.rng = np.random.default_rng(seed)
+        self.size = 0
+        self.centroids = None
+        self.rows = np.zeros(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.extra = []
+
+    def build(self, X, rows):
+        # X: [N,D] vectors stored under ids rows [N]
+        n = len(X)
+        k = max(1, min(n, self.n_lists or int(np.sqrt(n))))
+        train = X if n <= self.sample else X[self.rng.choice(n, self.sample, replace=False)]
+        centroids = train[self.rng.choice(len(train), k, replace=False)].copy()
+        for _ in range(self.iters):
+            labels = pairwise_distances(train, centroids).argmin(1)
+            counts = np.bincount(labels, minlength=k)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, train)
+            filled = counts > 0
+            centroids[filled] = sums[filled] / counts[filled, None]
+        labels = pairwise_distances(X, centroids).argmin(1)
+        order = np.argsort(labels, kind="stable")
+        self.centroids = centroids
+        self.rows = np.asarray(rows, dtype=np.int64)[order]
+        self.offsets = np.searchsorted(labels[order], np.arange(k + 1))
+        self.size = n
+        self.extra = []
+
+    def add(self, rows):
+        self.extra.extend(int(r) for r in rows)
+
+    def search(self, Q):
+        # -> unique ids of every vector in the cells probed by any query, plus the side list
+        probe = np.argsort(pairwise_distances(Q, self.centroids), axis=1)[:, :self.nprobe]
+        cells = np.unique(probe)
+        parts = [self.rows[self.offsets[c]:self.offsets[c + 1]] for c in cells]
+        parts.append(np.asarray(self.extra, dtype=np.int64))
+        return np.unique(np.concatenate(parts))
+
+
+class MultiCamFusion:
+    """
+    Cross-camera identity fusion with global IDs that persist across frames.
+
+    Every update() stacks each camera's ReID embeddings into a matrix, computes
+    all cross-camera distances per camera pair at once and solves one optimal
+    assignment per pair. Pairs are gated on embedding distance, on position
+    (max_distance, only meaningful for ground-plane positions, see
+    utils.homography) and on capture time (max_time_gap_s). Matches are merged
+    cheapest first, never joining two tracks of the same camera, so the result
+    does not depend on camera or track order.
+
+    A local track keeps the global ID it had last frame. Groups with no known
+    local track are matched against the gallery of recently seen identities
+    (embedding EMA, last position, last seen), again by optimal assignment;
+    with more than ann_threshold identities the gallery is searched through an
+    IVFIndex shortlist instead of scanned in full. Identities unseen for
+    max_age_s are dropped.
+    """
+
+    def __init__(self, distance_thresh=0.5, max_distance=None, max_time_gap_s=1.0, max_speed=None,
+                 max_age_s=30.0, momentum=0.9, ann_threshold=4096, nprobe=8):
+        self.distance_thresh = distance_thresh
+        self.max_distance = max_distance
+        self.max_time_gap_s = max_time_gap_s
+        self.max_speed = max_speed
+        self.max_age_s = max_age_s
+        self.momentum = momentum
+        self.ann_threshold = ann_threshold
+        self.nprobe = nprobe
+        self.next_gid = 0
+        self.local = {}       # (cam, track_id) -> global id
+        self.local_seen = {}  # (cam, track_id) -> last timestamp
+        # Gallery, one row per identity; rows are only compacted when half are dead
+        self.g_emb = None
+        self.g_gid = np.zeros(0, dtype=np.int64)
+        self.g_pos = np.zeros((0, 2))
+        self.g_seen = np.zeros(0)
+        self.g_alive = np.zeros(0, dtype=bool)
+        self.g_n = 0
+        self.gid_row = {}
+        self.index = None
+
+    # --- gallery ---
+
+    def _grow(self, n, dim):
+        need = self.g_n + n
+        if self.g_emb is None:
+            self.g_emb = np.zeros((0, dim), dtype=np.float32)
+        if need <= len(self.g_gid):
+            return
+        cap = max(need, 2 * len(self.g_gid), 64)
+        pad = cap - len(self.g_gid)
+        self.g_emb = np.concatenate([self.g_emb, np.zeros((pad, dim), dtype=np.float32)])
+        self.g_gid = np.concatenate([self.g_gid, np.full(pad, -1, dtype=np.int64)])
+        self.g_pos = np.concatenate([self.g_pos, np.zeros((pad, 2))])
+        self.g_seen = np.concatenate([self.g_seen, np.zeros(pad)])
+        self.g_alive = np.concatenate([self.g_alive, np.zeros(pad, dtype=bool)])
+
+    def _compact(self):
+        n = self.g_n
+        keep = np.nonzero(self.g_alive[:n])[0]
+        self.g_emb = self.g_emb[keep]
+        self.g_gid = self.g_gid[keep]
+        self.g_pos = self.g_pos[keep]
+        self.g_seen = self.g_seen[keep]
+        self.g_alive = self.g_alive[keep]
+        self.g_n = len(keep)
+        self.gid_row = {int(g): i for i, g in enumerate(self.g_gid)}
+        self.index = None
+
+    def _evict(self, now):
+        n = self.g_n
+        stale = self.g_alive[:n] & (now - self.g_seen[:n] > self.max_age_s)
+        if stale.any():
+            for g in self.g_gid[:n][stale].tolist():
+                del self.gid_row[g]
+            self.g_alive[:n][stale] = False
+            if self.g_n > 64 and np.count_nonzero(self.g_alive[:n]) < n // 2:
+                self._compact()
+        for key in [k for k, t in self.local_seen.items() if now - t > self.max_age_s]:
+            del self.local_seen[key]
+            self.local.pop(key, None)
+
+    def _candidates(self, Q):
+        # Gallery rows worth scoring against queries Q
+        alive = np.nonzero(self.g_alive[:self.g_n])[0]
+        if len(alive) <= self.ann_threshold:
+            return alive
+        if (self.index is None or len(self.index.extra) > 0.1 * self.index.size
+                or len(alive) < 0.75 * self.index.size):
+            self.index = IVFIndex(nprobe=self.nprobe)
+            self.index.build(self.g_emb[alive], alive)
+        rows = self.index.search(Q)
+        return rows[self.g_alive[rows]]
+
+    def _match_gallery(self, Q, pos, t, claimed):
+        # Q: [U,D] group embeddings -> [U] gallery rows (-1 = no match)
+        out = np.full(len(Q), -1, dtype=np.int64)
+        if self.g_n == 0 or len(Q) == 0:
+            return out
+        rows = self._candidates(Q)
+        if claimed:
+            rows = rows[~np.isin(self.g_gid[rows], list(claimed))]
+        if len(rows) == 0:
+            return out
+        cost = pairwise_distances(Q, self.g_emb[rows])
+        if self.max_speed is not None:
+            reach = self.max_speed * np.maximum(t[:, None] - self.g_seen[rows][None, :], 0) + (self.max_distance or 0)
+            cost[pairwise_distances(pos, self.g_pos[rows]) > reach] = GATED
+        r, c = assign(cost, self.distance_thresh)
+        out[r] = rows[c]
+        return out
+
+    # --- fusion ---
+
+    def _groups(self, cams, emb, pos, ts):
+        # Union-find over cross-camera matches, cheapest first -> [M] group label
+        M = len(cams)
+        parent = np.arange(M)
+        members = [{int(c)} for c in cams]
+
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        edges = []
+        cam_ids = np.unique(cams)
+        idx = {c: np.nonzero(cams == c)[0] for c in cam_ids}
+        for i, a in enumerate(cam_ids):
+            for b in cam_ids[i + 1:]:
+                ia, ib = idx[a], idx[b]
+                if self.max_time_gap_s is not None and abs(ts[ia[0]] - ts[ib[0]]) > self.max_time_gap_s:
+                    continue
+                cost = pairwise_distances(emb[ia], emb[ib])
+                if self.max_distance is not None:
+                    cost[pairwise_distances(pos[ia], pos[ib]) > self.max_distance] = GATED
+                r, c = assign(cost, self.distance_thresh)
+                edges.extend(zip(cost[r, c].tolist(), ia[r].tolist(), ib[c].tolist()))
+
+        for _, u, v in sorted(edges):
+            ru, rv = find(u), find(v)
+            if ru == rv or members[ru] & members[rv]:
+                continue
+            parent[rv] = ru
+            members[ru] |= members[rv]
+        return np.array([find(i) for i in range(M)], dtype=np.int64)
+
+    def update(self, cam_tracks, reid_embeddings, timestamps=None):
+        """
+        cam_tracks: {cam_id: {track_id: (x, y)}}
+        reid_embeddings: {cam_id: {track_id: embedding}}
+        timestamps: {cam_id: capture time (s)} or one time for all; default now
+        -> {global_id: (x, y)} mean position of each identity's views
+        """
+        now = time.time()
+        keys, cams, pos, embs, ts = [], [], [], [], []
+        for cam, tracks in cam_tracks.items():
+            if not tracks:
+                continue
+            t = timestamps.get(cam, now) if isinstance(timestamps, dict) else (timestamps or now)
+            emb = reid_embeddings[cam]
+            for tid, p in tracks.items():
+                keys.append((cam, tid))
+                cams.append(cam)
+                pos.append((float(p[0]), float(p[1])))
+                embs.append(emb[tid])
+                ts.append(t)
+        self._evict(max(ts) if ts else now)
+        if not keys:
+            return {}
+
+        cam_index = {c: i for i, c in enumerate(dict.fromkeys(cams))}
+        cams = np.array([cam_index[c] for c in cams], dtype=np.int64)
+        pos = np.asarray(pos, dtype=np.float64)
+        emb = np.asarray(embs, dtype=np.float32).reshape(len(keys), -1)
+        ts = np.asarray(ts, dtype=np.float64)
+
+        labels = self._groups(cams, emb, pos, ts)
+        roots, group = np.unique(labels, return_inverse=True)
+        G = len(roots)
+        counts = np.bincount(group, minlength=G)
+        g_emb = np.zeros((G, emb.shape[1]), dtype=np.float32)
+        np.add.at(g_emb, group, emb)
+        g_emb /= counts[:, None]
+        g_pos = np.zeros((G, 2))
+        np.add.at(g_pos, group, pos)
+        g_pos /= counts[:, None]
+        g_t = np.zeros(G)
+        np.maximum.at(g_t, group, ts)
+
+        # Groups keep the lowest known global ID among their tracks, largest groups first
+        gids = np.full(G, -1, dtype=np.int64)
+        claimed = set()
+        known = {}
+        for g, gid in zip(group.tolist(), (self.local.get(k, -1) for k in keys)):
+            if gid >= 0:
+                known.setdefault(g, set()).add(gid)
+        for g in np.lexsort((roots, -counts)).tolist():
+            for gid in sorted(known.get(g, ())):
+                if gid not in claimed:
+                    gids[g] = gid
+                    claimed.add(gid)
+                    break
+
+        # Unknown groups: re-identify against the gallery, else a new identity
+        todo = np.nonzero(gids < 0)[0]
+        rows = self._match_gallery(g_emb[todo], g_pos[todo], g_t[todo], claimed)
+        for g, row in zip(todo.tolist(), rows.tolist()):
+            if row >= 0:
+                gids[g] = self.g_gid[row]
+            else:
+                gids[g] = self.next_gid
+                self.next_gid += 1
+
+        self._store(gids, g_emb, g_pos, g_t)
+        for k, g, t in zip(keys, group.tolist(), ts.tolist()):
+            self.local[k] = int(gids[g])
+            self.local_seen[k] = t
+        return {int(gid): (float(x), float(y)) for gid, (x, y) in zip(gids.tolist(), g_pos.tolist())}
+
+    def _store(self, gids, emb, pos, t):
+        rows = np.array([self.gid_row.get(int(g), -1) for g in gids], dtype=np.int64)
+        old = rows >= 0
+        if old.any():
+            r = rows[old]
+            m = self.momentum
+            self.g_emb[r] = m * self.g_emb[r] + (1 - m) * emb[old]
+            self.g_pos[r] = pos[old]
+            self.g_seen[r] = t[old]
+        new = np.nonzero(~old)[0]
+        if len(new):
+            self._grow(len(new), emb.shape[1])
+            r = np.arange(self.g_n, self.g_n + len(new))
+            self.g_emb[r] = emb[new]
+            self.g_gid[r] = gids[new]
+            self.g_pos[r] = pos[new]
+            self.g_seen[r] = t[new]
+            self.g_alive[r] = True
+            self.g_n += len(new)
+            for row, g in zip(r.tolist(), gids[new].tolist()):
+                self.gid_row[int(g)] = row
+            if self.index is not None:
+                self.index.add(r)
+
+    def global_ids(self):
+        # {(cam_id, track_id): global_id} for every local track seen within max_age_s
+        return dict(self.local)
+
 
 def fuse_tracks(cam_tracks, reid_embeddings, distance_thresh=0.5):
     # cam_tracks: dict of {cam_id: {track_id: (x, y)}}
     # reid_embeddings: dict of {cam_id: {track_id: embedding}}
     # Returns: fused_tracks: {global_id: (x, y)}
-    # Placeholder: naive fusion by spatial proximity and embedding distance
-    fused_tracks = {}
-    global_id = 0
-    used = set()
-    for cam1, tracks1 in cam_tracks.items():
-        for tid1, pos1 in tracks1.items():
-            emb1 = reid_embeddings[cam1][tid1]
-            matched = False
-            for cam2, tracks2 in cam_tracks.items():
-                if cam1 == cam2:
-                    continue
-                for tid2, pos2 in tracks2.items():
-                    emb2 = reid_embeddings[cam2][tid2]
-                    dist = np.linalg.norm(emb1 - emb2)
-                    if dist < distance_thresh:
-                        fused_tracks[global_id] = ((np.array(pos1) + np.array(pos2)) / 2).tolist()
-                        used.add((cam1, tid1))
-                        used.add((cam2, tid2))
-                        global_id += 1
-                        matched = True
-                        break
-                if matched:
-                    break
-            if not matched and (cam1, tid1) not in used:
-                fused_tracks[global_id] = pos1
-                global_id += 1
-    return fused_tracks 
\ No newline at end of file
+    # One-shot fusion; keep a MultiCamFusion across frames for stable global IDs
+    return MultiCamFusion(distance_thresh=distance_thresh, max_time_gap_s=None).update(cam_tracks, reid_embeddings)
+
+# Example usage:
+# fusion = MultiCamFusion(distance_thresh=0.5, max_distance=2.0)  # positions in metres
+# fused = fusion.update({1: tracks_cam1, 2: tracks_cam2}, {1: emb_cam1, 2: emb_cam2})
+# fusion.global_ids()  # {(cam_id, track_id): global_id}
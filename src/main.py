@@ -4,16 +4,36 @@ import yaml
 import pandas as pd
 import warnings
 from pathlib import Path
-from detectors.yolo_detector import YOLODetector
 from tracking.centroid_tracker import CentroidTracker
 from tracking.ocsort_tracker import OCSort
 from counting.counter import FlowCounter
+from detectors.batching import BatchScheduler, BatchedDetector
+from detectors.roi_crop import RoiCropDetector
+from pipeline.staged import StagedPipeline
+from pipeline.cadence import AdaptiveCadence
+from pipeline.supervisor import WorkerSupervisor, QueueMetricsSink, shard_cameras
+from analytics.heatmap import DecayingHeatmap
+from analytics.flow_field import FlowFieldBuilder
+from utils.frame_ring import FrameRingWriter
+from utils import telemetry as prom
+from utils.telemetry import CameraTelemetry
+from utils.homography import load_calibration
+from storage.metrics_store import MetricsStore
+from api.alerts import AlertEngine, log_notifier, message_notifier, telegram_notifier
+from cloud.streaming import PublisherGroup, get_publisher, state_from_tracks
+import threading
+import sys
 import numpy as np
 
 # Suppress warnings for cloud deployment
 warnings.filterwarnings("ignore", category=SyntaxWarning)
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
+LOGS_PATH = Path("data/outputs/metrics.csv")
+LIVE_SOURCE_TYPES = ("rtsp", "webcam")
+# Camera threads in batched mode share metrics.csv
+_CSV_LOCK = threading.Lock()
+
 def load_config():
     with open("src/config.yaml") as f:
         return yaml.safe_load(f)
@@ -24,107 +44,448 @@ def inside_polygon_mask(shape, polygon):
     cv2.fillPoly(mask, pts, 255)
     return mask
 
-def main():
-    cfg = load_config()
-    model = YOLODetector(cfg["model"]["weights"])
-    video_srcs = cfg["video_sources"]
-    tracker_type = cfg.get("model", {}).get("tracker", "ocsort").lower()
+def build_detector(cfg):
+    # Backends are imported lazily so the onnx backend never loads torch/ultralytics.
+    # Both get the same confidence, NMS IoU and class filter, so switching backend keeps the counts
+    model_cfg = cfg["model"]
+    conf = model_cfg.get("confidence", 0.3)
+    iou = model_cfg.get("iou_threshold", 0.45)
+    classes = model_cfg.get("classes", [0])
+    if model_cfg.get("backend", "ultralytics") == "onnx":
+        from detectors.onnx_detector import ONNXDetector
+        onnx_cfg = model_cfg.get("onnx", {}) or {}
+        return ONNXDetector(onnx_cfg.get("path", "yolov8n.onnx"), conf=conf, iou=iou,
+                            imgsz=onnx_cfg.get("imgsz", 640), classes=classes,
+                            threads=onnx_cfg.get("threads", 0))
+    from detectors.yolo_detector import YOLODetector
+    return YOLODetector(model_cfg["weights"], conf=conf, iou=iou, classes=classes)
 
-    logs_path = Path("data/outputs/metrics.csv")
-    logs_path.parent.mkdir(parents=True, exist_ok=True)
+def build_tracker(tracker_type):
+    if tracker_type == "ocsort":
+        return OCSort()
+    return CentroidTracker()
 
-    for cam in video_srcs:
-        cap = cv2.VideoCapture(cam["path"])
-        if tracker_type == "ocsort":
-            tracker = OCSort()
-        else:
-            tracker = CentroidTracker()
-        counter = FlowCounter(cam["roi"])
-        roi_mask = None
-        heatmap = None
-        last_log_time = time.time()
-        counts_acc = 0
-
-        # --- Add VideoWriter for overlayed video ---
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        fps = cap.get(cv2.CAP_PROP_FPS) or 25
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        out = cv2.VideoWriter("data/outputs/overlayed_video.mp4", fourcc, fps, (width, height))
-
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            if roi_mask is None:
-                roi_mask = inside_polygon_mask(frame.shape, cam["roi"])
-                heatmap = np.zeros(frame.shape[:2], dtype=np.float32)
+def is_live_source(cam):
+    return cam.get("type", "file") in LIVE_SOURCE_TYPES
+
+def output_paths(cam, primary=True):
+    # The dashboard reads the un-suffixed files, extra cameras get their own
+    if primary:
+        return "data/outputs/overlayed_video.mp4", "data/outputs/live_frame.jpg"
+    return f"data/outputs/overlayed_video_{cam['id']}.mp4", f"data/outputs/live_frame_{cam['id']}.jpg"
+
+def frame_size(cap):
+    return int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+def open_video_writer(cap, path="data/outputs/overlayed_video.mp4"):
+    # --- Add VideoWriter for overlayed video ---
+    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25
+    width, height = frame_size(cap)
+    return cv2.VideoWriter(path, fourcc, fps, (width, height))
+
+def build_flow_field(cam, cap, cfg):
+    # Grid density / speed / flow maps, in metres when the camera has a calibration
+    field_cfg = cfg.get("flow_field", {}) or {}
+    if not field_cfg.get("enabled", False):
+        return None
+    width, height = frame_size(cap)
+    calibrator = None
+    if cam.get("calibration"):
+        homography_cfg = cfg.get("homography", {}) or {}
+        calibrator = load_calibration(cam["id"], cam["calibration"]["image_points"],
+                                      cam["calibration"]["world_points"], (height, width),
+                                      cache_dir=homography_cfg.get("cache_dir", "data/calibration"),
+                                      step=homography_cfg.get("lut_step", 4))
+    return FlowFieldBuilder((height, width), cell_size=field_cfg.get("cell_size", 32),
+                            window_s=field_cfg.get("window_s", 10), bucket_s=field_cfg.get("bucket_s", 1),
+                            calibrator=calibrator)
+
+def build_counter(cam, cap, counting_cfg):
+    # "raster" classifies centroids with one lookup into a precomputed ROI mask
+    counter = FlowCounter(cam["roi"], max_missing=counting_cfg.get("max_missing", 30))
+    width, height = frame_size(cap)
+    if counting_cfg.get("membership", "raster") == "raster" and width > 0 and height > 0:
+        counter.set_mask(inside_polygon_mask((height, width), cam["roi"]))
+    return counter
+
+def draw_tracks(frame, roi, tracks):
+    # draw ROI
+    cv2.polylines(frame, [np.array(roi, dtype=np.int32)], True, (0,255,255), 2)
+
+    # draw boxes & ids
+    for oid, centroid in tracks.items():
+        # Extract scalar values to avoid NumPy deprecation warnings
+        cx, cy = float(centroid[0]), float(centroid[1])
+        cv2.circle(frame, (int(cx), int(cy)), 4, (0,255,0), -1)
+        cv2.putText(frame, f"ID:{oid}", (int(cx)+5, int(cy)-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,255,0), 1)
+
+def render_overlay(frame, heatmap, in_c, out_c):
+    # render heatmap overlay
+    frame = heatmap.render(frame)
+
+    cv2.putText(frame, f"IN: {in_c}  OUT: {out_c}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
+
+    # Ensure frame is 3-channel BGR for VideoWriter
+    if len(frame.shape) == 2 or frame.shape[2] == 1:
+        frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+    return frame
+
+class CsvMetricsSink:
+    # Legacy metrics.csv output
+    def __init__(self, logs_path=LOGS_PATH):
+        self.logs_path = logs_path
+
+    def append(self, row):
+        with _CSV_LOCK:
+            pd.DataFrame([row]).to_csv(self.logs_path, mode="a", header=not self.logs_path.exists(), index=False)
+
+    def close(self):
+        pass
+
+class MetricsLogger:
+    def __init__(self, cam_id, sink=None, interval=5):
+        self.cam_id = cam_id
+        self.sink = sink if sink is not None else CsvMetricsSink()
+        self.interval = interval
+        self.last_log_time = time.time()
+        self.counts_acc = 0
+
+    def maybe_log(self, in_c, out_c, active):
+        # aggregate & log every N seconds (e.g., 5)
+        if time.time() - self.last_log_time <= self.interval:
+            return
+        now = pd.Timestamp.now("UTC")
+        total = in_c - out_c
+        row = {
+            "timestamp": now,
+            "camera": self.cam_id,
+            "in": in_c,
+            "out": out_c,
+            "active": active,
+            "net": total
+        }
+        self.counts_acc += total
+        self.sink.append(row)
+        self.last_log_time = time.time()
+
+def open_metrics_sink(cfg):
+    # MetricsStore by default, analytics.metrics_store: csv keeps appending to metrics.csv
+    analytics = cfg.get("analytics", {}) or {}
+    if analytics.get("metrics_store", "sqlite") != "sqlite":
+        return CsvMetricsSink()
+    return MetricsStore(analytics.get("metrics_path", "data/outputs/metrics_db"),
+                        flush_rows=analytics.get("flush_rows", 64),
+                        flush_interval_s=analytics.get("flush_interval_s", 5))
+
+def build_alert_engine(cfg):
+    # Rules from the alerts section, evaluated on every row the metrics sink receives
+    alerts_cfg = cfg.get("alerts", {}) or {}
+    if not alerts_cfg.get("enabled", False):
+        return None
+    notifiers = [log_notifier]
+    if alerts_cfg.get("voice", False):
+        from alerts.voice import speak_alert
+        notifiers.append(message_notifier(speak_alert))
+    telegram = alerts_cfg.get("telegram")
+    if telegram:
+        notifiers.append(telegram_notifier(telegram["token"], telegram["chat_id"]))
+    return AlertEngine.from_config(cfg, notifiers)
+
+def build_publishers(cfg):
+    # One shared async publisher per configured sink; None when streaming is off
+    stream_cfg = cfg.get("streaming", {}) or {}
+    if not stream_cfg.get("enabled", False) or not stream_cfg.get("sinks"):
+        return None
+    return PublisherGroup([
+        get_publisher(sink["endpoint"], sink.get("topic", "crowd_state"),
+                      max_queue=sink.get("max_queue", 256), max_batch=sink.get("max_batch", 32),
+                      max_delay_ms=sink.get("max_delay_ms", 50), policy=sink.get("policy", "coalesce"))
+        for sink in stream_cfg["sinks"]])
+
+class FrameRenderer:
+    # Render/encode stage: overlay, VideoWriter, live frame and metrics logging
+    def __init__(self, cam, writer, live_frame_path="data/outputs/live_frame.jpg", roi_mask=None,
+                 heatmap_cfg=None, fps=25, live_cfg=None, metrics_sink=None, telemetry=None, field=None,
+                 publisher=None, publish_every=1):
+        self.cam = cam
+        self.writer = writer
+        self.live_frame_path = live_frame_path
+        self.live_cfg = live_cfg or {}
+        self.live_mode = self.live_cfg.get("mode", "shm")
+        self.live_ring = None
+        self.roi_mask = roi_mask
+        self.heatmap_cfg = heatmap_cfg or {}
+        self.frame_dt = 1.0 / (fps or 25)
+        self.heatmap = None
+        self.logger = MetricsLogger(cam["id"], sink=metrics_sink)
+        self.telemetry = telemetry or CameraTelemetry(cam["id"], enabled=False)
+        # Optional density / speed / flow maps feeding compute_cpi
+        self.field = field
+        self.frames = 0
+        # Optional outbound crowd-state stream (Kafka / digital twin / AR), queued, never sent inline
+        self.publisher = publisher
+        self.publish_every = max(1, int(publish_every))
+
+    def __call__(self, frame, tracks, in_c, out_c):
+        t = time.perf_counter()
+        if self.roi_mask is None or self.roi_mask.shape != frame.shape[:2]:
+            self.roi_mask = inside_polygon_mask(frame.shape, self.cam["roi"])
+        if self.heatmap is None:
+            hc = self.heatmap_cfg
+            self.heatmap = DecayingHeatmap(
+                frame.shape, self.roi_mask,
+                cell_size=hc.get("cell_size", 8),
+                sigma=hc.get("sigma", 1.5),
+                half_life_s=hc.get("half_life_s", 30),
+                render_every=hc.get("render_every", 5),
+                alpha=hc.get("alpha", 0.3),
+            )
+
+        draw_tracks(frame, self.cam["roi"], tracks)
+        # Decay by video time, not wall time, so files and live feeds behave alike
+        self.heatmap.update(tracks, self.frame_dt)
+        frame = render_overlay(frame, self.heatmap, in_c, out_c)
+        if self.field is not None:
+            self.field.update(tracks, self.frames * self.frame_dt)
+            self.telemetry.field_done(float(self.field.cpi().max()), float(self.field.density().max()))
+        self.frames += 1
+        t = self.telemetry.lap("render", t)
+
+        # --- Write overlayed frame to video ---
+        self.writer.write(frame)
+
+        # --- Publish latest frame for the live stream ---
+        self.publish_live(frame)
+        t = self.telemetry.lap("encode", t)
+
+        # Skip GUI display in cloud environment
+        # cv2.imshow(f"Cam {cam['id']}", frame)
+        # if cv2.waitKey(1) & 0xFF == ord('q'):
+        #     break
+
+        self.logger.maybe_log(in_c, out_c, len(tracks))
+        if self.publisher is not None and self.frames % self.publish_every == 0:
+            self.publisher.publish(state_from_tracks(self.cam["id"], tracks, **{"in": in_c, "out": out_c},
+                                                     active=len(tracks), frame=self.frames))
+        self.telemetry.lap("log", t)
+        self.telemetry.frame_done(in_c, out_c, len(tracks))
 
+    def publish_live(self, frame):
+        if self.live_mode == "file":
+            cv2.imwrite(self.live_frame_path, frame)
+        elif self.live_mode == "shm":
+            # Raw copy into the shared-memory ring; the API encodes only while clients watch
+            if self.live_ring is None:
+                self.live_ring = FrameRingWriter(self.cam["id"], frame.shape,
+                                                 slots=self.live_cfg.get("slots", 4),
+                                                 consumer_timeout_s=self.live_cfg.get("consumer_timeout_s", 5))
+            self.live_ring.publish(frame)
+
+    def close(self):
+        if self.live_ring is not None:
+            self.live_ring.close()
+            self.live_ring = None
+
+def run_sequential(cam, cap, model, tracker, counter, render, cadence=None, telemetry=None):
+    telemetry = telemetry or CameraTelemetry(cam["id"], enabled=False)
+    while True:
+        t = time.perf_counter()
+        ret, frame = cap.read()
+        if not ret:
+            break
+        t = telemetry.lap("decode", t)
+
+        started = t
+        detect = cadence is None or cadence.should_detect(frame, tracker)
+        if detect:
             boxes, scores, classes = model.infer(frame)
+            t = telemetry.lap("infer", t)
             box_list = [b.flatten() for b in boxes]
             tracks = tracker.update(box_list)
+        else:
+            # Tracker-only frame: coast tracks on the motion model
+            tracks = tracker.predict_tracks()
+        t = telemetry.lap("track", t)
+        in_c, out_c = counter.update(tracks)
+        telemetry.lap("count", t)
+        render(frame, tracks, in_c, out_c)
+        if cadence is not None:
+            cadence.record(detect, time.perf_counter() - started)
+
+def run_staged(cam, cap, model, tracker, counter, render, pipeline_cfg, cadence=None, telemetry=None):
+    # decode -> infer -> track/count -> render/encode, one thread per stage
+    telemetry = telemetry or CameraTelemetry(cam["id"], enabled=False)
+
+    def decode():
+        t = time.perf_counter()
+        ret, frame = cap.read()
+        telemetry.lap("decode", t)
+        return frame if ret else None
+
+    def infer(frame):
+        # The infer stage bounds throughput, so the cadence budget applies to it alone. The tracker
+        # belongs to the track stage: its uncertainty comes from what that stage publishes
+        started = time.perf_counter()
+        detect = cadence is None or cadence.should_detect(frame)
+        box_list = None
+        if detect:
+            boxes, scores, classes = model.infer(frame)
+            telemetry.lap("infer", started)
+            box_list = [b.flatten() for b in boxes]
+        if cadence is not None:
+            cadence.record(detect, time.perf_counter() - started)
+        return frame, box_list
+
+    def track(item):
+        frame, box_list = item
+        # Trackers return their internal dict, snapshot it before handing off
+        t = time.perf_counter()
+        if box_list is None:
+            tracks = dict(tracker.predict_tracks())
+        else:
+            tracks = dict(tracker.update(box_list))
+        if cadence is not None:
+            cadence.observe(tracker.uncertainty(), box_list is not None)
+        t = telemetry.lap("track", t)
+        in_c, out_c = counter.update(tracks)
+        telemetry.lap("count", t)
+        return frame, tracks, in_c, out_c
+
+    drop_oldest = pipeline_cfg.get("drop_oldest", "auto")
+    if drop_oldest == "auto":
+        drop_oldest = is_live_source(cam)
+
+    pipe = StagedPipeline(
+        decode,
+        [("infer", infer), ("track", track)],
+        lambda item: render(*item),
+        queue_depths=pipeline_cfg.get("queue_depths"),
+        drop_oldest=bool(drop_oldest),
+    )
+    telemetry.watch(pipe)
+    pipe.run()
+    dropped = {k: v for k, v in pipe.dropped().items() if v}
+    if dropped:
+        print(f"[PIPELINE] Cam {cam['id']} dropped frames: {dropped}")
+
+def process_camera(cam, model, cfg, primary=True, metrics_sink=None):
+    tracker_type = cfg.get("model", {}).get("tracker", "ocsort").lower()
+    pipeline_cfg = cfg.get("pipeline", {}) or {}
+    video_path, live_frame_path = output_paths(cam, primary)
+    cap = cv2.VideoCapture(cam["path"])
+    tracker = build_tracker(tracker_type)
+    counter = build_counter(cam, cap, cfg.get("counting", {}) or {})
+    out = open_video_writer(cap, video_path)
+    telemetry_cfg = cfg.get("telemetry", {}) or {}
+    telemetry = CameraTelemetry(cam["id"], enabled=telemetry_cfg.get("enabled", True),
+                                publish_interval_s=telemetry_cfg.get("publish_interval_s", 1.0))
+    render = FrameRenderer(cam, out, live_frame_path, counter.roi_mask,
+                           heatmap_cfg=cfg.get("heatmap"), fps=cap.get(cv2.CAP_PROP_FPS),
+                           live_cfg=cfg.get("live_feed"), metrics_sink=metrics_sink, telemetry=telemetry,
+                           field=build_flow_field(cam, cap, cfg), publisher=build_publishers(cfg),
+                           publish_every=(cfg.get("streaming", {}) or {}).get("every_n_frames", 1))
 
-            # draw ROI
-            cv2.polylines(frame, [np.array(cam["roi"], dtype=np.int32)], True, (0,255,255), 2)
-
-            # draw boxes & ids
-            for oid, centroid in tracks.items():
-                # Extract scalar values to avoid NumPy deprecation warnings
-                cx, cy = float(centroid[0]), float(centroid[1])
-                cv2.circle(frame, (int(cx), int(cy)), 4, (0,255,0), -1)
-                cv2.putText(frame, f"ID:{oid}", (int(cx)+5, int(cy)-5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0,255,0), 1)
-
-            in_c, out_c = counter.update(tracks)
-
-            # heatmap accumulation for motion in ROI
-            for oid, c in tracks.items():
-                # Extract scalar values to avoid NumPy deprecation warnings
-                x, y = int(float(c[0])), int(float(c[1]))
-                if roi_mask[y, x] > 0:
-                    heatmap[y, x] += 1
-
-            # render heatmap overlay
-            hm = cv2.normalize(heatmap, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
-            hm_color = cv2.applyColorMap(hm, cv2.COLORMAP_JET)
-            overlay = cv2.addWeighted(frame, 0.7, hm_color, 0.3, 0)
-            frame = overlay
-
-            cv2.putText(frame, f"IN: {in_c}  OUT: {out_c}", (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 1, (255,255,255), 2)
-
-            # --- Write overlayed frame to video ---
-            # Ensure frame is 3-channel BGR for VideoWriter
-            if len(frame.shape) == 2 or frame.shape[2] == 1:
-                frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
-            out.write(frame)
-
-            # --- Save latest frame for dashboard live stream ---
-            cv2.imwrite("data/outputs/live_frame.jpg", frame)
-
-            # Skip GUI display in cloud environment
-            # cv2.imshow(f"Cam {cam['id']}", frame)
-            # if cv2.waitKey(1) & 0xFF == ord('q'):
-            #     break
-
-            # aggregate & log every N seconds (e.g., 5)
-            if time.time() - last_log_time > 5:
-                now = pd.Timestamp.utcnow()
-                total = in_c - out_c
-                row = {
-                    "timestamp": now,
-                    "camera": cam["id"],
-                    "in": in_c,
-                    "out": out_c,
-                    "active": len(tracks),
-                    "net": total
-                }
-                counts_acc += total
-                pd.DataFrame([row]).to_csv(logs_path, mode="a", header=not logs_path.exists(), index=False)
-                last_log_time = time.time()
+    cadence = AdaptiveCadence.from_config(cfg.get("cadence"), cam)
+    crop_cfg = cfg.get("model", {}).get("roi_crop", {}) or {}
+    if crop_cfg.get("enabled", False):
+        # Only the ROI's bounding rectangle is inferred; boxes are mapped back to the full frame
+        model = RoiCropDetector(model, cam["roi"], margin=crop_cfg.get("margin", 32))
 
+    try:
+        if pipeline_cfg.get("mode", "sequential").lower() == "staged":
+            run_staged(cam, cap, model, tracker, counter, render, pipeline_cfg, cadence, telemetry)
+        else:
+            run_sequential(cam, cap, model, tracker, counter, render, cadence, telemetry)
+        if cadence is not None:
+            print(f"[CADENCE] Cam {cam['id']}: {cadence.stats()}")
+    finally:
         cap.release()
         out.release()
-        break  # Only process the first camera/video for overlayed video
+        render.close()
+        telemetry.close()
+
+def run_cameras(video_srcs, model, cfg, metrics_sink=None, primary_id=None, fail_fast=False):
+    # One thread per camera. Every model call goes through one BatchScheduler, so the
+    # model is never entered from two threads and, with batching on, frames share forward passes.
+    batch_cfg = cfg.get("model", {}).get("batching", {}) or {}
+    max_batch = batch_cfg.get("max_batch", 8) if batch_cfg.get("enabled", False) else 1
+    scheduler = BatchScheduler(model, max_batch, batch_cfg.get("max_delay_ms", 20)).start()
+    detector = BatchedDetector(scheduler)
+    errors = []
+    failed = threading.Event()
+
+    def worker(cam):
+        try:
+            process_camera(cam, detector, cfg, cam["id"] == primary_id, metrics_sink)
+            if fail_fast and is_live_source(cam):
+                raise RuntimeError("live source ended")
+        except Exception as e:
+            errors.append((cam["id"], e))
+            failed.set()
+
+    threads = [threading.Thread(target=worker, args=(cam,), name=f"cam-{cam['id']}", daemon=True)
+               for cam in video_srcs]
+    for t in threads:
+        t.start()
+    while any(t.is_alive() for t in threads) and not (fail_fast and failed.is_set()):
+        failed.wait(0.5)
+    scheduler.stop()
+    for cam_id, e in errors:
+        print(f"[CAMERA] Cam {cam_id} failed: {e}")
+    return errors
+
+def camera_worker(worker_idx, cams, metrics_queue):
+    # Entry point of a supervised worker process: owns its model, captures, trackers and counters
+    cfg = load_config()
+    model = build_detector(cfg)
+    sink = QueueMetricsSink(metrics_queue)
+    errors = run_cameras(cams, model, cfg, sink, primary_id=cfg["video_sources"][0]["id"], fail_fast=True)
+    if errors:
+        # Non-zero exit tells the supervisor to restart this shard
+        sys.exit(1)
+
+def run_supervised(cfg, metrics_sink):
+    workers_cfg = cfg.get("workers", {}) or {}
+    shards = shard_cameras(cfg["video_sources"], workers_cfg.get("processes", 0))
+    print(f"[SUPERVISOR] {len(cfg['video_sources'])} cameras on {len(shards)} worker processes")
+    supervisor = WorkerSupervisor(camera_worker, shards, metrics_sink=metrics_sink,
+                                  max_restarts=workers_cfg.get("max_restarts", 5),
+                                  restart_backoff_s=workers_cfg.get("restart_backoff_s", 2),
+                                  on_worker_exit=prom.mark_process_dead)
+    supervisor.run()
+
+def main():
+    cfg = load_config()
+    video_srcs = cfg["video_sources"]
+    batch_cfg = cfg.get("model", {}).get("batching", {}) or {}
+
+    LOGS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    metrics_sink = open_metrics_sink(cfg)
+    alert_engine = build_alert_engine(cfg)
+    if alert_engine is not None:
+        # Supervised workers' rows reach this sink too, so one engine sees every camera
+        metrics_sink = alert_engine.wrap(metrics_sink)
+    # Workers inherit the multiprocess directory and write into it; start every run from zero
+    prom.init_telemetry()
+    prom.reset()
+
+    try:
+        if (cfg.get("workers", {}) or {}).get("enabled", False):
+            run_supervised(cfg, metrics_sink)
+            return
+
+        model = build_detector(cfg)
+        if batch_cfg.get("enabled", False):
+            run_cameras(video_srcs, model, cfg, metrics_sink, primary_id=video_srcs[0]["id"])
+            return
+
+        for cam in video_srcs:
+            process_camera(cam, model, cfg, metrics_sink=metrics_sink)
+            break  # Only process the first camera/video for overlayed video
+    finally:
+        metrics_sink.close()
+        prom.mark_process_dead()
     # cv2.destroyAllWindows()  # Skip in cloud environment
 
 if __name__ == "__main__":
@@ -0,0 +1,121 @@
+import cv2
+import numpy as np
+
+
+class AdaptiveCadence:
+    """
+    Decides per frame whether to run the detector or let the tracker coast.
+    The detector runs every `interval` frames; interval is re-derived from
+    smoothed detect / track-only frame costs so the average frame cost stays
+    within the camera's budget (latency_budget_ms, or 1 / target_fps).
+    Detection is forced early when the tracker's positional uncertainty or the
+    scene motion since the last detection exceeds its threshold. In staged
+    mode the track stage reports the uncertainty with observe() instead; the
+    frames decided but not tracked yet are added at the observed growth rate.
+    """
+
+    def __init__(self, target_fps=25, latency_budget_ms=None, min_interval=1, max_interval=6,
+                 uncertainty_px=25.0, motion_threshold=12.0, smoothing=0.2, motion_scale=8):
+        if latency_budget_ms:
+            self.budget_s = latency_budget_ms / 1000.0
+        else:
+            self.budget_s = 1.0 / target_fps if target_fps else None
+        self.min_interval = max(1, int(min_interval))
+        self.max_interval = max(self.min_interval, int(max_interval))
+        self.uncertainty_px = uncertainty_px
+        self.motion_threshold = motion_threshold
+        self.smoothing = smoothing
+        self.motion_scale = max(1, int(motion_scale))
+        self.interval = self.min_interval
+        self.since_detect = self.max_interval  # detect on the first frame
+        self.detect_cost = None
+        self.track_cost = None
+        self._ref = None
+        self.forced = 0
+        self.detections = 0
+        self.frames = 0
+        # Published by the track stage (staged mode); plain attributes, written by one thread
+        self.uncertainty = 0.0
+        self.uncertainty_growth = 0.0  # per coasted frame
+        self.tracked = 0
+
+    @classmethod
+    def from_config(cls, cadence_cfg, cam=None):
+        # Global cadence settings, overridden per camera by video_sources[i].cadence
+        opts = dict(cadence_cfg or {})
+        opts.update((cam or {}).get("cadence", {}) or {})
+        if not opts.pop("enabled", False):
+            return None
+        return cls(**opts)
+
+    def _small_gray(self, frame):
+        h, w = frame.shape[:2]
+        small = cv2.resize(frame, (max(1, w // self.motion_scale), max(1, h // self.motion_scale)),
+                           interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def motion(self, frame):
+        # Mean absolute difference (0-255) against the last detected frame, at reduced resolution
+        if self._ref is None:
+            return float("inf")
+        return float(cv2.absdiff(self._small_gray(frame), self._ref).mean())
+
+    def observe(self, uncertainty, detected):
+        # Track stage, after each tracker step: publish the uncertainty the decision should use
+        if not detected:
+            self.uncertainty_growth = self._smooth(self.uncertainty_growth, max(0.0, uncertainty - self.uncertainty))
+        self.uncertainty = uncertainty
+        self.tracked += 1
+
+    def expected_uncertainty(self):
+        # Last observed value, projected over the frames still queued between the stages
+        return self.uncertainty + self.uncertainty_growth * max(0, self.frames - 1 - self.tracked)
+
+    def should_detect(self, frame, tracker=None):
+        # tracker: read directly (sequential mode); None uses the values published with observe()
+        self.frames += 1
+        self.since_detect += 1
+        uncertainty = tracker.uncertainty() if tracker is not None else self.expected_uncertainty()
+        if self.since_detect >= self.interval:
+            detect = True
+        elif uncertainty > self.uncertainty_px or self.motion(frame) > self.motion_threshold:
+            detect = True
+            self.forced += 1
+        else:
+            detect = False
+        if detect:
+            self.since_detect = 0
+            self.detections += 1
+            self._ref = self._small_gray(frame)
+        return detect
+
+    def _smooth(self, prev, value):
+        return value if prev is None else prev + self.smoothing * (value - prev)
+
+    def record(self, detected, elapsed_s):
+        # Feed back the wall time of the frame just processed and re-plan the interval
+        if detected:
+            self.detect_cost = self._smooth(self.detect_cost, elapsed_s)
+        else:
+            self.track_cost = self._smooth(self.track_cost, elapsed_s)
+        if self.budget_s is None or self.detect_cost is None:
+            return
+        d = self.detect_cost
+        t = self.track_cost if self.track_cost is not None else 0.0
+        # Average cost with interval k is (d + (k-1) t) / k; pick the smallest k within budget
+        if d <= self.budget_s:
+            k = self.min_interval
+        elif t >= self.budget_s:
+            k = self.max_interval
+        else:
+            k = int(np.ceil((d - t) / (self.budget_s - t)))
+        self.interval = int(np.clip(k, self.min_interval, self.max_interval))
+
+    def stats(self):
+        return {"interval": self.interval, "frames": self.frames, "detections": self.detections, "forced": self.forced}
+
+# Example usage:
+# cadence = AdaptiveCadence(target_fps=15, max_interval=4)
+# if cadence.should_detect(frame, tracker): tracks = tracker.update(boxes)   # staged: should_detect(frame)
+# else: tracks = tracker.predict_tracks()                                    # and cadence.observe(u, detected)
+# cadence.record(detected, elapsed_s)
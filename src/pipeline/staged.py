@@ -0,0 +1,149 @@
+import queue
+import threading
+
+# Marker pushed through every queue once the source is exhausted
+END_OF_STREAM = object()
+
+
+class BoundedQueue:
+    def __init__(self, maxsize, drop_oldest=False):
+        self._q = queue.Queue(maxsize=max(1, int(maxsize)))
+        self.drop_oldest = drop_oldest
+        self.dropped = 0
+
+    def put(self, item):
+        if not self.drop_oldest:
+            self._q.put(item)
+            return
+        # Live sources: never block the producer, evict the stalest item instead
+        while True:
+            try:
+                self._q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._q.get_nowait()
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self):
+        return self._q.get()
+
+    def qsize(self):
+        return self._q.qsize()
+
+
+class Stage(threading.Thread):
+    def __init__(self, name, fn, inbox, outbox, on_error):
+        super().__init__(name=f"stage-{name}", daemon=True)
+        self.stage_name = name
+        self.fn = fn
+        self.inbox = inbox
+        self.outbox = outbox
+        self.on_error = on_error
+
+    def run(self):
+        failed = False
+        while True:
+            item = self.inbox.get()
+            if item is END_OF_STREAM:
+                break
+            if failed:
+                # Keep draining so upstream producers never block on us
+                continue
+            try:
+                result = self.fn(item)
+            except Exception as e:
+                self.on_error(self.stage_name, e)
+                failed = True
+                continue
+            if result is not None:
+                self.outbox.put(result)
+        self.outbox.put(END_OF_STREAM)
+
+
+class StagedPipeline:
+    """
+    Runs source -> stages -> sink with one thread per stage and a bounded
+    queue in front of every stage, so throughput is set by the slowest stage.
+    The sink runs on the calling thread (VideoWriter, GUI, ...).
+
+    stages: list of (name, fn); fn returns the item for the next stage or None to skip it.
+    queue_depths: {stage_name or "sink": depth}
+    drop_oldest: evict stale items from the first queue and the sink queue
+    instead of blocking (live sources). Intermediate queues always block so
+    detector output is never thrown away.
+    """
+
+    def __init__(self, source, stages, sink, queue_depths=None, default_depth=4, drop_oldest=False):
+        self.source = source
+        self.stages = stages
+        self.sink = sink
+        queue_depths = queue_depths or {}
+        names = [name for name, _ in stages] + ["sink"]
+        self.queues = {}
+        for i, name in enumerate(names):
+            drop = drop_oldest and (i == 0 or name == "sink")
+            self.queues[name] = BoundedQueue(queue_depths.get(name, default_depth), drop_oldest=drop)
+        self._stop = threading.Event()
+        self._errors = []
+
+    def _on_error(self, name, exc):
+        self._errors.append((name, exc))
+        self._stop.set()
+
+    def _produce(self, first_queue):
+        try:
+            while not self._stop.is_set():
+                item = self.source()
+                if item is None:
+                    break
+                first_queue.put(item)
+        except Exception as e:
+            self._on_error("source", e)
+        finally:
+            first_queue.put(END_OF_STREAM)
+
+    def stop(self):
+        self._stop.set()
+
+    def dropped(self):
+        return {name: q.dropped for name, q in self.queues.items()}
+
+    def depths(self):
+        return {name: q.qsize() for name, q in self.queues.items()}
+
+    def run(self):
+        names = list(self.queues)
+        threads = []
+        for i, (name, fn) in enumerate(self.stages):
+            threads.append(Stage(name, fn, self.queues[name], self.queues[names[i + 1]], self._on_error))
+        producer = threading.Thread(target=self._produce, args=(self.queues[names[0]],), name="stage-source", daemon=True)
+        for t in threads:
+            t.start()
+        producer.start()
+
+        sink_queue = self.queues["sink"]
+        while True:
+            item = sink_queue.get()
+            if item is END_OF_STREAM:
+                break
+            if self._stop.is_set():
+                continue
+            try:
+                self.sink(item)
+            except Exception as e:
+                self._on_error("sink", e)
+
+        producer.join()
+        for t in threads:
+            t.join()
+        if self._errors:
+            name, exc = self._errors[0]
+            raise RuntimeError(f"Pipeline stage '{name}' failed: {exc}") from exc
+
+# Example usage:
+# pipe = StagedPipeline(read_frame, [("infer", detect), ("track", track)], render,
+#                       queue_depths={"infer": 4, "track": 4, "sink": 8}, drop_oldest=True)
+# pipe.run()
@@ -0,0 +1,107 @@
+import multiprocessing as mp
+import os
+import queue
+import time
+
+
+def shard_cameras(cameras, n_workers):
+    # Pin cameras to workers round-robin by config order, so a camera always lands on the same worker
+    n_workers = max(1, min(int(n_workers) or (os.cpu_count() or 1), len(cameras)))
+    return [cameras[i::n_workers] for i in range(n_workers)]
+
+
+class QueueMetricsSink:
+    # Worker-side stand-in for MetricsStore: rows go to the supervisor's single writer
+    def __init__(self, q):
+        self.q = q
+
+    def append(self, row):
+        self.q.put(row)
+
+    def close(self):
+        pass
+
+
+class WorkerSupervisor:
+    """
+    Runs target(worker_idx, cameras, metrics_queue) in one process per shard
+    and writes every row the workers put on metrics_queue to metrics_sink.
+    Workers that exit with a non-zero code are restarted on the same shard
+    (up to max_restarts each, with a growing backoff); a clean exit means the
+    shard's sources are finished. on_worker_exit(pid) is called for every
+    exited worker process.
+    """
+
+    def __init__(self, target, shards, metrics_sink=None, max_restarts=5, restart_backoff_s=2.0, poll_s=0.5,
+                 on_worker_exit=None):
+        self.target = target
+        self.shards = shards
+        self.metrics_sink = metrics_sink
+        self.max_restarts = max_restarts
+        self.restart_backoff_s = restart_backoff_s
+        self.poll_s = poll_s
+        self.on_worker_exit = on_worker_exit
+        self.metrics_queue = mp.Queue()
+        self.procs = {}
+        self.restarts = {i: 0 for i in range(len(shards))}
+        self._restart_at = {}
+
+    def _start(self, idx):
+        p = mp.Process(target=self.target, args=(idx, self.shards[idx], self.metrics_queue),
+                       name=f"camera-worker-{idx}", daemon=False)
+        p.start()
+        self.procs[idx] = p
+
+    def _drain(self, timeout):
+        deadline = time.time() + timeout
+        while True:
+            remaining = deadline - time.time()
+            try:
+                row = self.metrics_queue.get(timeout=max(0.0, remaining)) if remaining > 0 else self.metrics_queue.get_nowait()
+            except queue.Empty:
+                return
+            if self.metrics_sink is not None:
+                self.metrics_sink.append(row)
+
+    def _check(self):
+        for idx, p in list(self.procs.items()):
+            if p.is_alive():
+                continue
+            p.join()
+            del self.procs[idx]
+            if self.on_worker_exit is not None:
+                self.on_worker_exit(p.pid)
+            cams = [c["id"] for c in self.shards[idx]]
+            if p.exitcode == 0:
+                print(f"[SUPERVISOR] Worker {idx} (cams {cams}) finished")
+            elif self.restarts[idx] < self.max_restarts:
+                self.restarts[idx] += 1
+                delay = self.restart_backoff_s * self.restarts[idx]
+                print(f"[SUPERVISOR] Worker {idx} (cams {cams}) exited with {p.exitcode}, restarting in {delay:.0f}s")
+                self._restart_at[idx] = time.time() + delay
+            else:
+                print(f"[SUPERVISOR] Worker {idx} (cams {cams}) crashed {self.restarts[idx]} times, giving up")
+        for idx, at in list(self._restart_at.items()):
+            if time.time() >= at:
+                del self._restart_at[idx]
+                self._start(idx)
+
+    def run(self):
+        for idx in range(len(self.shards)):
+            self._start(idx)
+        try:
+            while self.procs or self._restart_at:
+                self._drain(self.poll_s)
+                self._check()
+        finally:
+            for p in self.procs.values():
+                p.terminate()
+                p.join()
+                if self.on_worker_exit is not None:
+                    self.on_worker_exit(p.pid)
+            # Rows flushed by workers right before exiting
+            self._drain(0.5)
+
+# Example usage:
+# sup = WorkerSupervisor(camera_worker, shard_cameras(cfg["video_sources"], 4), metrics_sink=store)
+# sup.run()
@@ -22,4 +22,5 @@ class CrowdSimulator:
 # Example usage:
 # agents = [Agent((0,0), (10,10)) for _ in range(100)]
 # sim = CrowdSimulator(agents)
-# for _ in range(100): sim.step() 
\ No newline at end of file
+# for _ in range(100): sim.step()
+# For large crowds with interactions see simulation/social_force.py (SocialForceSimulator)
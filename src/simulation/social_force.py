@@ -0,0 +1,337 @@
+import multiprocessing as mp
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Helbing-Molnar social force parameters (SI units: m, s, kg-normalized forces)
+DEFAULT_PARAMS = {
+    "tau": 0.5,          # relaxation time towards the desired velocity
+    "A": 2.0,            # agent repulsion strength (m/s^2)
+    "B": 0.3,            # agent repulsion range (m)
+    "lambda_": 0.35,     # anisotropy: weight of agents behind
+    "A_wall": 5.0,       # wall repulsion strength
+    "B_wall": 0.2,       # wall repulsion range
+    "k": 120.0,          # body compression when overlapping (1/s^2)
+    "cutoff": 1.5,       # interaction radius, also the spatial hash cell size (m)
+    "max_speed_factor": 1.3,
+    "goal_radius": 0.5,  # an agent within this of its goal has arrived
+}
+# Upper bound on candidate pairs evaluated at once, keeps memory flat at 100k agents
+MAX_PAIRS = 4_000_000
+
+
+def build_grid(pos, cell):
+    # Uniform-grid spatial hash: agents sorted by cell, with dense per-cell [start, end)
+    # offsets into that sorted order
+    origin = pos.min(axis=0)
+    cxy = ((pos - origin) / cell).astype(np.int64)
+    gw, gh = int(cxy[:, 0].max()) + 1, int(cxy[:, 1].max()) + 1
+    keys = cxy[:, 1] * gw + cxy[:, 0]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    cells = np.arange(gw * gh)
+    start = np.searchsorted(sorted_keys, cells)
+    end = np.searchsorted(sorted_keys, cells, side="right")
+    return {"cxy": cxy[order], "gw": gw, "gh": gh, "order": order, "start": start, "end": end}
+
+
+def neighbour_pairs(grid, targets):
+    # targets: positions in the cell-sorted order -> (i, j) sorted-order pairs with j in
+    # the 3x3 cells around i, j != i. Sorted order keeps the later gathers cache friendly.
+    cxy, gw, gh = grid["cxy"][targets], grid["gw"], grid["gh"]
+    out_i, out_j = [], []
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            nx, ny = cxy[:, 0] + dx, cxy[:, 1] + dy
+            ok = (nx >= 0) & (nx < gw) & (ny >= 0) & (ny < gh)
+            key = np.where(ok, ny * gw + nx, 0)
+            s = grid["start"][key]
+            counts = np.where(ok, grid["end"][key] - s, 0)
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            i = np.repeat(targets, counts)
+            j = np.repeat(s - (np.cumsum(counts) - counts), counts) + np.arange(total)
+            keep = i != j
+            out_i.append(i[keep])
+            out_j.append(j[keep])
+    if not out_i:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(out_i), np.concatenate(out_j)
+
+
+def wall_forces(pos, radius, walls, p):
+    # pos: [N,2], walls: [W,4] segments (x1,y1,x2,y2) -> [N,2]
+    f = np.zeros_like(pos)
+    if walls is None or len(walls) == 0:
+        return f
+    # Only agents inside a wall's bounding box grown by the cutoff can feel it
+    c = p["cutoff"]
+    lo = np.minimum(walls[:, :2], walls[:, 2:]) - c
+    hi = np.maximum(walls[:, :2], walls[:, 2:]) + c
+    near = np.zeros(len(pos), dtype=bool)
+    for k in range(len(walls)):
+        near |= ((pos[:, 0] >= lo[k, 0]) & (pos[:, 0] <= hi[k, 0])
+                 & (pos[:, 1] >= lo[k, 1]) & (pos[:, 1] <= hi[k, 1]))
+    idx = np.nonzero(near)[0]
+    a, b = walls[:, :2], walls[:, 2:]
+    ab = b - a
+    ab_len2 = np.maximum((ab * ab).sum(1), 1e-12)
+    # Chunk agents so the [n,W,2] temporaries stay small
+    step = max(1, MAX_PAIRS // max(len(walls), 1))
+    for s in range(0, len(idx), step):
+        rows = idx[s:s + step]
+        q = pos[rows, None, :]
+        t = np.clip(((q - a) * ab).sum(-1) / ab_len2, 0.0, 1.0)
+        d = q - (a + t[..., None] * ab)
+        dist = np.sqrt((d * d).sum(-1))
+        dist_c = np.maximum(dist, 1e-6)
+        n = d / dist_c[..., None]
+        r = radius[rows, None]
+        mag = p["A_wall"] * np.exp((r - dist_c) / p["B_wall"]) + p["k"] * np.maximum(r - dist_c, 0)
+        mag = np.where(dist < c, mag, 0.0)
+        f[rows] = (mag[..., None] * n).sum(1)
+    return f
+
+
+def accelerations(pos, vel, goal, v0, radius, walls, p, targets=None):
+    """
+    Social-force acceleration of agents `targets` (default all), with
+    neighbours searched in the uniform-grid hash over every agent in pos.
+    """
+    n = len(pos)
+    targets = np.arange(n) if targets is None else np.asarray(targets, dtype=np.int64)
+    tpos, tvel = pos[targets], vel[targets]
+
+    # Driving force towards the goal at the desired speed
+    e = goal[targets] - tpos
+    dist_goal = np.sqrt(e[:, 0] ** 2 + e[:, 1] ** 2)
+    e = e / np.maximum(dist_goal, 1e-6)[:, None]
+    acc = (v0[targets, None] * e - tvel) / p["tau"]
+    acc[dist_goal < p["goal_radius"]] = 0.0
+
+    # Agent-agent repulsion over hashed neighbour pairs, in cell-sorted order
+    grid = build_grid(pos, p["cutoff"])
+    order = grid["order"]
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n)
+    xs, ys, rs = pos[order, 0], pos[order, 1], radius[order]
+    t_sorted = rank[targets]
+    local = np.full(n, -1, dtype=np.int64)
+    local[t_sorted] = np.arange(len(targets))
+    ex, ey = np.zeros(n, dtype=e.dtype), np.zeros(n, dtype=e.dtype)
+    ex[t_sorted], ey[t_sorted] = e[:, 0], e[:, 1]
+    m = len(targets)
+    cut2 = p["cutoff"] ** 2
+    chunk = max(1, MAX_PAIRS // 32)
+    for s in range(0, m, chunk):
+        i, j = neighbour_pairs(grid, np.sort(t_sorted[s:s + chunk]))
+        dx, dy = xs[i] - xs[j], ys[i] - ys[j]
+        d2 = dx * dx + dy * dy
+        close = (d2 < cut2) & (d2 > 1e-12)
+        i, j, dx, dy = i[close], j[close], dx[close], dy[close]
+        dist = np.sqrt(d2[close])
+        nx, ny = dx / dist, dy / dist
+        r = rs[i] + rs[j]
+        mag = p["A"] * np.exp((r - dist) / p["B"]) + p["k"] * np.maximum(r - dist, 0)
+        # Anisotropy: agents in front matter more than agents behind
+        cos_phi = -(nx * ex[i] + ny * ey[i])
+        mag *= p["lambda_"] + (1 - p["lambda_"]) * (1 + cos_phi) / 2
+        li = local[i]
+        acc[:, 0] += np.bincount(li, weights=mag * nx, minlength=m)
+        acc[:, 1] += np.bincount(li, weights=mag * ny, minlength=m)
+
+    acc += wall_forces(tpos, radius[targets], walls, p)
+    return acc
+
+
+# Agent arrays shared with the strip workers: (name, columns); each is float32 [N, columns]
+SHARED_FIELDS = (("pos", 2), ("vel", 2), ("goal", 2), ("v0", 1), ("radius", 1), ("new_pos", 2), ("new_vel", 2))
+
+
+class SharedAgents:
+    # Agent arrays in shared memory blocks, attached by name; the parent creates, workers attach
+    def __init__(self, n, names=None):
+        self.n = n
+        self.blocks, self.arrays = {}, {}
+        for field, cols in SHARED_FIELDS:
+            size = max(1, n * cols * 4)
+            if names is None:
+                block = shared_memory.SharedMemory(create=True, size=size)
+            else:
+                block = shared_memory.SharedMemory(name=names[field])
+            self.blocks[field] = block
+            shape = (n, cols) if cols > 1 else (n,)
+            self.arrays[field] = np.ndarray(shape, dtype=np.float32, buffer=block.buf)
+
+    def names(self):
+        return {field: block.name for field, block in self.blocks.items()}
+
+    def close(self, unlink=False):
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            if unlink:
+                block.unlink()
+        self.blocks = {}
+
+
+_attached = {}  # worker process: blocks of the current agent set, keyed by the pos block name
+
+
+def _step_strip(args):
+    # Worker: steps the agents with lo <= x < hi, reading neighbours within the cutoff
+    # halo, and writes their new pos / vel into the shared output arrays
+    names, n, lo, hi, walls, p, dt = args
+    agents = _attached.get(names["pos"])
+    if agents is None:
+        for old in _attached.values():
+            old.close()
+        _attached.clear()
+        agents = _attached[names["pos"]] = SharedAgents(n, names)
+    a = agents.arrays
+    x = a["pos"][:, 0]
+    cutoff = p["cutoff"]
+    region = np.nonzero((x >= lo - cutoff) & (x < hi + cutoff))[0]
+    owned = region[(x[region] >= lo) & (x[region] < hi)]
+    local_owned = np.searchsorted(region, owned)
+    pos, vel, v0 = a["pos"][region], a["vel"][region], a["v0"][region]
+    acc = accelerations(pos, vel, a["goal"][region], v0, a["radius"][region], walls, p, local_owned)
+    a["new_pos"][owned], a["new_vel"][owned] = integrate(pos[local_owned], vel[local_owned], acc,
+                                                          v0[local_owned], p, dt)
+    return len(owned)
+
+
+def integrate(pos, vel, acc, v0, p, dt):
+    vel = vel + acc * dt
+    speed = np.sqrt((vel * vel).sum(1))
+    vmax = p["max_speed_factor"] * v0
+    over = speed > vmax
+    vel[over] *= (vmax[over] / speed[over])[:, None]
+    return pos + vel * dt, vel
+
+
+class SocialForceSimulator:
+    """
+    Vectorized social-force crowd simulator. Agent state lives in NumPy arrays
+    (pos, vel, goal, desired speed v0, radius); each step computes driving,
+    agent-agent and agent-wall forces, with neighbours found through a
+    uniform-grid spatial hash (cell = interaction cutoff), so a step costs
+    O(N * neighbours) instead of O(N^2).
+
+    With processes > 1 the domain is cut into vertical strips and each strip
+    (plus a cutoff-wide halo of neighbouring agents) is stepped in its own
+    process of a persistent spawn pool. Agent arrays are exchanged through
+    shared memory, so a step only sends the strip bounds. Off by default:
+    each step still costs two array copies and a pool round trip, so it only
+    pays with several free cores and tens of thousands of agents; benchmark
+    processes=1 against N on the target machine before enabling it.
+    """
+
+    def __init__(self, pos, goal, v0=1.34, radius=0.25, walls=None, params=None, processes=1, seed=0):
+        rng = np.random.default_rng(seed)
+        self.pos = np.asarray(pos, dtype=np.float32).reshape(-1, 2).copy()
+        n = len(self.pos)
+        self.goal = np.broadcast_to(np.asarray(goal, dtype=np.float32), (n, 2)).copy()
+        self.vel = np.zeros((n, 2), dtype=np.float32)
+        self.v0 = (np.full(n, v0, dtype=np.float32) if np.isscalar(v0) else np.asarray(v0, dtype=np.float32))
+        self.radius = (np.full(n, radius, dtype=np.float32) if np.isscalar(radius)
+                       else np.asarray(radius, dtype=np.float32))
+        # Tiny jitter so agents spawned on the same point separate
+        self.pos += rng.normal(0, 1e-3, self.pos.shape).astype(np.float32)
+        self.ids = np.arange(n, dtype=np.int64)
+        self.walls = None if walls is None else np.asarray(walls, dtype=np.float32).reshape(-1, 4)
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        self.processes = max(1, int(processes))
+        self.t = 0.0
+        self._pool = None
+        self._shared = None
+
+    def __len__(self):
+        return len(self.pos)
+
+    def arrived(self):
+        d = self.goal - self.pos
+        return (d * d).sum(1) < self.params["goal_radius"] ** 2
+
+    def step(self, dt=0.1):
+        if len(self.pos) == 0:
+            return
+        if self.processes > 1 and len(self.pos) >= 2 * self.processes:
+            self._step_parallel(dt)
+        else:
+            acc = accelerations(self.pos, self.vel, self.goal, self.v0, self.radius, self.walls, self.params)
+            self.pos, self.vel = integrate(self.pos, self.vel, acc, self.v0, self.params, dt)
+        self.pos = self.pos.astype(np.float32, copy=False)
+        self.vel = self.vel.astype(np.float32, copy=False)
+        self.t += dt
+
+    def _step_parallel(self, dt):
+        if self._pool is None:
+            # spawn: fork is unavailable on Windows and unsafe with threads (macOS, the API)
+            self._pool = mp.get_context("spawn").Pool(self.processes)
+        n = len(self.pos)
+        if self._shared is None or self._shared.n != n:
+            if self._shared is not None:
+                self._shared.close(unlink=True)
+            self._shared = SharedAgents(n)
+        a = self._shared.arrays
+        for field in ("pos", "vel", "goal", "v0", "radius"):
+            a[field][:] = getattr(self, field)
+        # Equal-count strips so every process gets the same load
+        edges = np.quantile(self.pos[:, 0], np.linspace(0, 1, self.processes + 1))
+        edges[0], edges[-1] = -np.inf, np.inf
+        names = self._shared.names()
+        self._pool.map(_step_strip, [(names, n, edges[k], edges[k + 1], self.walls, self.params, dt)
+                                     for k in range(self.processes)])
+        self.pos, self.vel = a["new_pos"].copy(), a["new_vel"].copy()
+
+    def remove_arrived(self):
+        keep = ~self.arrived()
+        for name in ("pos", "vel", "goal", "v0", "radius", "ids"):
+            setattr(self, name, getattr(self, name)[keep])
+        return int((~keep).sum())
+
+    def snapshot(self, calibrator=None):
+        # {id: (x, y)} like the trackers' update(); image pixels through a HomographyCalibrator
+        xy = self.pos if calibrator is None else calibrator.world_to_image(self.pos)
+        return dict(zip(self.ids.tolist(), map(tuple, xy.tolist())))
+
+    def boxes(self, calibrator=None, size=(0.5, 1.7)):
+        # Detector-style [N,4] xyxy boxes standing on each agent's position, for trace replay
+        w, h = size
+        feet = self.pos if calibrator is None else calibrator.world_to_image(self.pos)
+        if calibrator is None:
+            return np.concatenate([feet - [w / 2, h], feet + [w / 2, 0]], axis=1).astype(np.float32)
+        # Scale a person's size by the local pixels-per-metre at their feet
+        side = calibrator.world_to_image(self.pos + np.array([w, 0], dtype=np.float32))
+        px_w = np.sqrt(((side - feet) ** 2).sum(1))
+        px_h = px_w * (h / w)
+        return np.stack([feet[:, 0] - px_w / 2, feet[:, 1] - px_h, feet[:, 0] + px_w / 2, feet[:, 1]],
+                        axis=1).astype(np.float32)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+        if self._shared is not None:
+            self._shared.close(unlink=True)
+            self._shared = None
+
+
+def random_crowd(n, size=(200.0, 200.0), seed=0, **kwargs):
+    # n agents spread over a size[0] x size[1] m area heading to random goals, walled in
+    rng = np.random.default_rng(seed)
+    w, h = size
+    pos = rng.uniform([0, 0], [w, h], (n, 2))
+    goal = rng.uniform([0, 0], [w, h], (n, 2))
+    walls = [(0, 0, w, 0), (w, 0, w, h), (w, h, 0, h), (0, h, 0, 0)]
+    return SocialForceSimulator(pos, goal, v0=rng.normal(1.34, 0.26, n).clip(0.5, 2.0),
+                                walls=walls, seed=seed, **kwargs)
+
+# Example usage:
+# sim = random_crowd(50000, size=(300, 300))   # processes=4 only after benchmarking it (see class docstring)
+# for _ in range(100): sim.step(dt=0.1)
+# tracks = sim.snapshot()  # {id: (x, y)}, same shape as tracker output
+# sim.close()
@@ -0,0 +1,314 @@
+import io
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pandas as pd
+
+# Metrics store: one SQLite (WAL) file per UTC day, indexed on (camera, ts) and ts,
+# plus a catalog with the partition time ranges and the latest row per camera.
+#   <root>/catalog.db
+#   <root>/metrics_YYYYMMDD.db
+VALUE_COLUMNS = ("in", "out", "active", "net")
+COLUMNS = ("timestamp", "camera") + VALUE_COLUMNS
+_QUOTED = ", ".join(f'"{c}"' for c in VALUE_COLUMNS)
+
+
+def _to_epoch(ts):
+    if isinstance(ts, (int, float)):
+        return float(ts)
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return ts.timestamp()
+
+
+def _partition_name(epoch):
+    return "metrics_" + datetime.fromtimestamp(epoch, tz=timezone.utc).strftime("%Y%m%d")
+
+
+def _connect(path, readonly=False):
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(str(path), check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def _row_dict(ts, camera, values):
+    row = {"timestamp": datetime.fromtimestamp(ts, tz=timezone.utc).isoformat(), "camera": camera}
+    row.update(zip(VALUE_COLUMNS, values))
+    return row
+
+
+class MetricsStore:
+    """
+    Append-optimized metrics store. append() only buffers; rows are written
+    in one transaction per partition when flush_rows are pending or
+    flush_interval_s has passed. latest() is a primary-key lookup and
+    query() only opens the day partitions overlapping the requested range.
+    """
+
+    def __init__(self, root="data/outputs/metrics_db", flush_rows=64, flush_interval_s=5.0, readonly=False):
+        self.root = Path(root)
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval_s = flush_interval_s
+        self.readonly = readonly
+        self._lock = threading.RLock()
+        self._pending = []
+        self._last_flush = time.time()
+        self._conns = {}
+        if not readonly:
+            self.root.mkdir(parents=True, exist_ok=True)
+            self._catalog = _connect(self.root / "catalog.db")
+            self._catalog.executescript(f"""
+                CREATE TABLE IF NOT EXISTS partitions (
+                    name TEXT PRIMARY KEY, start_ts REAL, end_ts REAL, rows INTEGER);
+                CREATE TABLE IF NOT EXISTS latest (
+                    camera PRIMARY KEY, ts REAL, {", ".join(f'"{c}" INTEGER' for c in VALUE_COLUMNS)});
+            """)
+            self._catalog.commit()
+
+    # --- writing ---
+
+    def append(self, row):
+        # row: {"timestamp", "camera", "in", "out", "active", "net"} as logged by main.py
+        rec = (_to_epoch(row["timestamp"]), row["camera"]) + tuple(int(row[c]) for c in VALUE_COLUMNS)
+        with self._lock:
+            self._pending.append(rec)
+            due = len(self._pending) >= self.flush_rows or time.time() - self._last_flush >= self.flush_interval_s
+        if due:
+            self.flush()
+
+    def append_many(self, records):
+        # records: iterable of (epoch_ts, camera, in, out, active, net)
+        with self._lock:
+            self._pending.extend(records)
+        self.flush()
+
+    def _partition(self, name):
+        conn = self._conns.get(name)
+        if conn is None:
+            conn = _connect(self.root / f"{name}.db")
+            conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS metrics (ts REAL NOT NULL, camera NOT NULL,
+                    {", ".join(f'"{c}" INTEGER' for c in VALUE_COLUMNS)});
+                CREATE INDEX IF NOT EXISTS idx_camera_ts ON metrics (camera, ts);
+                CREATE INDEX IF NOT EXISTS idx_ts ON metrics (ts);
+            """)
+            self._conns[name] = conn
+        return conn
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._last_flush = time.time()
+            if not pending:
+                return 0
+            by_partition = {}
+            for rec in pending:
+                by_partition.setdefault(_partition_name(rec[0]), []).append(rec)
+            for name, recs in by_partition.items():
+                conn = self._partition(name)
+                with conn:
+                    conn.executemany(f"INSERT INTO metrics (ts, camera, {_QUOTED}) VALUES (?, ?, ?, ?, ?, ?)", recs)
+                start = min(r[0] for r in recs)
+                end = max(r[0] for r in recs)
+                self._catalog.execute(
+                    "INSERT INTO partitions (name, start_ts, end_ts, rows) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET start_ts = min(start_ts, excluded.start_ts), "
+                    "end_ts = max(end_ts, excluded.end_ts), rows = rows + excluded.rows",
+                    (name, start, end, len(recs)))
+            newest = {}
+            for rec in pending:
+                if rec[1] not in newest or rec[0] >= newest[rec[1]][0]:
+                    newest[rec[1]] = rec
+            self._catalog.executemany(
+                f"INSERT INTO latest (camera, ts, {_QUOTED}) VALUES (?, ?, ?, ?, ?, ?) "
+                f"ON CONFLICT(camera) DO UPDATE SET ts = excluded.ts, "
+                + ", ".join(f'"{c}" = excluded."{c}"' for c in VALUE_COLUMNS)
+                + " WHERE excluded.ts >= latest.ts",
+                [(r[1], r[0]) + r[2:] for r in newest.values()])
+            self._catalog.commit()
+            return len(pending)
+
+    def close(self):
+        if not self.readonly:
+            self.flush()
+            self._catalog.close()
+        for conn in self._conns.values():
+            conn.close()
+        self._conns = {}
+
+    # --- reading ---
+
+    def _read_catalog(self):
+        path = self.root / "catalog.db"
+        if not path.exists():
+            return None
+        if not self.readonly:
+            return self._catalog
+        return _connect(path, readonly=True)
+
+    def latest(self, camera=None):
+        # -> row dict for one camera, or {camera: row dict} for all; None / {} when empty
+        catalog = self._read_catalog()
+        if catalog is None:
+            return None if camera is not None else {}
+        with self._lock:
+            if camera is not None:
+                recs = catalog.execute(f"SELECT camera, ts, {_QUOTED} FROM latest WHERE camera = ?", (camera,)).fetchall()
+            else:
+                recs = catalog.execute(f"SELECT camera, ts, {_QUOTED} FROM latest").fetchall()
+            if catalog is not getattr(self, "_catalog", None):
+                catalog.close()
+        rows = {r[0]: _row_dict(r[1], r[0], r[2:]) for r in recs}
+        if camera is not None:
+            return rows.get(camera)
+        return rows
+
+    def latest_overall(self):
+        rows = self.latest()
+        if not rows:
+            return None
+        return max(rows.values(), key=lambda r: r["timestamp"])
+
+    def partitions(self, start=None, end=None):
+        catalog = self._read_catalog()
+        if catalog is None:
+            return []
+        with self._lock:
+            sql, args = "SELECT name FROM partitions WHERE 1=1", []
+            if start is not None:
+                sql += " AND end_ts >= ?"
+                args.append(_to_epoch(start))
+            if end is not None:
+                sql += " AND start_ts <= ?"
+                args.append(_to_epoch(end))
+            names = [r[0] for r in catalog.execute(sql + " ORDER BY name", args)]
+            if catalog is not getattr(self, "_catalog", None):
+                catalog.close()
+        return names
+
+    def query(self, start=None, end=None, cameras=None):
+        # -> DataFrame with the metrics.csv columns, sorted by timestamp
+        if not self.readonly:
+            self.flush()
+        sql = f"SELECT ts, camera, {_QUOTED} FROM metrics WHERE 1=1"
+        args = []
+        if start is not None:
+            sql += " AND ts >= ?"
+            args.append(_to_epoch(start))
+        if end is not None:
+            sql += " AND ts <= ?"
+            args.append(_to_epoch(end))
+        if cameras is not None:
+            cameras = list(cameras)
+            sql += f" AND camera IN ({', '.join('?' * len(cameras))})"
+            args.extend(cameras)
+        frames = []
+        for name in self.partitions(start, end):
+            path = self.root / f"{name}.db"
+            if not path.exists():
+                continue
+            conn = self._conns.get(name) or _connect(path, readonly=True)
+            try:
+                frames.append(pd.DataFrame(conn.execute(sql, args).fetchall(), columns=("ts",) + COLUMNS[1:]))
+            finally:
+                if conn is not self._conns.get(name):
+                    conn.close()
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return pd.DataFrame(columns=COLUMNS)
+        df = pd.concat(frames, ignore_index=True).sort_values("ts", kind="stable")
+        df.insert(0, "timestamp", pd.to_datetime(df.pop("ts"), unit="s", utc=True))
+        return df.reset_index(drop=True)
+
+
+def exists(root="data/outputs/metrics_db"):
+    return os.path.exists(os.path.join(root, "catalog.db"))
+
+
+def import_csv(csv_path, store, chunksize=50000):
+    # Bulk-load an existing metrics.csv into store; returns the number of rows imported
+    total = 0
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        ts = pd.to_datetime(chunk["timestamp"], utc=True, format="mixed")
+        epoch = (ts - pd.Timestamp("1970-01-01", tz="UTC")) / pd.Timedelta(seconds=1)
+        records = zip(epoch.tolist(), chunk["camera"].tolist(),
+                      *(chunk[c].astype(int).tolist() for c in VALUE_COLUMNS))
+        store.append_many(records)
+        total += len(chunk)
+    return total
+
+
+class CsvTail:
+    """
+    Incremental metrics.csv reader: remembers the byte offset of the last
+    complete line and parses only what was appended since. A truncated or
+    replaced file (smaller, or a new inode) is read again from the start.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self.inode = None
+        self.header = None
+        self.df = pd.DataFrame()
+
+    def read_new(self):
+        # -> number of new rows
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return 0
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            self.inode, self.offset, self.header, self.df = st.st_ino, 0, None, pd.DataFrame()
+        if st.st_size == self.offset:
+            return 0
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(st.st_size - self.offset)
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            return 0  # a partly written first line
+        self.offset += end
+        data = data[:end]
+        if self.header is None:
+            cut = data.index(b"\n") + 1
+            self.header, data = data[:cut], data[cut:]
+        if not data:
+            return 0
+        new = pd.read_csv(io.BytesIO(self.header + data))
+        new["timestamp"] = pd.to_datetime(new["timestamp"], utc=True, format="mixed")
+        self.df = pd.concat([self.df, new], ignore_index=True) if not self.df.empty else new
+        return len(new)
+
+
+def load_metrics(root="data/outputs/metrics_db", csv_path="data/outputs/metrics.csv", start=None, end=None, cameras=None):
+    # Metrics history from the store, falling back to a legacy CSV
+    if exists(root):
+        return MetricsStore(root, readonly=True).query(start, end, cameras)
+    df = pd.read_csv(csv_path, parse_dates=["timestamp"])
+    return df
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Import a metrics CSV into the metrics store")
+    parser.add_argument("csv_path", nargs="?", default="data/outputs/metrics.csv")
+    parser.add_argument("--root", default="data/outputs/metrics_db")
+    args = parser.parse_args()
+    store = MetricsStore(args.root)
+    n = import_csv(args.csv_path, store)
+    store.close()
+    print(f"Imported {n} rows into {args.root}")
+
+# Example usage:
+# store = MetricsStore("data/outputs/metrics_db")
+# store.append({"timestamp": pd.Timestamp.utcnow(), "camera": 1, "in": 3, "out": 1, "active": 12, "net": 2})
+# store.latest(1); store.query(start="2024-01-01", cameras=[1])
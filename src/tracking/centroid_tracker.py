@@ -61,4 +61,11 @@ class CentroidTracker:
                 self.disappeared[self.next_id] = 0
                 self.next_id += 1
 
-        return self.tracks 
\ No newline at end of file
+        return self.tracks
+
+    def predict_tracks(self):
+        # No motion model: keep the last known centroids on frames without detections
+        return self.tracks
+
+    def uncertainty(self):
+        return 0.0
@@ -1,98 +1,187 @@
 import numpy as np
-from filterpy.kalman import KalmanFilter
 from lap import lapjv
 
-class Track:
-    def __init__(self, bbox, track_id):
-        self.kf = KalmanFilter(dim_x=7, dim_z=4)
-        self.kf.x[:4] = bbox.reshape((4, 1))
-        self.time_since_update = 0
-        self.id = track_id
-        self.hits = 1
-        self.hit_streak = 1
-        self.age = 0
-        self.history = []
-
-    def update(self, bbox):
-        self.kf.update(bbox)
-        self.time_since_update = 0
-        self.hits += 1
-        self.hit_streak += 1
+# Constant-velocity box model shared by every track (SORT layout):
+# state x = [cx, cy, s, r, vcx, vcy, vs] with s = area, r = aspect ratio w/h
+DIM_X, DIM_Z = 7, 4
+F = np.eye(DIM_X)
+F[0, 4] = F[1, 5] = F[2, 6] = 1.0
+Q = np.eye(DIM_X)
+Q[-1, -1] *= 0.01
+Q[4:, 4:] *= 0.01
+R = np.eye(DIM_Z)
+R[2:, 2:] *= 10.0
+P0 = np.eye(DIM_X) * 10.0
+P0[4:, 4:] *= 1000.0  # unobserved velocities start very uncertain
+# ...except the centroid velocity: people move at most a few px per frame, and a burst of
+# fresh tracks must not inflate uncertainty() (which forces detection in AdaptiveCadence)
+P0[4, 4] = P0[5, 5] = 100.0
+
+
+def xyxy_to_z(boxes):
+    # boxes: [N,4] (x1,y1,x2,y2) -> [N,4] (cx,cy,s,r)
+    w = boxes[:, 2] - boxes[:, 0]
+    h = np.maximum(boxes[:, 3] - boxes[:, 1], 1e-6)
+    return np.stack([boxes[:, 0] + w / 2, boxes[:, 1] + h / 2, w * h, w / h], axis=1)
+
+
+def x_to_xyxy(x):
+    # x: [N,>=4] state -> [N,4] (x1,y1,x2,y2)
+    s = np.maximum(x[:, 2], 0)
+    w = np.sqrt(s * np.maximum(x[:, 3], 0))
+    h = np.divide(s, w, out=np.zeros_like(s), where=w > 0)
+    return np.stack([x[:, 0] - w / 2, x[:, 1] - h / 2, x[:, 0] + w / 2, x[:, 1] + h / 2], axis=1)
 
-    def predict(self):
-        self.kf.predict()
-        self.age += 1
-        if self.time_since_update > 0:
-            self.hit_streak = 0
-        self.time_since_update += 1
-        self.history.append(self.kf.x[:4])
-        return self.kf.x[:4]
 
-    def get_state(self):
-        return self.kf.x[:4]
+def iou_batch(boxes1, boxes2):
+    # boxes: [N,4], [M,4] (x1,y1,x2,y2) -> [N,M] IoU, fully broadcast
+    a = boxes1[:, None, :]
+    b = boxes2[None, :, :]
+    iw = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    ih = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = iw * ih
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area_a + area_b - inter
+    return np.divide(inter, union, out=np.zeros_like(inter), where=union > 0).astype(np.float32)
+
 
 class OCSort:
+    """
+    Structure-of-arrays tracker: every track's Kalman state and covariance
+    live in stacked arrays (x: [N,7], P: [N,7,7]) so predict, update and
+    association run as batched NumPy operations regardless of crowd size.
+    update() returns {id: (cx, cy)} like CentroidTracker.
+    """
+
     def __init__(self, max_age=30, min_hits=3, iou_threshold=0.3):
         self.max_age = max_age
         self.min_hits = min_hits
         self.iou_threshold = iou_threshold
-        self.tracks = []
         self.next_id = 0
+        self.x = np.zeros((0, DIM_X))
+        self.P = np.zeros((0, DIM_X, DIM_X))
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.time_since_update = np.zeros(0, dtype=np.int64)
+        self.hits = np.zeros(0, dtype=np.int64)
+        self.hit_streak = np.zeros(0, dtype=np.int64)
+        self.age = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def predict(self):
+        if len(self.ids) == 0:
+            return self.get_boxes()
+        # Keep the area non-negative
+        shrink = self.x[:, 2] + self.x[:, 6] <= 0
+        self.x[shrink, 6] = 0.0
+        self.x = self.x @ F.T
+        self.P = F @ self.P @ F.T + Q
+        self.age += 1
+        self.hit_streak[self.time_since_update > 0] = 0
+        self.time_since_update += 1
+        return self.get_boxes()
+
+    def _kf_update(self, idx, z):
+        # Batched Kalman update of rows idx with measurements z [M,4]
+        P = self.P[idx]
+        S = P[:, :DIM_Z, :DIM_Z] + R
+        # K = P H^T S^-1, with H selecting the first DIM_Z state entries
+        K = np.linalg.solve(S, P[:, :DIM_Z, :]).transpose(0, 2, 1)
+        y = z - self.x[idx, :DIM_Z]
+        self.x[idx] += (K @ y[:, :, None])[:, :, 0]
+        self.P[idx] = P - K @ P[:, :DIM_Z, :]
+        self.time_since_update[idx] = 0
+        self.hits[idx] += 1
+        self.hit_streak[idx] += 1
+
+    def _spawn(self, dets):
+        n = len(dets)
+        if n == 0:
+            return
+        x = np.zeros((n, DIM_X))
+        x[:, :DIM_Z] = xyxy_to_z(dets)
+        self.x = np.concatenate([self.x, x])
+        self.P = np.concatenate([self.P, np.broadcast_to(P0, (n, DIM_X, DIM_X))])
+        self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + n)])
+        self.next_id += n
+        self.time_since_update = np.concatenate([self.time_since_update, np.zeros(n, dtype=np.int64)])
+        self.hits = np.concatenate([self.hits, np.ones(n, dtype=np.int64)])
+        self.hit_streak = np.concatenate([self.hit_streak, np.ones(n, dtype=np.int64)])
+        self.age = np.concatenate([self.age, np.zeros(n, dtype=np.int64)])
+
+    def _keep(self, mask):
+        self.x = self.x[mask]
+        self.P = self.P[mask]
+        self.ids = self.ids[mask]
+        self.time_since_update = self.time_since_update[mask]
+        self.hits = self.hits[mask]
+        self.hit_streak = self.hit_streak[mask]
+        self.age = self.age[mask]
+
+    def associate(self, track_boxes, dets):
+        # -> (track_idx, det_idx) of matches above iou_threshold
+        if len(track_boxes) == 0 or len(dets) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        iou_matrix = self._iou_batch(track_boxes, dets)
+        _, x, _ = lapjv(-iou_matrix, extend_cost=True)
+        rows = np.nonzero(x >= 0)[0]
+        cols = x[rows]
+        ok = iou_matrix[rows, cols] > self.iou_threshold
+        return rows[ok], cols[ok]
 
     def update(self, detections):
+        dets = np.asarray(detections, dtype=np.float64).reshape(-1, 4)
+
         # Predict new locations for all tracks
-        for t in self.tracks:
-            t.predict()
-
-        # Associate detections to tracks
-        if len(self.tracks) == 0:
-            for d in detections:
-                self.tracks.append(Track(d, self.next_id))
-                self.next_id += 1
-            return {t.id: ((t.get_state()[0]+t.get_state()[2])/2, (t.get_state()[1]+t.get_state()[3])/2) for t in self.tracks}
-
-        track_states = np.array([t.get_state() for t in self.tracks])
-        if len(detections) == 0:
-            matches = np.empty((0,2), dtype=int)
-            unmatched_tracks = np.arange(len(self.tracks))
-            unmatched_detections = np.empty((0), dtype=int)
-        else:
-            iou_matrix = self._iou_batch(track_states, detections)
-            row_ind, col_ind, _ = lapjv(-iou_matrix, extend_cost=True)
-            matches = np.array([[r, c] for r, c in enumerate(col_ind) if c >= 0 and iou_matrix[r, c] > self.iou_threshold])
-            unmatched_tracks = np.setdiff1d(np.arange(len(self.tracks)), matches[:,0]) if matches.size else np.arange(len(self.tracks))
-            unmatched_detections = np.setdiff1d(np.arange(len(detections)), matches[:,1]) if matches.size else np.arange(len(detections))
-
-        # Update matched tracks
-        for t, d in matches:
-            self.tracks[t].update(detections[d])
+        track_boxes = self.predict()
+
+        # Associate detections to tracks and update matched tracks
+        t_idx, d_idx = self.associate(track_boxes, dets)
+        if len(t_idx):
+            self._kf_update(t_idx, xyxy_to_z(dets[d_idx]))
 
         # Create new tracks for unmatched detections
-        for d in unmatched_detections:
-            self.tracks.append(Track(detections[d], self.next_id))
-            self.next_id += 1
+        unmatched = np.ones(len(dets), dtype=bool)
+        unmatched[d_idx] = False
+        self._spawn(dets[unmatched])
 
         # Remove dead tracks
-        self.tracks = [t for t in self.tracks if t.time_since_update <= self.max_age]
+        self._keep(self.time_since_update <= self.max_age)
 
         # Return dict of id -> centroid
-        return {t.id: ((t.get_state()[0]+t.get_state()[2])/2, (t.get_state()[1]+t.get_state()[3])/2) for t in self.tracks if t.hits >= self.min_hits or t.time_since_update == 0}
+        return self.get_tracks()
+
+    def predict_tracks(self):
+        # Frame without detections: coast every track on its motion model
+        self.predict()
+        self._keep(self.time_since_update <= self.max_age)
+        return self.get_tracks()
+
+    def uncertainty(self):
+        # Median positional std (px) over live tracks, 0 with no tracks;
+        # the median keeps a few fresh, unconverged tracks from dominating
+        P = self.P
+        if len(P) == 0:
+            return 0.0
+        return float(np.median(np.sqrt(P[:, 0, 0] + P[:, 1, 1])))
+
+    def get_tracks(self):
+        visible = (self.hits >= self.min_hits) | (self.time_since_update == 0)
+        ids = self.ids[visible].tolist()
+        centroids = self.x[visible, :2].tolist()
+        return {oid: (cx, cy) for oid, (cx, cy) in zip(ids, centroids)}
+
+    def get_boxes(self):
+        # [N,4] (x1,y1,x2,y2) of every live track, aligned with self.ids
+        return x_to_xyxy(self.x)
 
     def _iou_batch(self, boxes1, boxes2):
         # boxes: [N,4] (x1,y1,x2,y2)
-        iou = np.zeros((len(boxes1), len(boxes2)), dtype=np.float32)
-        for i, a in enumerate(boxes1):
-            for j, b in enumerate(boxes2):
-                iou[i, j] = self._iou(a, b)
-        return iou
-
-    def _iou(self, a, b):
-        x1 = max(a[0], b[0])
-        y1 = max(a[1], b[1])
-        x2 = min(a[2], b[2])
-        y2 = min(a[3], b[3])
-        inter = max(0, x2-x1) * max(0, y2-y1)
-        area_a = (a[2]-a[0]) * (a[3]-a[1])
-        area_b = (b[2]-b[0]) * (b[3]-b[1])
-        union = area_a + area_b - inter
-        return inter / union if union > 0 else 0 
\ No newline at end of file
+        return iou_batch(np.asarray(boxes1, dtype=np.float64).reshape(-1, 4),
+                         np.asarray(boxes2, dtype=np.float64).reshape(-1, 4))
+
+# Example usage:
+# tracker = OCSort(max_age=30, min_hits=3)
+# tracks = tracker.update(boxes_xyxy)  # {id: (cx, cy)}
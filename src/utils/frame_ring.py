@@ -0,0 +1,150 @@
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+# Shared-memory ring of raw BGR frames, one segment per camera.
+# Layout: header int64[8] | heartbeat float64[1] | slot_seq int64[slots] | frames uint8[slots,h,w,c]
+# Each slot is guarded by a seqlock (odd = being written) so readers never see torn frames.
+MAGIC = 0x43524F57  # "CROW"
+_HEADER = 8
+_H_MAGIC, _H_SLOTS, _H_HEIGHT, _H_WIDTH, _H_CHANNELS, _H_WRITE_SEQ = range(6)
+
+
+def segment_name(cam_id):
+    return f"crowdflow_cam_{cam_id}"
+
+
+def _layout(slots, shape):
+    h, w, c = shape
+    header = _HEADER * 8
+    heartbeat = 8
+    seqs = slots * 8
+    return header, heartbeat, seqs, slots * h * w * c
+
+
+def _views(buf, slots, shape):
+    header, heartbeat, seqs, frames = _layout(slots, shape)
+    off = 0
+    hdr = np.ndarray((_HEADER,), dtype=np.int64, buffer=buf, offset=off)
+    off += header
+    hb = np.ndarray((1,), dtype=np.float64, buffer=buf, offset=off)
+    off += heartbeat
+    seq = np.ndarray((slots,), dtype=np.int64, buffer=buf, offset=off)
+    off += seqs
+    frm = np.ndarray((slots,) + tuple(shape), dtype=np.uint8, buffer=buf, offset=off)
+    return hdr, hb, seq, frm
+
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: stop the resource tracker from unlinking a segment we don't own
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class FrameRingWriter:
+    def __init__(self, cam_id, shape, slots=4, consumer_timeout_s=5.0):
+        self.name = segment_name(cam_id)
+        self.shape = tuple(int(v) for v in shape)
+        self.slots = max(2, int(slots))
+        self.consumer_timeout_s = consumer_timeout_s
+        size = sum(_layout(self.slots, self.shape))
+        try:
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        except FileExistsError:
+            # Left over from a previous run
+            stale = shared_memory.SharedMemory(name=self.name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=size)
+        self._hdr, self._hb, self._seq, self._frames = _views(self.shm.buf, self.slots, self.shape)
+        self._seq[:] = 0
+        self._hb[0] = 0.0
+        self._hdr[:] = 0
+        self._hdr[_H_SLOTS] = self.slots
+        self._hdr[_H_HEIGHT], self._hdr[_H_WIDTH], self._hdr[_H_CHANNELS] = self.shape
+        self._hdr[_H_MAGIC] = MAGIC
+
+    def has_consumer(self):
+        return time.time() - self._hb[0] <= self.consumer_timeout_s
+
+    def publish(self, frame):
+        # Skip the copy entirely while nobody is watching
+        if not self.has_consumer():
+            return False
+        if frame.shape != self.shape:
+            return False
+        seq = int(self._hdr[_H_WRITE_SEQ]) + 1
+        slot = seq % self.slots
+        self._seq[slot] = 2 * seq - 1  # odd: write in progress
+        np.copyto(self._frames[slot], frame)
+        self._seq[slot] = 2 * seq
+        self._hdr[_H_WRITE_SEQ] = seq
+        return True
+
+    def close(self):
+        self._hdr = self._hb = self._seq = self._frames = None
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class FrameRingReader:
+    def __init__(self, cam_id):
+        self.shm = _attach(segment_name(cam_id))
+        hdr = np.ndarray((_HEADER,), dtype=np.int64, buffer=self.shm.buf).copy()
+        if hdr[_H_MAGIC] != MAGIC:
+            self.shm.close()
+            raise ValueError(f"Segment {segment_name(cam_id)} is not a frame ring")
+        self.slots = int(hdr[_H_SLOTS])
+        self.shape = (int(hdr[_H_HEIGHT]), int(hdr[_H_WIDTH]), int(hdr[_H_CHANNELS]))
+        self._hdr, self._hb, self._seq, self._frames = _views(self.shm.buf, self.slots, self.shape)
+
+    def heartbeat(self):
+        self._hb[0] = time.time()
+
+    def latest_seq(self):
+        return int(self._hdr[_H_WRITE_SEQ])
+
+    def read(self, retries=3):
+        # -> (seq, frame copy) of the newest complete frame, or (0, None)
+        self.heartbeat()
+        for _ in range(retries):
+            seq = self.latest_seq()
+            if seq == 0:
+                return 0, None
+            slot = seq % self.slots
+            before = int(self._seq[slot])
+            if before != 2 * seq:
+                continue
+            frame = self._frames[slot].copy()
+            if int(self._seq[slot]) == before:
+                return seq, frame
+        return 0, None
+
+    def close(self):
+        self._hdr = self._hb = self._seq = self._frames = None
+        self.shm.close()
+
+
+def open_reader(cam_id):
+    # None while the detector for cam_id isn't running
+    try:
+        return FrameRingReader(cam_id)
+    except (FileNotFoundError, ValueError):
+        return None
+
+# Example usage:
+# writer = FrameRingWriter(cam_id=1, shape=frame.shape)   # detector
+# writer.publish(frame)
+# reader = open_reader(1)                                 # API process
+# seq, frame = reader.read()
@@ -1,38 +1,152 @@
+import hashlib
+import os
+
 import numpy as np
 import cv2
 
+def calibration_fingerprint(image_points, world_points):
+    # Identifies the calibration points a cached file was built from
+    data = np.asarray([image_points, world_points], dtype=np.float64).tobytes()
+    return hashlib.sha1(data).hexdigest()
+
 class HomographyCalibrator:
+    """
+    Image <-> ground plane mapping for one camera. H and its inverse are
+    computed once; build_lut() additionally precomputes, for a (optionally
+    downsampled) pixel grid, the ground position of every pixel and the ground
+    area (m^2) it covers, so hot loops can use lookup() / pixel_area() instead
+    of projecting. save() / load() persist everything as one .npz.
+    """
+
     def __init__(self, image_points=None, world_points=None):
         self.image_points = image_points  # List of (x, y) in image
         self.world_points = world_points  # List of (X, Y) in meters
         self.H = None
+        self.H_inv = None
+        self.lut = None        # [h', w', 2] float32 ground (X, Y) per LUT cell
+        self.area = None       # [h', w'] float32 m^2 covered by one image pixel
+        self.lut_step = 1
         if image_points is not None and world_points is not None:
             self.compute_homography()
 
     def compute_homography(self):
         if self.image_points is not None and self.world_points is not None:
             self.H, _ = cv2.findHomography(np.array(self.image_points), np.array(self.world_points))
+            self._set_h(self.H)
         return self.H
 
+    def _set_h(self, H):
+        self.H = np.asarray(H, dtype=np.float64)
+        self.H_inv = np.linalg.inv(self.H)
+        self._H32 = self.H.astype(np.float32)
+        self._H_inv32 = self.H_inv.astype(np.float32)
+        self.lut = self.area = None
+
+    @staticmethod
+    def _project(M, pts):
+        # pts: [N,2] -> [N,2] float32 through 3x3 M, without building homogeneous arrays
+        pts = np.asarray(pts, dtype=np.float32).reshape(-1, 2)
+        w = pts @ M[2, :2] + M[2, 2]
+        xy = pts @ M[:2, :2].T + M[:2, 2]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return xy / w[:, None]
+
     def image_to_world(self, pts):
-        # pts: Nx2 array of image points
-        pts = np.array(pts, dtype=np.float32)
-        pts = np.concatenate([pts, np.ones((pts.shape[0], 1))], axis=1)
-        mapped = (self.H @ pts.T).T
-        mapped = mapped[:, :2] / mapped[:, 2:]
-        return mapped
+        # pts: Nx2 array of image points -> Nx2 float32 ground points
+        return self._project(self._H32, pts)
 
     def world_to_image(self, pts):
-        # pts: Nx2 array of world points
-        H_inv = np.linalg.inv(self.H)
-        pts = np.array(pts, dtype=np.float32)
-        pts = np.concatenate([pts, np.ones((pts.shape[0], 1))], axis=1)
-        mapped = (H_inv @ pts.T).T
-        mapped = mapped[:, :2] / mapped[:, 2:]
-        return mapped
+        # pts: Nx2 array of world points -> Nx2 float32 image points
+        return self._project(self._H_inv32, pts)
+
+    # --- lookup tables ---
+
+    def build_lut(self, frame_shape, step=1):
+        # Ground position and per-pixel ground area at the centre of every step x step block
+        h, w = frame_shape[:2]
+        self.lut_step = max(1, int(step))
+        ys = np.arange(0, h, self.lut_step, dtype=np.float32) + (self.lut_step - 1) / 2
+        xs = np.arange(0, w, self.lut_step, dtype=np.float32) + (self.lut_step - 1) / 2
+        gx, gy = np.meshgrid(xs, ys)
+        H = self.H
+        denom = H[2, 0] * gx + H[2, 1] * gy + H[2, 2]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            X = (H[0, 0] * gx + H[0, 1] * gy + H[0, 2]) / denom
+            Y = (H[1, 0] * gx + H[1, 1] * gy + H[1, 2]) / denom
+            # |Jacobian| of a homography at (x, y) is |det H| / w^3
+            area = np.abs(np.linalg.det(H)) / np.abs(denom) ** 3
+        # Pixels at or above the horizon have no ground position: w changes sign there.
+        # The calibration points (else the bottom centre of the frame) are on the ground side.
+        ref = np.mean(self.image_points, axis=0) if self.image_points is not None else (w / 2, h - 1)
+        beyond = np.sign(denom) != np.sign(H[2, 0] * ref[0] + H[2, 1] * ref[1] + H[2, 2])
+        X[beyond] = Y[beyond] = area[beyond] = np.nan
+        self.lut = np.stack([X, Y], axis=-1).astype(np.float32)
+        self.area = area.astype(np.float32)
+        return self.lut
+
+    def _cells(self, pts):
+        # Nx2 image points -> flat LUT cell indices (nearest cell, clamped to the frame)
+        pts = np.asarray(pts, dtype=np.float32).reshape(-1, 2)
+        lh, lw = self.area.shape
+        scaled = pts * (1.0 / self.lut_step)
+        ci = np.clip(scaled[:, 0], 0, lw - 1).astype(np.int64)
+        ri = np.clip(scaled[:, 1], 0, lh - 1).astype(np.int64)
+        return ri * lw + ci
+
+    def lookup(self, pts):
+        # Nx2 image points -> Nx2 ground points from the LUT
+        return np.take(self.lut.reshape(-1, 2), self._cells(pts), axis=0)
+
+    def pixel_area(self, pts):
+        # Nx2 image points -> N ground areas (m^2) of one image pixel at each point
+        return np.take(self.area.ravel(), self._cells(pts))
+
+    # --- persistence ---
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        arrays = {"H": self.H, "lut_step": self.lut_step,
+                  "fingerprint": calibration_fingerprint(self.image_points, self.world_points)}
+        if self.lut is not None:
+            arrays.update(lut=self.lut, area=self.area)
+        # Write then rename so readers never see a half-written file
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, image_points=None, world_points=None):
+        cal = cls()
+        cal.image_points, cal.world_points = image_points, world_points
+        # Closed on return: an open handle blocks a later save() over the same path on Windows
+        with np.load(path) as data:
+            cal._set_h(data["H"])
+            cal.lut_step = int(data["lut_step"])
+            if "lut" in data:
+                cal.lut, cal.area = data["lut"], data["area"]
+            cal.fingerprint = str(data["fingerprint"])
+        return cal
+
+
+def load_calibration(cam_id, image_points, world_points, frame_shape=None, cache_dir="data/calibration", step=4):
+    # Per-camera calibration, reusing data/calibration/cam_<id>.npz while the points are unchanged
+    path = os.path.join(cache_dir, f"cam_{cam_id}.npz")
+    if os.path.exists(path):
+        cal = HomographyCalibrator.load(path, image_points, world_points)
+        lut_shape = None if frame_shape is None else (-(-frame_shape[0] // step), -(-frame_shape[1] // step))
+        lut_ok = frame_shape is None or (cal.area is not None and cal.lut_step == step and cal.area.shape == lut_shape)
+        if cal.fingerprint == calibration_fingerprint(image_points, world_points) and lut_ok:
+            return cal
+    cal = HomographyCalibrator(image_points, world_points)
+    if frame_shape is not None:
+        cal.build_lut(frame_shape, step)
+    cal.save(path)
+    return cal
 
 # Example usage:
 # image_pts = [(x1, y1), (x2, y2), (x3, y3), (x4, y4)]
 # world_pts = [(X1, Y1), (X2, Y2), (X3, Y3), (X4, Y4)]
 # calibrator = HomographyCalibrator(image_pts, world_pts)
-# ground_pts = calibrator.image_to_world([(x, y)]) 
\ No newline at end of file
+# ground_pts = calibrator.image_to_world([(x, y)])
+# calibrator = load_calibration(1, image_pts, world_pts, frame.shape, step=4)
+# ground_pts = calibrator.lookup(centroids); m2 = calibrator.pixel_area(centroids)
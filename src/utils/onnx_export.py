@@ -6,4 +6,6 @@ def export_yolo_to_onnx(weights_path, onnx_path="yolov8.onnx"):
     print(f"Exported YOLO model to {onnx_path}")
 
 # Example usage:
-# export_yolo_to_onnx("yolov8n.pt", "yolov8n.onnx") 
\ No newline at end of file
+# export_yolo_to_onnx("yolov8n.pt", "yolov8n.onnx")
+# Then optionally quantize to INT8 with frames from our own videos:
+# python src/detectors/onnx_detector.py yolov8n.onnx yolov8n.int8.onnx --videos data/videos/*.mp4 
\ No newline at end of file
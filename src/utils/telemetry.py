@@ -0,0 +1,207 @@
+import glob
+import importlib.util
+import os
+import threading
+import time
+
+# Pipeline metrics in prometheus_client multiprocess mode: every process (main loop,
+# supervised workers) writes its values to mmap'd files in MULTIPROC_DIR and the API's
+# /metrics route aggregates them. prometheus_client reads PROMETHEUS_MULTIPROC_DIR when
+# it is imported, so nothing is set up at import time: init_telemetry() (called by
+# main.py and the API at startup) sets the directory, then imports it and creates the metrics.
+DEFAULT_MULTIPROC_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                      "..", "..", "data", "outputs", "prometheus"))
+MULTIPROC_DIR = None
+
+# prometheus_client is optional for the detector: without it telemetry is a no-op
+PROMETHEUS_AVAILABLE = importlib.util.find_spec("prometheus_client") is not None
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGES = ("decode", "infer", "track", "count", "render", "encode", "log")
+# Per-frame stage latencies range from tens of microseconds (count) to a second (CPU infer)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class _NoopMetric:
+    # Stands in for every metric until init_telemetry(), or for good without prometheus_client
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+stage_seconds = queue_depth = dropped_frames = frames_counter = camera_fps = _NoopMetric()
+active_gauge = in_counter = out_counter = cpi_gauge = density_gauge = _NoopMetric()
+_init_lock = threading.Lock()
+
+
+def init_telemetry(path=None):
+    # Idempotent; path defaults to $PROMETHEUS_MULTIPROC_DIR, else <repo>/data/outputs/prometheus.
+    # Worker processes inherit the variable. -> True when metrics are recorded
+    global MULTIPROC_DIR, PROMETHEUS_AVAILABLE, CONTENT_TYPE_LATEST
+    global stage_seconds, queue_depth, dropped_frames, frames_counter, camera_fps
+    global active_gauge, in_counter, out_counter, cpi_gauge, density_gauge
+    with _init_lock:
+        if MULTIPROC_DIR is not None or not PROMETHEUS_AVAILABLE:
+            return PROMETHEUS_AVAILABLE
+        path = os.path.abspath(path or os.environ.get("PROMETHEUS_MULTIPROC_DIR") or DEFAULT_MULTIPROC_DIR)
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+        os.makedirs(path, exist_ok=True)
+        try:
+            from prometheus_client import Counter, Gauge, Histogram
+            from prometheus_client import CONTENT_TYPE_LATEST
+        except ImportError:
+            PROMETHEUS_AVAILABLE = False
+            return False
+        MULTIPROC_DIR = path
+        stage_seconds = Histogram("crowdflow_stage_seconds", "Per-frame latency of each pipeline stage",
+                                  ["camera", "stage"], buckets=LATENCY_BUCKETS)
+        queue_depth = Gauge("crowdflow_queue_depth", "Items waiting in front of a pipeline stage",
+                            ["camera", "queue"], multiprocess_mode="livesum")
+        dropped_frames = Counter("crowdflow_dropped_frames", "Frames evicted from a full pipeline queue",
+                                 ["camera", "queue"])
+        frames_counter = Counter("crowdflow_frames", "Frames processed", ["camera"])
+        camera_fps = Gauge("crowdflow_camera_fps", "Frames processed per second", ["camera"],
+                           multiprocess_mode="livesum")
+        active_gauge = Gauge("crowdflow_active", "Active people count", ["camera"], multiprocess_mode="livesum")
+        in_counter = Counter("crowdflow_in", "Cumulative in count", ["camera"])
+        out_counter = Counter("crowdflow_out", "Cumulative out count", ["camera"])
+        cpi_gauge = Gauge("crowdflow_cpi_peak", "Highest crowd pressure index cell", ["camera"],
+                          multiprocess_mode="livesum")
+        density_gauge = Gauge("crowdflow_density_peak", "Highest cell density (people/m^2, or per cell)",
+                              ["camera"], multiprocess_mode="livesum")
+        return True
+
+
+def reset():
+    # Drop values left by earlier runs; call once in the top-level process before starting cameras
+    if not init_telemetry():
+        return
+    for path in glob.glob(os.path.join(MULTIPROC_DIR, "*.db")):
+        os.remove(path)
+
+
+def mark_process_dead(pid=None):
+    # Remove an exited process's live gauges (fps, queue depths, active) from the aggregate
+    if MULTIPROC_DIR is not None:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid if pid is not None else os.getpid(), MULTIPROC_DIR)
+
+
+def render_latest():
+    # Exposition text aggregated over every process that wrote to MULTIPROC_DIR
+    if not init_telemetry():
+        return b"# prometheus_client is not installed\n"
+    from prometheus_client import CollectorRegistry, generate_latest, multiprocess
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, path=MULTIPROC_DIR)
+    return generate_latest(registry)
+
+
+class CameraTelemetry:
+    """
+    Per-camera handle on the pipeline metrics. Labelled children are resolved
+    once; per frame only the stage histograms are touched (lap()), while
+    frame counts, FPS, people counts and queue samples are accumulated locally
+    and published once per publish_interval_s by frame_done().
+    """
+
+    def __init__(self, cam_id, enabled=True, publish_interval_s=1.0):
+        self.enabled = enabled and init_telemetry()
+        self.publish_interval_s = publish_interval_s
+        self.pipeline = None
+        self._frames = 0
+        self._counts = None
+        self._field = None
+        self._published = (0, 0)
+        self._dropped = {}
+        self._last_publish = time.perf_counter()
+        if not self.enabled:
+            return
+        cam = str(cam_id)
+        self.cam = cam
+        self._stages = {s: stage_seconds.labels(cam, s) for s in STAGES}
+        self._frames_total = frames_counter.labels(cam)
+        self._fps = camera_fps.labels(cam)
+        self._active = active_gauge.labels(cam)
+        self._in = in_counter.labels(cam)
+        self._out = out_counter.labels(cam)
+        self._cpi = cpi_gauge.labels(cam)
+        self._density = density_gauge.labels(cam)
+
+    def lap(self, stage, started):
+        # Observe time since `started` under stage, return now for the next lap
+        now = time.perf_counter()
+        if self.enabled:
+            self._stages[stage].observe(now - started)
+        return now
+
+    def watch(self, pipeline):
+        # Sample depths() / dropped() of a StagedPipeline on every publish
+        self.pipeline = pipeline
+
+    def field_done(self, cpi_peak, density_peak):
+        # Latest FlowFieldBuilder summary, published with the counts
+        self._field = (cpi_peak, density_peak)
+
+    def frame_done(self, in_c, out_c, active):
+        if not self.enabled:
+            return
+        self._frames += 1
+        self._counts = (in_c, out_c, active)
+        now = time.perf_counter()
+        if now - self._last_publish >= self.publish_interval_s:
+            self.publish(now)
+
+    def publish(self, now=None):
+        if not self.enabled:
+            return
+        now = now if now is not None else time.perf_counter()
+        elapsed = now - self._last_publish
+        self._last_publish = now
+        if self._frames:
+            self._frames_total.inc(self._frames)
+            self._fps.set(self._frames / elapsed if elapsed > 0 else 0.0)
+            self._frames = 0
+        if self._counts is not None:
+            in_c, out_c, active = self._counts
+            self._active.set(active)
+            # Counters only go up: publish the increase since the last publish
+            if in_c > self._published[0]:
+                self._in.inc(in_c - self._published[0])
+            if out_c > self._published[1]:
+                self._out.inc(out_c - self._published[1])
+            self._published = (max(in_c, self._published[0]), max(out_c, self._published[1]))
+        if self._field is not None:
+            self._cpi.set(self._field[0])
+            self._density.set(self._field[1])
+        if self.pipeline is not None:
+            for name, depth in self.pipeline.depths().items():
+                queue_depth.labels(self.cam, name).set(depth)
+            for name, total in self.pipeline.dropped().items():
+                new = total - self._dropped.get(name, 0)
+                if new > 0:
+                    dropped_frames.labels(self.cam, name).inc(new)
+                self._dropped[name] = total
+
+    def close(self):
+        self.publish()
+        if self.enabled:
+            self._fps.set(0)
+            for name in (self.pipeline.depths() if self.pipeline is not None else {}):
+                queue_depth.labels(self.cam, name).set(0)
+
+# Example usage:
+# init_telemetry()                # once at process startup, before any metric is recorded
+# telemetry = CameraTelemetry(cam_id=1)
+# t = time.perf_counter()
+# ret, frame = cap.read();       t = telemetry.lap("decode", t)
+# boxes, _, _ = model.infer(frame); t = telemetry.lap("infer", t)
+# telemetry.frame_done(in_c, out_c, active)
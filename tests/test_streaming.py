@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import numpy as np
+from cloud.streaming import Publisher, decode_batch
+
+
+class ListTransport:
+    def __init__(self):
+        self.batches = []
+
+    def send(self, topic, batch):
+        self.batches.append((time.monotonic(), list(decode_batch(batch))))
+
+
+def _states(transport):
+    return [s for _, batch in transport.batches for s in batch]
+
+
+def test_single_state_sent_within_max_delay():
+    for policy in ("drop", "coalesce", "block"):
+        transport = ListTransport()
+        pub = Publisher(transport, "t", max_batch=32, max_delay_ms=50, policy=policy)
+        start = time.monotonic()
+        pub.publish({"camera": 1, "timestamp": 1.0, "positions": {7: (1.0, 2.0)}, "active": 1})
+        deadline = start + 1.0
+        while not transport.batches and time.monotonic() < deadline:
+            time.sleep(0.005)
+        stats = pub.stats()
+        pub.close()
+        assert stats["published"] == 1, policy
+        assert transport.batches[0][0] - start < 0.5, policy
+
+
+def test_unencodable_state_does_not_lose_batch():
+    transport = ListTransport()
+    pub = Publisher(transport, "t", max_batch=2, max_delay_ms=1000, policy="drop")
+    pub.publish({"camera": 1, "timestamp": 1.0, "positions": {}, "bad": np.zeros(3)})
+    pub.publish({"camera": 2, "timestamp": 1.0, "positions": {}, "active": 3})
+    pub.close()
+    states = _states(transport)
+    assert [s["camera"] for s in states] == [2]
+    assert pub.stats()["encode_errors"] == 1